@@ -0,0 +1,73 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compares bpylist's archiver with the fast path for the written models.
+
+    python -m benchmarks.archive --objects 20000
+"""
+import argparse
+
+from bpylist import archiver
+
+from djtools.djay import fastarchive, models
+
+from . import common
+
+
+def make_objects(count: int, cue_points: int = 8):
+    """Returns count user data, titles and analyzed data objects each."""
+    user_data, titles, analyses = [], [], []
+    for i in range(count):
+        uuid = f'{i:032x}'
+        user_data.append(models.ADCMediaItemUserData(
+            cuePoints=[models.ADCCuePoint(number=n + 1, time=i + n * 15.5)
+                       for n in range(cue_points)],
+            startPoint=models.ADCCuePoint(number=0, time=0.25),
+            playCount=i % 10,
+            uuid=uuid,
+            userChangedCloudKeys={'cuePoints'},
+        ))
+        titles.append(models.ADCMediaItemTitleID(
+            title=f'Title {i}', artist=f'Artist {i % 100}',
+            stringRepresentation=f'Title {i} Artist {i % 100}',
+            internalID=uuid, duration=180.0 + i % 300, uuid=uuid))
+        analyses.append(models.ADCMediaItemAnalyzedData(
+            bpm=120 + i % 20, keySignatureIndex=i % 24, uuid=uuid))
+    return {
+        'ADCMediaItemUserData': user_data,
+        'ADCMediaItemTitleID': titles,
+        'ADCMediaItemAnalyzedData': analyses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--objects', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    models.register()
+    for name, objs in make_objects(args.objects).items():
+        generic = [archiver.archive(obj) for obj in objs]
+        assert [fastarchive.archive(obj) for obj in objs] == generic, \
+            f'{name}: fast path output differs'
+        for label, func in [('archiver', archiver.archive),
+                            ('fastarchive', fastarchive.archive)]:
+            seconds = common.best_of(
+                lambda func=func, objs=objs: [func(obj) for obj in objs],
+                args.repeat)
+            common.report(f'{label} {name}', len(objs), seconds, 'objects')
+
+
+if __name__ == '__main__':
+    main()
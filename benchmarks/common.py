@@ -0,0 +1,107 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Synthetic libraries and timing helpers shared by the benchmarks."""
+import sqlite3
+import time
+from typing import Callable, List
+from xml.sax.saxutils import quoteattr
+
+from bpylist import archiver
+
+from djtools.djay import models as djaymodels
+
+# database2 as created by YapDatabase, which djay is built on.
+SCHEMA = [
+    'CREATE TABLE database2(rowid INTEGER PRIMARY KEY,'
+    ' collection CHAR NOT NULL, key CHAR NOT NULL, data BLOB, metadata BLOB)',
+    'CREATE UNIQUE INDEX true_primary_key ON database2(collection, key)',
+]
+PRODUCT_KEY = 'com.algoriddim.direct.djay-pro-2-mac-Mac'
+
+
+def make_rekordbox_xml(num_tracks: int, cue_points: int = 4) -> bytes:
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<DJ_PLAYLISTS Version="1.0.0">',
+             '  <PRODUCT Name="rekordbox" Version="5.2.3" '
+             'Company="Pioneer DJ"/>',
+             f'  <COLLECTION Entries="{num_tracks}">']
+    for i in range(num_tracks):
+        lines.append(
+            f'    <TRACK TrackID="{i + 1}" '
+            f'Name={quoteattr(f"Track {i}")} '
+            f'Artist={quoteattr(f"Artist {i % 997}")} Composer="" '
+            f'Album="" Grouping="" Genre="House" Kind="MP3 File" '
+            f'Size="{10 ** 7 + i}" TotalTime="{120 + i % 300}" '
+            f'AverageBpm="{100 + i % 40}.00" '
+            f'Location="file://localhost/music/{i}.mp3">')
+        lines.append(f'      <TEMPO Inizio="0.120" Bpm="{100 + i % 40}.00" '
+                     'Metro="4/4" Battito="1"/>')
+        for n in range(cue_points):
+            lines.append(f'      <POSITION_MARK Name="" Type="0" '
+                         f'Start="{n * 30.5:.3f}" Num="{n}" Red="40" '
+                         'Green="226" Blue="20"/>')
+        lines.append('    </TRACK>')
+    lines.append('  </COLLECTION>')
+    lines.append('  <PLAYLISTS>')
+    lines.append('    <NODE Type="0" Name="ROOT" Count="1">')
+    lines.append(f'      <NODE Name="All" Type="1" KeyType="0" '
+                 f'Entries="{num_tracks}">')
+    for i in range(num_tracks):
+        lines.append(f'        <TRACK Key="{i + 1}"/>')
+    lines.append('      </NODE>')
+    lines.append('    </NODE>')
+    lines.append('  </PLAYLISTS>')
+    lines.append('</DJ_PLAYLISTS>')
+    return '\n'.join(lines).encode('utf-8')
+
+
+def make_djay_library(fname: str, num_tracks: int) -> None:
+    """Writes a djay media library whose tracks match make_rekordbox_xml's."""
+    djaymodels.register()
+    rows = [('products', PRODUCT_KEY,
+             archiver.archive(djaymodels.ADCProduct(version='2.0.9')))]
+    for i in range(num_tracks):
+        uuid = f'{i:032x}'
+        rows.append(('mediaItemTitleIDs', uuid, archiver.archive(
+            djaymodels.ADCMediaItemTitleID(
+                title=f'Track {i}', artist=f'Artist {i % 997}',
+                duration=120 + i % 300 + 0.25, uuid=uuid))))
+        rows.append(('mediaItemUserData', uuid, archiver.archive(
+            djaymodels.ADCMediaItemUserData(uuid=uuid, playCount=i % 10))))
+        rows.append(('mediaItemAnalyzedData', uuid, archiver.archive(
+            djaymodels.ADCMediaItemAnalyzedData(
+                bpm=100 + i % 40, keySignatureIndex=i % 24, uuid=uuid))))
+    conn = sqlite3.connect(fname)
+    with conn:
+        for statement in SCHEMA:
+            conn.execute(statement)
+        conn.executemany('INSERT INTO database2(collection, key, data)'
+                         ' VALUES (?,?,?)', rows)
+    conn.close()
+
+
+def best_of(func: Callable[[], object], repeat: int = 3) -> float:
+    """Returns the fastest wall time of calling func, in seconds."""
+    times: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def report(name: str, count: int, seconds: float, unit: str = 'items'):
+    rate = count / seconds if seconds else float('inf')
+    print(f'{name:<40} {count:>8} {unit} {seconds * 1000:>10.1f} ms '
+          f'{rate:>12.0f} {unit}/s')
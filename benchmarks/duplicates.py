@@ -0,0 +1,67 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Measures duplicate detection for growing library sizes, which should take
+about proportionally longer.
+
+    python -m benchmarks.duplicates --tracks 25000 50000 100000
+"""
+import argparse
+from typing import List
+
+from djtools import duplicates
+from djtools.djay import models
+
+from . import common
+
+
+def make_tracks(num_tracks: int, every: int = 10) -> List[models.DjayTrack]:
+    """Tracks with a duplicate import of every `every`th one, half of them
+    of the same file and half with a slightly different duration."""
+    tracks = []
+    for i in range(num_tracks):
+        original = i - i % every if i % every == 1 else i
+        uri = f'file:///Music/Artist {original % 997}/Track {original}.mp3'
+        if i != original and i % 2:
+            uri = f'file:///Music/Imported/{i}.mp3'
+        tracks.append(models.DjayTrack(
+            title=models.ADCMediaItemTitleID(
+                uuid=f'{i:032x}', title=f'Track {original}',
+                artist=f'Artist {original % 997}',
+                duration=120 + original % 300 + (0.5 if i != original else 0)),
+            user_data=models.ADCMediaItemUserData(
+                cuePoints=[models.ADCCuePoint(number=0, time=1.0)] * (i % 3)),
+            local_location=models.ADCMediaItemLocation(
+                sourceURIs={models.NSURL(NSrelative=uri, NSbase=None)})))
+    return tracks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tracks', type=int, nargs='+',
+                        default=[25000, 50000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for num_tracks in args.tracks:
+        tracks = make_tracks(num_tracks)
+        groups = duplicates.find_duplicates(tracks)
+        seconds = common.best_of(
+            lambda tracks=tracks: duplicates.find_duplicates(tracks),
+            args.repeat)
+        common.report(f'find_duplicates ({len(groups)} groups)', num_tracks,
+                      seconds, 'tracks')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Measures archive and unarchive throughput for every djay model, and
+fastarchive's, which Explorer writes with, for the models it covers.
+
+    python -m benchmarks.models --objects 20000
+"""
+import argparse
+from typing import Callable, Dict
+
+from bpylist import archiver
+
+from djtools.djay import fastarchive, models
+
+from . import common
+
+
+def _cue_point(i: int) -> models.ADCCuePoint:
+    return models.ADCCuePoint(number=i % 8 + 1, time=i * 15.5,
+                              comment=f'Cue {i}')
+
+
+def _url(i: int) -> models.NSURL:
+    return models.NSURL(NSrelative=f'file:///Music/{i}.mp3', NSbase=None)
+
+
+def _media_item(i: int) -> models.ADCMediaItem:
+    uuid = f'{i:032x}'
+    return models.ADCMediaItem(
+        addedDate=1.5e9 + i, albumArtistUUIDs='', albumDiscCount=1,
+        albumDiscNumber=1, albumTrackCount=12, albumTrackNumber=i % 12 + 1,
+        albumType=0, albumUUID=f'{i // 12:032x}', bitRate=320, bpm=120.0,
+        channelCount=2, comments='', composer='', contentType='audio/mpeg',
+        drmProtected=False, duration=180.0 + i % 300, explicitContent=False,
+        grouping='', keySignatureIndex=i % 24, labelUUID='', lyrics='',
+        modifiedDate=1.5e9 + i, originSourceID='', purchasedDate=0.0,
+        releaseDate=0.0, sampleRate=44100, title=f'Title {i}',
+        titleID=uuid, uuid=uuid, year=2018,
+        artistUUIDs={f'{i % 100:032x}'}, genreUUIDs={'house'})
+
+
+# One object of each model for index i, roughly as djay writes them.
+SAMPLES: Dict[type, Callable[[int], object]] = {
+    models.ADCCuePoint: _cue_point,
+    models.ADCMediaItem: _media_item,
+    models.ADCMediaItemAnalyzedData: lambda i: models.ADCMediaItemAnalyzedData(
+        bpm=120 + i % 20, keySignatureIndex=i % 24, uuid=f'{i:032x}'),
+    models.ADCMediaItemLocation: lambda i: models.ADCMediaItemLocation(
+        sourceURIs={_url(i)}, type=0,
+        urlBookmarkData=models.NSMutableData(b'bookmark %d' % i),
+        uuid=f'{i:032x}'),
+    models.ADCMediaItemTitleID: lambda i: models.ADCMediaItemTitleID(
+        title=f'Title {i}', artist=f'Artist {i % 100}',
+        stringRepresentation=f'Title {i} Artist {i % 100}',
+        internalID=f'{i:032x}', duration=180.0 + i % 300, uuid=f'{i:032x}'),
+    models.ADCMediaItemUserData: lambda i: models.ADCMediaItemUserData(
+        cuePoints=[_cue_point(i + n) for n in range(8)],
+        startPoint=models.ADCCuePoint(number=0, time=0.25),
+        playCount=i % 10, uuid=f'{i:032x}',
+        userChangedCloudKeys={'cuePoints'}),
+    models.NSMutableData: lambda i: models.NSMutableData(b'data %d' % i),
+    models.NSURL: _url,
+    models.ADCProduct: lambda i: models.ADCProduct(
+        useCount=i, uuid=f'{i:032x}', version='2.0.9',
+        productID='com.algoriddim.direct.djay-pro-2-mac'),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--objects', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    missing = [m.__name__ for m in models.MODELS if m not in SAMPLES]
+    assert not missing, f'No benchmark samples for {", ".join(missing)}'
+
+    models.register()
+    for model in models.MODELS:
+        objs = [SAMPLES[model](i) for i in range(args.objects)]
+        archives = [archiver.archive(obj) for obj in objs]
+        assert archiver.unarchive(archives[-1]) == objs[-1], \
+            f'{model.__name__} does not round-trip'
+        seconds = common.best_of(
+            lambda objs=objs: [archiver.archive(obj) for obj in objs],
+            args.repeat)
+        common.report(f'archive {model.__name__}', len(objs), seconds,
+                      'objects')
+        if model in fastarchive.FAST_PATH_CLASSES:
+            assert fastarchive.archive(objs[-1]) == archives[-1], \
+                f'{model.__name__}: fast path output differs'
+            seconds = common.best_of(
+                lambda objs=objs: [fastarchive.archive(obj) for obj in objs],
+                args.repeat)
+            common.report(f'fastarchive {model.__name__}', len(objs),
+                          seconds, 'objects')
+        seconds = common.best_of(
+            lambda archives=archives: [archiver.unarchive(data)
+                                       for data in archives],
+            args.repeat)
+        common.report(f'unarchive {model.__name__}', len(objs), seconds,
+                      'objects')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compares the throughput of the rekordbox XML parser backends.
+
+    python -m benchmarks.rekordbox_parse --tracks 50000
+"""
+import argparse
+import os
+import tempfile
+
+from djtools import rekordbox
+from djtools.rekordbox import backends
+
+from . import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tracks', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile(suffix='.xml', delete=False) as f:
+        f.write(common.make_rekordbox_xml(args.tracks))
+    try:
+        results = {}
+        for name in backends.BACKENDS:
+            try:
+                backends.get_backend(name)
+            except backends.Error as e:
+                print(f'{name}: skipped ({e})')
+                continue
+            results[name] = rekordbox.parse_xml_file(f.name, backend=name)
+            seconds = common.best_of(
+                lambda name=name: rekordbox.parse_xml_file(f.name,
+                                                           backend=name),
+                args.repeat)
+            common.report(f'parse_xml_file backend={name}', args.tracks,
+                          seconds, 'tracks')
+        first, *others = results.values()
+        assert all(other == first for other in others), \
+            'backends disagree'
+    finally:
+        os.unlink(f.name)
+
+
+if __name__ == '__main__':
+    main()
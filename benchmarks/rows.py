@@ -0,0 +1,91 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compares memory and load time of Explorer's RowStore with one dataclass
+instance per row, as Explorer used to keep them.
+
+    python -m benchmarks.rows --tracks 100000
+"""
+import argparse
+import dataclasses
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+from djtools.djay import Explorer
+
+from . import common
+
+
+@dataclasses.dataclass
+class DataclassRow:
+    rowid: int
+    collection: str
+    key: str
+    data: bytes
+    metadata: bytes
+
+
+def load_dataclass_rows(fname: str):
+    conn = sqlite3.connect(fname)
+    try:
+        return [DataclassRow(*row) for row in conn.execute(
+            'select rowid, collection, key, data, metadata from database2')]
+    finally:
+        conn.close()
+
+
+def load_row_store(fname: str):
+    with Explorer(fname, read_only=True) as explorer:
+        explorer.load()
+        return explorer.data
+
+
+def measure(load, fname: str):
+    """Returns the result's size in bytes and the seconds loading took."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = load(fname)
+    seconds = time.perf_counter() - started
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tracks', type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fname = os.path.join(tmp_dir, 'MediaLibrary.db')
+        common.make_djay_library(fname, args.tracks)
+        conn = sqlite3.connect(fname)
+        rows, blob_bytes = conn.execute(
+            'select count(*), sum(length(data)) from database2').fetchone()
+        conn.close()
+        for name, load in [('dataclass rows', load_dataclass_rows),
+                           ('RowStore', load_row_store)]:
+            size, _ = measure(load, fname)
+            seconds = common.best_of(lambda load=load: load(fname))
+            common.report(f'load {name}', rows, seconds, 'rows')
+            # What's held beyond the blobs themselves.
+            print(f'{"":<40} {size / 2 ** 20:>17.1f} MiB '
+                  f'{(size - blob_bytes) / rows:>12.0f} bytes/row overhead')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Measures start-up cost in fresh interpreters: module import times from
+`python -X importtime`, and the time from interpreter start to the first
+Explorer.load_track.
+
+    python -m benchmarks.startup --tracks 1000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Tuple
+
+from . import common
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ['djtools', 'djtools.djay', 'djtools.djay.models',
+           'djtools.rekordbox', 'djtools.djay.explorer', 'djtools.sync']
+
+FIRST_LOAD_TRACK = '''
+import time
+started = time.perf_counter()
+from djtools.djay import Explorer
+imported = time.perf_counter()
+explorer = Explorer({fname!r}, read_only=True)
+explorer.load_track({track_id!r})
+print(imported - started, time.perf_counter() - started)
+'''
+
+
+def _run(args: List[str]) -> subprocess.CompletedProcess:
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT] + [p for p in [env.get('PYTHONPATH')] if p])
+    return subprocess.run([sys.executable] + args, cwd=ROOT, env=env,
+                          check=True, stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE, universal_newlines=True)
+
+
+def import_times(module: str) -> Dict[str, Tuple[int, int]]:
+    """Returns module -> (self, cumulative) import time in us."""
+    stderr = _run(['-X', 'importtime', '-c', f'import {module}']).stderr
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def first_load_track(fname: str, track_id: str) -> Tuple[float, float]:
+    """Returns seconds to import Explorer, and to the first load_track."""
+    stdout = _run(['-c', FIRST_LOAD_TRACK.format(
+        fname=fname, track_id=track_id)]).stdout
+    import_seconds, total_seconds = stdout.split()
+    return float(import_seconds), float(total_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tracks', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=5,
+                        help='slowest imports to list per module')
+    args = parser.parse_args()
+
+    for module in MODULES:
+        runs = [import_times(module) for _ in range(args.repeat)]
+        best = min(runs, key=lambda times, module=module: times[module][1])
+        print(f'import {module:<34} {best[module][1] / 1000:>10.1f} ms')
+        slowest = sorted(best.items(), key=lambda item: -item[1][0])
+        for name, (self_us, _) in slowest[:args.top]:
+            print(f'    {name:<36} {self_us / 1000:>10.1f} ms self')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fname = os.path.join(tmp_dir, 'MediaLibrary.db')
+        common.make_djay_library(fname, args.tracks)
+        runs = [first_load_track(fname, f'{args.tracks - 1:032x}')
+                for _ in range(args.repeat)]
+    import_seconds = min(run[0] for run in runs)
+    total_seconds = min(run[1] for run in runs)
+    print(f'{"import Explorer":<41} {import_seconds * 1000:>10.1f} ms')
+    print(f'{f"first load_track ({args.tracks} tracks)":<41} '
+          f'{total_seconds * 1000:>10.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
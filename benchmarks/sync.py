@@ -0,0 +1,69 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Measures full-library sync throughput for a range of worker counts.
+
+    python -m benchmarks.sync --tracks 20000 --workers 1 4 16 32
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from djtools import sync
+from djtools.djay import Explorer
+from djtools.rekordbox import models as rbmodels
+
+from . import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tracks', type=int, default=5000)
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=[1, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        xml_fname = os.path.join(tmp_dir, 'rekordbox.xml')
+        with open(xml_fname, 'wb') as f:
+            f.write(common.make_rekordbox_xml(args.tracks))
+        rb_ts = rbmodels.parse_xml_file(xml_fname)
+        source = os.path.join(tmp_dir, 'source.db')
+        common.make_djay_library(source, args.tracks)
+
+        dumps = []
+        for workers in args.workers:
+            fname = os.path.join(tmp_dir, f'workers{workers}.db')
+            shutil.copyfile(source, fname)
+            with Explorer(fname) as e:
+                e.load()
+                start = time.perf_counter()
+                stats = sync.sync(e, rb_ts, workers=workers)
+                seconds = time.perf_counter() - start
+            common.report(f'sync workers={workers} '
+                          f'({stats.matched} matched)',
+                          stats.tracks, seconds, 'tracks')
+            with Explorer(fname, read_only=True) as e:
+                dumps.append([(row.collection, row.key, row.data)
+                              for row in e.data])
+        assert all(dump == dumps[0] for dump in dumps), \
+            'worker counts disagree'
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
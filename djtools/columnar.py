@@ -0,0 +1,127 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Columnar export of djay and rekordbox libraries.
+
+Each export returns a dict of column name -> array with one entry per track.
+Numeric columns are NumPy arrays when NumPy is installed (`pip install
+Djtools[numpy]`), and array.array otherwise; both expose the buffer protocol,
+so they can be wrapped by Arrow without copying. The uuid column is a NumPy
+unicode array or a list of str.
+
+Missing values are NaN for float columns and -1 for integer ones.
+"""
+import array
+from typing import Any, Dict, Iterable, Optional, Union
+
+from djtools.djay import explorer as djayexplorer
+from djtools.djay import models as djaymodels
+from djtools.rekordbox import models as rbmodels
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None  # type: ignore
+
+Columns = Dict[str, Any]
+
+NAN = float('nan')
+
+DJAY_COLUMNS = {
+    'duration': 'd',
+    'bpm': 'd',
+    'keySignatureIndex': 'q',
+    'rating': 'q',
+    'playCount': 'q',
+    'cueCount': 'q',
+}
+
+REKORDBOX_COLUMNS = {
+    'TrackID': 'q',
+    'TotalTime': 'q',
+    'CueCount': 'q',
+}
+
+
+def _finish(columns: Dict[str, Union[array.array, list]]) -> Columns:
+    if numpy is None:
+        return columns
+    result = {}  # type: Columns
+    for name, values in columns.items():
+        if isinstance(values, array.array):
+            result[name] = numpy.frombuffer(
+                values, dtype=numpy.float64 if values.typecode == 'd'
+                else numpy.int64)
+        else:
+            result[name] = numpy.array(values, dtype=str)
+    return result
+
+
+def _float(value: Optional[float]) -> float:
+    return NAN if value is None else value
+
+
+def _int(value: Optional[int]) -> int:
+    return -1 if value is None else value
+
+
+def djay_columns(tracks: Iterable[djaymodels.DjayTrack]) -> Columns:
+    columns = {name: array.array(typecode)
+               for name, typecode in DJAY_COLUMNS.items()
+               }  # type: Dict[str, Union[array.array, list]]
+    uuids = []
+    for track in tracks:
+        uuids.append(track.title.uuid)
+        columns['duration'].append(_float(track.title.duration))
+        if track.analysis is not None:
+            columns['bpm'].append(_float(track.analysis.bpm))
+            columns['keySignatureIndex'].append(
+                _int(track.analysis.keySignatureIndex))
+        else:
+            columns['bpm'].append(NAN)
+            columns['keySignatureIndex'].append(-1)
+        user_data = track.user_data
+        if user_data is not None:
+            columns['rating'].append(user_data.rating or 0)
+            columns['playCount'].append(user_data.playCount or 0)
+            columns['cueCount'].append(len(user_data.cuePoints or []))
+        else:
+            columns['rating'].append(-1)
+            columns['playCount'].append(-1)
+            columns['cueCount'].append(-1)
+    columns['uuid'] = uuids
+    return _finish(columns)
+
+
+def explorer_columns(explorer: djayexplorer.Explorer) -> Columns:
+    """djay_columns() for the whole library.
+
+    Only the title, analysis and user data collections are unarchived.
+    """
+    track_ids = explorer.get_track_ids()
+    groups = explorer.group_track_rows(track_ids,
+                                       djayexplorer.ENCODED_COLLECTIONS)
+    return djay_columns(djayexplorer.decode_track(groups[t_id])
+                        for t_id in track_ids)
+
+
+def rekordbox_columns(tracks: Iterable[rbmodels.Track]) -> Columns:
+    columns = {name: array.array(typecode)
+               for name, typecode in REKORDBOX_COLUMNS.items()
+               }  # type: Dict[str, Union[array.array, list]]
+    for track in tracks:
+        columns['TrackID'].append(track.TrackID)
+        columns['TotalTime'].append(
+            track.TotalTime if track.TotalTime is not None else -1)
+        columns['CueCount'].append(len(track.CuePoints))
+    return _finish(columns)
@@ -30,3 +30,21 @@ def transfer_cue_points(rb_t: rbmodels.Track,
             time=cp.Start,
         ))
     return result
+
+
+def _cue_point_key(cp: djaymodels.ADCCuePoint):
+    # Cue points without a comment are saved with the default one.
+    return (cp.number, cp.time,
+            cp.comment or djaymodels.ADCCuePoint.default_comment(cp.time))
+
+
+def same_cue_points(dj_a: djaymodels.DjayTrack,
+                    dj_b: djaymodels.DjayTrack) -> bool:
+    """Whether saving one track over the other leaves cue points as they are.
+    """
+    cps_a = dj_a.user_data.cuePoints if dj_a.user_data else None
+    cps_b = dj_b.user_data.cuePoints if dj_b.user_data else None
+    if cps_a is None or cps_b is None:
+        return cps_a is cps_b
+    return ([_cue_point_key(cp) for cp in cps_a] ==
+            [_cue_point_key(cp) for cp in cps_b])
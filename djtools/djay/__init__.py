@@ -11,4 +11,35 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from djtools.djay.explorer import Explorer  # noqa: F401
+"""djay Pro 2 media library access.
+
+Explorer and AsyncExplorer are imported when first accessed, so importing
+the package (or just its models) doesn't load SQLite, asyncio and the rest of
+the Explorer machinery.
+"""
+import importlib
+import sys
+
+_LAZY_ATTRIBUTES = {
+    'Explorer': 'djtools.djay.explorer',
+    'AsyncExplorer': 'djtools.djay.aio',
+}
+
+
+def __getattr__(name: str):
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
+
+
+if sys.version_info < (3, 7):  # pragma: no cover
+    # No module __getattr__ (PEP 562).
+    from djtools.djay.explorer import Explorer  # noqa: F401
+    from djtools.djay.aio import AsyncExplorer  # noqa: F401
@@ -0,0 +1,155 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""asyncio facade over Explorer.
+
+All SQLite access goes through a single dedicated thread that owns the
+Explorer (and therefore its connection). Bulk unarchiving and archiving run
+on a configurable executor, which may be a ProcessPoolExecutor for CPU-bound
+workloads.
+"""
+import asyncio
+import collections
+import concurrent.futures
+import functools
+from typing import (AsyncIterator, Callable, Deque, Iterable, List,
+                    Optional, Tuple)
+
+from . import explorer
+from . import models
+
+
+def _decode_track(rows: List[explorer.Row]) -> models.DjayTrack:
+    # Executed in the decode executor, possibly in another process.
+    models.register()
+    return explorer.decode_track(rows)
+
+
+def _encode_tracks(
+        tracks: List[models.DjayTrack]) -> List[Tuple[str, str, bytes]]:
+    models.register()
+    rows = []  # type: List[Tuple[str, str, bytes]]
+    for track in tracks:
+        rows.extend(explorer.Explorer.encode_track(track))
+    return rows
+
+
+class AsyncExplorer:
+    """Explorer for asyncio applications.
+
+    Accepts the same arguments as Explorer plus:
+      executor: runs unarchiving/archiving; None uses the loop's default.
+      prefetch: how many tracks iter_tracks decodes ahead of the consumer.
+    """
+
+    def __init__(self, *args,
+                 executor: Optional[concurrent.futures.Executor] = None,
+                 prefetch: int = 16,
+                 **kwargs) -> None:
+        self._db_thread = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='djtools-sqlite')
+        self._executor = executor
+        self._prefetch = max(prefetch, 1)
+        self._closed = False
+        # Explorer connects lazily, so the connection is created (and only
+        # ever used) on the SQLite thread.
+        self._explorer = explorer.Explorer(*args, **kwargs)
+        # The same object for the explorer's lifetime, updated on the SQLite
+        # thread.
+        self._write_stats = self._explorer.write_stats
+
+    async def __aenter__(self) -> 'AsyncExplorer':
+        await self._run_db(self._explorer.connect)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    @property
+    def write_stats(self) -> explorer.WriteStats:
+        """Write statistics as of the last call that returned."""
+        return self._write_stats
+
+    async def _run_db(self, func: Callable, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._db_thread, functools.partial(func, *args, **kwargs))
+
+    async def _run_cpu(self, func: Callable, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def close(self) -> None:
+        """Closes the Explorer and stops the SQLite thread, once."""
+        if self._closed:
+            return
+        self._closed = True
+        await self._run_db(self._explorer.close)
+        self._db_thread.shutdown(wait=True)
+
+    async def load(self) -> None:
+        await self._run_db(self._explorer.load)
+
+    async def get_track_ids(self) -> List[str]:
+        return await self._run_db(self._explorer.get_track_ids)
+
+    async def load_track(self, track_id: str) -> models.DjayTrack:
+        # Through Explorer, so that queued saves and the snapshot are seen.
+        return await self._run_db(self._explorer.load_track, track_id)
+
+    async def query(self, **predicates) -> List[str]:
+        return await self._run_db(self._explorer.query, **predicates)
+
+    async def iter_tracks(
+            self, track_ids: Optional[Iterable[str]] = None
+    ) -> AsyncIterator[models.DjayTrack]:
+        """Yields tracks in order, decoding at most `prefetch` ahead."""
+        if track_ids is None:
+            track_ids = await self.get_track_ids()
+        track_ids = list(track_ids)
+        groups = await self._run_db(self._explorer.group_track_rows,
+                                    track_ids)
+
+        pending: Deque[asyncio.Future] = collections.deque()
+        try:
+            for track_id in track_ids:
+                pending.append(asyncio.ensure_future(
+                    self._run_cpu(_decode_track, groups[track_id])))
+                if len(pending) >= self._prefetch:
+                    yield await pending.popleft()
+            while pending:
+                yield await pending.popleft()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def get_all_tracks(self) -> List[models.DjayTrack]:
+        return [track async for track in self.iter_tracks()]
+
+    async def save_track(self, track: models.DjayTrack) -> None:
+        await self.save_tracks([track])
+
+    async def save_tracks(self, tracks: Iterable[models.DjayTrack]) -> None:
+        if self._explorer.read_only:
+            raise explorer.Error('Media Library opened read-only')
+        tracks = list(tracks)
+        if self._explorer.write_behind:
+            # Queued in order with earlier saves, encoded by the writer.
+            await self._run_db(self._explorer.save_tracks, tracks)
+            return
+        for track in tracks:
+            explorer.Explorer.validate_track(track)
+        batch_size = self._explorer.write_policy.batch_size
+        for batch in explorer.chunks(tracks, batch_size):
+            rows = await self._run_cpu(_encode_tracks, list(batch))
+            await self._run_db(self._explorer.write_tracks, batch, rows)
@@ -11,31 +11,132 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-import getpass
+import copy
+import functools
+import logging
 import os
 import sqlite3
-from typing import List, Optional
+import sys
+import time
+from typing import (TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional,
+                    Sequence, Tuple)
+from urllib.parse import quote
 
 import dataclasses
 
-from bpylist import archiver
+from bpylist import archive_types, archiver
 
+from . import fastarchive
 from . import models
+from . import indexes
+from . import snapshot
+from . import writebehind
+from .rows import Row, RowStore, to_bytes
 
+if TYPE_CHECKING:  # pragma: no cover
+    from . import fulltext  # noqa: F401  pylint: disable=cyclic-import
 
-DEFAULT_MEDIALIBRARY_DB_FILE = ('/Users/{user}/Music/djay Pro 2/'
-                                'djay Media Library.djayMediaLibrary/'
-                                'MediaLibrary.db').format(
-                                    user=getpass.getuser())
+logger = logging.getLogger(__name__)
+
+MEDIALIBRARY_DB_FILE_TEMPLATE = ('/Users/{user}/Music/djay Pro 2/'
+                                 'djay Media Library.djayMediaLibrary/'
+                                 'MediaLibrary.db')
+
+
+@functools.lru_cache(maxsize=None)
+def default_medialibrary_db_file() -> str:
+    """The current user's library. Not computed at import time, looking up
+    the user is comparatively slow."""
+    import getpass  # pylint: disable=import-outside-toplevel
+    return MEDIALIBRARY_DB_FILE_TEMPLATE.format(user=getpass.getuser())
+
+
+def __getattr__(name: str):
+    # DEFAULT_MEDIALIBRARY_DB_FILE used to be a constant.
+    if name == 'DEFAULT_MEDIALIBRARY_DB_FILE':
+        return default_medialibrary_db_file()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+if sys.version_info < (3, 7):  # pragma: no cover
+    # No module __getattr__ (PEP 562).
+    DEFAULT_MEDIALIBRARY_DB_FILE = default_medialibrary_db_file()
+
+# Connection-level tuning applied to every connection opened by Explorer.
+# Negative cache_size is in KiB, mmap_size in bytes, busy_timeout in ms.
+DEFAULT_PRAGMAS = {
+    'cache_size': -16 * 1024,
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,
+}  # type: Dict[str, object]
+
+
+@dataclasses.dataclass
+class WritePolicy:
+    """How Explorer writes while djay may be holding the library open.
+
+    Each batch of `batch_size` tracks is written in its own short
+    `BEGIN IMMEDIATE` transaction. A batch that fails with "database is
+    locked" is rolled back and retried up to `max_retries` times, sleeping
+    `backoff * 2 ** attempt` seconds (capped at `max_backoff`) in between.
+    How long a single attempt waits for the lock is the connection's
+    `busy_timeout` pragma.
+
+    In write-behind mode a batch is written once `batch_size` saves are
+    queued or the oldest queued save is `flush_interval` seconds old.
+    """
+    batch_size: int = 100
+    max_retries: int = 5
+    backoff: float = 0.05
+    max_backoff: float = 2.0
+    flush_interval: float = 0.5
+
+    def __post_init__(self):
+        if self.batch_size < 1:
+            raise ValueError(
+                f'batch_size must be at least 1, got {self.batch_size}')
+        if self.max_retries < 0:
+            raise ValueError(
+                f'max_retries must not be negative, got {self.max_retries}')
+        if not self.backoff >= 0 or not self.max_backoff >= 0:
+            raise ValueError('backoff and max_backoff must not be negative, '
+                             f'got {self.backoff} and {self.max_backoff}')
+
+    def delay(self, attempt: int) -> float:
+        return min(self.max_backoff, self.backoff * 2 ** attempt)
+
+
+@dataclasses.dataclass
+class RetryEvent:
+    attempt: int
+    waited: float
+    delay: float
+    error: str
 
 
 @dataclasses.dataclass
-class Row:
-    rowid: str
-    collection: str
-    key: str
-    data: bytes
-    metadata: bytes
+class WriteStats:
+    transactions: int = 0
+    rows: int = 0
+    retries: int = 0
+    # Seconds spent waiting to acquire the write lock, including retries.
+    lock_wait: float = 0
+    max_lock_wait: float = 0
+    retry_events: List[RetryEvent] = dataclasses.field(default_factory=list)
+
+    def record_lock_wait(self, waited: float):
+        self.lock_wait += waited
+        self.max_lock_wait = max(self.max_lock_wait, waited)
+
+    def merge(self, other: 'WriteStats'):
+        """Adds up stats recorded elsewhere, e.g. by the write-behind
+        thread."""
+        self.transactions += other.transactions
+        self.rows += other.rows
+        self.retries += other.retries
+        self.lock_wait += other.lock_wait
+        self.max_lock_wait = max(self.max_lock_wait, other.max_lock_wait)
+        self.retry_events.extend(other.retry_events)
 
 
 class Error(Exception):
@@ -46,49 +147,261 @@ class BadDataFormatError(Error):
     pass
 
 
+class DatabaseLockedError(Error):
+    pass
+
+
+class UnknownCollectionError(Error):
+    pass
+
+
 def is_supported_version(version_string):
     return version_string == '2.0.9'
 
 
+def is_locked_error(error: sqlite3.OperationalError) -> bool:
+    message = str(error)
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def chunks(items: Sequence, size: int) -> Iterator[Sequence]:
+    for start in range(0, len(items), max(size, 1)):
+        yield items[start:start + size]
+
+
+COLLECTION_TO_FIELD = {
+    'mediaItemUserData': 'user_data',
+    'mediaItemTitleIDs': 'title',
+    'mediaItemAnalyzedData': 'analysis',
+    'localMediaItemLocations': 'local_location',
+    'globalMediaItemLocations': 'global_location',
+    'mediaItems': 'media_item',
+}
+
+# Collections Explorer.encode_track writes, which is all a track needs to be
+# matched and re-encoded.
+ENCODED_COLLECTIONS = [
+    'mediaItemTitleIDs',
+    'mediaItemUserData',
+    'mediaItemAnalyzedData',
+]
+
+
+# Model class the rows of each collection unarchive to, see
+# register_collection().
+COLLECTION_MODELS = {
+    'mediaItemUserData': models.ADCMediaItemUserData,
+    'mediaItemTitleIDs': models.ADCMediaItemTitleID,
+    'mediaItemAnalyzedData': models.ADCMediaItemAnalyzedData,
+    'localMediaItemLocations': models.ADCMediaItemLocation,
+    'globalMediaItemLocations': models.ADCMediaItemLocation,
+    'mediaItems': models.ADCMediaItem,
+    'products': models.ADCProduct,
+}  # type: Dict[str, type]
+
+
+@dataclasses.dataclass
+class CollectionStats:
+    rows: int = 0
+    # Total size of the data and metadata blobs.
+    data_bytes: int = 0
+    metadata_bytes: int = 0
+
+
+def register_collection(collection: str, model: type) -> None:
+    """Decodes rows of collection as model in Explorer.iter_collection.
+
+    model is a bpylist archiver class, e.g. a DataclassArchiver, named like
+    the archived class; it's added to bpylist's class maps.
+    """
+    archiver.update_class_map({model.__name__: model})
+    COLLECTION_MODELS[collection] = model
+
+
+def decode_row(row: Row) -> object:
+    """Unarchives the data of a row of any registered collection."""
+    model = COLLECTION_MODELS.get(row.collection)
+    if model is None:
+        raise UnknownCollectionError(
+            f'No model registered for collection {row.collection}')
+    try:
+        obj = archiver.unarchive(to_bytes(row.data))
+    except (archiver.ArchiverError, archive_types.Error) as e:
+        raise BadDataFormatError(
+            f'Failed to unarchive {row.collection}/{row.key}: {e}') from e
+    if not isinstance(obj, model):
+        raise BadDataFormatError(
+            f'Expected {model.__name__} in {row.collection}/{row.key}, got '
+            f'{type(obj).__name__}')
+    return obj
+
+
+def decode_track(rows: Iterable[Row]) -> models.DjayTrack:
+    field_values = {}
+    for row in rows:
+        field_name = COLLECTION_TO_FIELD.get(row.collection)
+        if field_name is None:
+            # Other collections may be keyed by track UUIDs too.
+            continue
+        field_values[field_name] = archiver.unarchive(to_bytes(row.data))
+    track = models.DjayTrack(**field_values)  # type: ignore
+    return track
+
+
 class Explorer:
+    """Reads and writes the djay Pro 2 media library.
+
+    The explorer keeps a single SQLite connection open for its lifetime and
+    can be used as a context manager to close it deterministically:
+
+        with Explorer(read_only=True) as e:
+            tracks = e.get_all_tracks()
+
+    `read_only` opens the database with `mode=ro`; `immutable` additionally
+    tells SQLite that nobody else modifies the file, which skips locking and
+    change detection and is only safe on a copy or while djay is closed.
+    `pragmas` are merged over DEFAULT_PRAGMAS; pass a value of None to drop a
+    default. Writes follow `write_policy` and are accounted in `write_stats`.
+
+    With `write_behind`, save_track returns right away and a background
+    thread writes queued saves in batches (see writebehind). Reads reflect
+    queued saves immediately; flush() waits for them to be committed and
+    close() flushes.
+    """
     _fname: str = ''
-    _query: str = ("select rowid, collection, key, data, metadata "
-                   "from database2;")
-    _data: Optional[List[Row]] = None
+    _query: str = "select rowid, collection, key, data from database2;"
+    _metadata_query: str = ("select rowid, collection, key, data, metadata "
+                            "from database2;")
+    _collection_query: str = ("select rowid, collection, key, data "
+                              "from database2 where collection=? "
+                              "order by rowid;")
+    _stats_query: str = ("select collection, count(*), "
+                         "coalesce(sum(length(data)), 0), "
+                         "coalesce(sum(length(metadata)), 0) "
+                         "from database2 group by collection "
+                         "order by collection;")
+    _data: Optional[RowStore] = None
+    _conn: Optional[sqlite3.Connection] = None
+    _snapshot: Optional[snapshot.Snapshot] = None
+    _track_index: Optional[indexes.TrackIndex] = None
+    _row_indexes: Optional[Dict[Tuple[str, str], int]] = None
+    _write_queue: Optional[writebehind.WriteBehindQueue] = None
+    _fulltext = None  # type: Optional[fulltext.FullTextIndex]
 
     def __init__(
             self,
-            medialibrary_db_fname: str = DEFAULT_MEDIALIBRARY_DB_FILE
+            medialibrary_db_fname: Optional[str] = None,
+            read_only: bool = False,
+            immutable: bool = False,
+            pragmas: Optional[Dict[str, object]] = None,
+            write_policy: Optional[WritePolicy] = None,
+            write_behind: bool = False,
     ) -> None:
-        self._fname = medialibrary_db_fname
+        self._fname = medialibrary_db_fname or default_medialibrary_db_file()
+        self._read_only = read_only or immutable
+        self._immutable = immutable
+        self._pragmas = dict(DEFAULT_PRAGMAS)
+        self._pragmas.update(pragmas or {})
+        self.write_policy = write_policy or WritePolicy()
+        self._write_stats = WriteStats()
+        self._write_behind = write_behind
+
+    def __enter__(self) -> 'Explorer':
+        self.connect()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
 
-    def from_rows(self, data: List[Row]):
-        models.register()
-        self._data = data
-        self.verify_version()
+    @property
+    def read_only(self) -> bool:
+        return self._read_only
 
-    def load(self):
+    @property
+    def write_behind(self) -> bool:
+        return self._write_behind
+
+    @property
+    def write_stats(self) -> WriteStats:
+        self._apply_committed()
+        return self._write_stats
+
+    @write_stats.setter
+    def write_stats(self, stats: WriteStats) -> None:
+        self._write_stats = stats
+
+    def _uri(self) -> str:
+        params = ['mode=ro' if self._read_only else 'mode=rw']
+        if self._immutable:
+            params.append('immutable=1')
+        # What urllib.request.pathname2url does on macOS, without importing
+        # urllib.request and the HTTP client with it.
+        return 'file:{path}?{params}'.format(
+            path=quote(os.path.abspath(self._fname)),
+            params='&'.join(params))
+
+    def _open_connection(self) -> sqlite3.Connection:
         if not os.path.exists(self._fname):
             raise Error(f"Media Library file not found: {self._fname}")
-        data = []
-        with sqlite3.connect(self._fname) as conn:
-            for row in conn.execute(self._query):
-                data.append(Row(*row))
+        # Autocommit mode, so that write transactions are started explicitly
+        # with BEGIN IMMEDIATE rather than implicitly by the sqlite3 module.
+        conn = sqlite3.connect(self._uri(), uri=True, isolation_level=None)
+        for name, value in self._pragmas.items():
+            if value is not None:
+                conn.execute(f'PRAGMA {name}={value}')
+        return conn
+
+    def connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = self._open_connection()
+        return self._conn
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        return self.connect()
+
+    def close(self) -> None:
+        if self._write_queue is not None:
+            try:
+                self._write_queue.close()
+            finally:
+                self._apply_committed()
+                self._write_queue = None
+        self._drop_snapshot()
+        if self._fulltext is not None:
+            self._fulltext.close()
+            self._fulltext = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def from_rows(self, data: Iterable[Row]):
+        models.register()
+        self._data = (data if isinstance(data, RowStore)
+                      else RowStore.from_rows(data))
+        self._row_indexes = None
+        self._track_index = None
+        self.verify_version()
+
+    def load(self, with_metadata: bool = False):
+        """Reads all rows. metadata is only read when asked for, nothing
+        in djtools uses it."""
+        data = RowStore(with_metadata=with_metadata)
+        query = self._metadata_query if with_metadata else self._query
+        for row in self.connection.execute(query):
+            data.append(*row)
         self.from_rows(data)
 
     @property
-    def data(self) -> List[Row]:
+    def data(self) -> RowStore:
+        self._apply_committed()
         if self._data is None:
             self.load()
         return self._data  # type: ignore
 
     def get_rows(self, key: str = None, collection: str = None) -> List[Row]:
-        results = []
-        for row in self.data:
-            if key is None or row.key == key:
-                if collection is None or row.collection == collection:
-                    results.append(row)
-        return results
+        data = self.data
+        return [data[index] for index in data.find(key, collection)]
 
     def verify_version(self):
         products_rows = self.get_rows(
@@ -101,32 +414,193 @@ class Explorer:
                 "Unsupported djay version?")
         products_row = products_rows[0]
 
-        product = archiver.unarchive(products_row.data)
+        product = archiver.unarchive(to_bytes(products_row.data))
 
         if not is_supported_version(product.version):
             raise BadDataFormatError('Unsupported djay Pro 2 version: ' +
                                      product.version)
 
+    def group_track_rows(
+            self, track_ids: Iterable[str],
+            collections: Optional[Iterable[str]] = None,
+    ) -> Dict[str, List[Row]]:
+        """Returns the rows of the given tracks in a single pass over data.
+
+        Only rows from `collections` are included, so callers that need a
+        few fields don't pay for unarchiving the rest.
+        """
+        collections = set(collections or COLLECTION_TO_FIELD)
+        collections &= set(COLLECTION_TO_FIELD)
+        groups = {t_id: [] for t_id in track_ids}  # type: Dict[str, List[Row]]
+        data = self.data
+        for index, (key, collection) in enumerate(data.key_columns()):
+            group = groups.get(key)
+            if group is not None and collection in collections:
+                group.append(data[index])
+        return groups
+
     def get_track_ids(self) -> List[str]:
-        return [row.key
-                for row in self.get_rows(collection='mediaItemTitleIDs')]
+        if self._snapshot is not None:
+            return self._snapshot.get_track_ids()
+        return self.data.keys('mediaItemTitleIDs')
 
     def load_track(self, track_id: str):
-        rows = self.get_rows(key=track_id)
-        collection_to_field = {
-            'mediaItemUserData': 'user_data',
-            'mediaItemTitleIDs': 'title',
-            'mediaItemAnalyzedData': 'analysis',
-            'localMediaItemLocations': 'local_location',
-            'globalMediaItemLocations': 'global_location',
-            'mediaItems': 'media_item',
-        }
-        field_values = {}
-        for row in rows:
-            field_name = collection_to_field[row.collection]
-            field_values[field_name] = archiver.unarchive(row.data)
-        track = models.DjayTrack(**field_values)  # type: ignore
-        return track
+        if self._write_queue is not None:
+            queued = self._write_queue.get(track_id)
+            if queued is not None:
+                return queued
+        if self._snapshot is not None and track_id in self._snapshot:
+            return self._snapshot.load_track(track_id)
+        return decode_track(self.get_rows(key=track_id))
+
+    def iter_collection_rows(self, collection: str) -> Iterator[Row]:
+        """Streams the rows of any collection, in rowid order.
+
+        Rows are read from the database through a cursor, whether or not the
+        library is loaded. Saves queued in write-behind mode are flushed
+        first.
+        """
+        self.flush()
+        cursor = self.connection.execute(self._collection_query,
+                                         (collection,))
+        try:
+            for row in cursor:
+                yield Row(*row)
+        finally:
+            cursor.close()
+
+    def iter_collection(self, collection: str
+                        ) -> Iterator[Tuple[str, object]]:
+        """Streams (key, object) of a collection, unarchived one row at a
+        time as its model in COLLECTION_MODELS."""
+        if collection not in COLLECTION_MODELS:
+            raise UnknownCollectionError(
+                f'No model registered for collection {collection}, see '
+                'register_collection()')
+        models.register()
+        return ((row.key, decode_row(row))
+                for row in self.iter_collection_rows(collection))
+
+    def collection_stats(self) -> Dict[str, CollectionStats]:
+        """Row counts and blob sizes of every collection.
+
+        Computed by SQLite, which knows blob lengths without reading them.
+        """
+        self.flush()
+        return {collection: CollectionStats(rows, data_bytes, metadata_bytes)
+                for collection, rows, data_bytes, metadata_bytes
+                in self.connection.execute(self._stats_query)}
+
+    def fingerprint(self) -> Dict[str, object]:
+        """Cheap identity of the library state, used to validate snapshots.
+
+        PRAGMA data_version is only comparable within one connection, so
+        across processes the main file's size and mtime and the highest rowid
+        are used instead. The WAL file is recreated, with a new mtime, by
+        whichever connection opens the library first, so only its size counts,
+        and only while it holds uncheckpointed frames.
+        """
+        stat = os.stat(self._fname)
+        result = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+        }  # type: Dict[str, object]
+        try:
+            wal_size = os.stat(self._fname + '-wal').st_size
+        except FileNotFoundError:
+            wal_size = 0
+        if wal_size:
+            result['size-wal'] = wal_size
+        result['max_rowid'] = self.connection.execute(
+            'select max(rowid) from database2').fetchone()[0]
+        return result
+
+    def write_snapshot(self, path: str) -> None:
+        self.flush()
+        if self._snapshot is not None:
+            tracks = self._snapshot.get_all_tracks()
+        else:
+            tracks = self.get_all_tracks()
+        snapshot.write_snapshot(path, self.fingerprint(), tracks)
+
+    def load_snapshot(self, path: str) -> bool:
+        """Serves tracks from the snapshot at path if it's still current.
+
+        Returns False, leaving the explorer reading database2, if the snapshot
+        is missing, unreadable or was written for a different library state.
+        The snapshot is dropped on the next write.
+        """
+        # Queued saves would be missing from the snapshot.
+        self.flush()
+        try:
+            snap = snapshot.Snapshot(path)
+        except (OSError, snapshot.Error):
+            return False
+        if snap.fingerprint != self.fingerprint():
+            snap.close()
+            return False
+        self._drop_snapshot()
+        self._snapshot = snap
+        return True
+
+    def _drop_snapshot(self) -> None:
+        if self._snapshot is not None:
+            self._snapshot.close()
+            self._snapshot = None
+
+    @property
+    def track_index(self) -> indexes.TrackIndex:
+        """Secondary indexes over the library, built once per load."""
+        if self._track_index is None:
+            if self._snapshot is not None:
+                tracks = self._snapshot.get_all_tracks()
+            else:
+                track_ids = self.get_track_ids()
+                groups = self.group_track_rows(track_ids,
+                                               indexes.INDEXED_COLLECTIONS)
+                tracks = [decode_track(groups[t_id]) for t_id in track_ids]
+            if self._write_queue is not None:
+                # Saves not committed yet are indexed as they were queued.
+                queued = self._write_queue.queued()
+                tracks = [queued.get(track.title.uuid, track)
+                          for track in tracks]
+            self._track_index = indexes.TrackIndex(tracks)
+        return self._track_index
+
+    def query(self, **predicates) -> List[str]:
+        """Ids of tracks matching the predicates, see djay.indexes."""
+        return self.track_index.query(**predicates)
+
+    def find_tracks(self, **predicates) -> List[models.DjayTrack]:
+        return [self.load_track(t_id) for t_id in self.query(**predicates)]
+
+    def attach_fulltext(
+            self, fname: Optional[str] = None) -> 'fulltext.FullTextIndex':
+        """Opens (creating if needed) and syncs an FTS5 sidecar index.
+
+        The sidecar defaults to the media library path plus
+        fulltext.SIDECAR_SUFFIX. Tracks saved through this explorer are
+        re-indexed as they are written.
+        """
+        # Imported here, the fulltext module depends on this one.
+        from . import fulltext  # pylint: disable=redefined-outer-name
+        if self._fulltext is not None:
+            self._fulltext.close()
+        self._fulltext = fulltext.FullTextIndex(
+            fname or self._fname + fulltext.SIDECAR_SUFFIX)
+        self._fulltext.sync(self)
+        if self._write_queue is not None:
+            self._fulltext.update(self._write_queue.queued().values())
+        return self._fulltext
+
+    def search(self, text: str, prefix: bool = True,
+               limit: Optional[int] = None) -> List[models.DjayTrack]:
+        """Full-text search over titles and artists, see attach_fulltext."""
+        if self._fulltext is None:
+            self.attach_fulltext()
+        return [self.load_track(t_id) for t_id in
+                self._fulltext.search(  # type: ignore
+                    text, prefix=prefix, limit=limit)]
 
     def find_track(self, track_id: str = None, artist: str = None,
                    title: str = None,
@@ -139,7 +613,7 @@ class Explorer:
         for row in self.get_rows(collection='mediaItemTitleIDs'):
             if track_id is not None and row.key != track_id:
                 continue
-            title_obj = archiver.unarchive(row.data)
+            title_obj = archiver.unarchive(to_bytes(row.data))
 
             if artist is not None and title_obj.artist != artist:
                 continue
@@ -160,22 +634,200 @@ class Explorer:
         return results[0]
 
     def save_track(self, track: models.DjayTrack):
-        self.validate_track(track)
+        self.save_tracks([track])
+
+    def save_tracks(self, tracks: Iterable[models.DjayTrack]):
+        if self._read_only:
+            raise Error(f"Media Library opened read-only: {self._fname}")
+        tracks = list(tracks)
+        for track in tracks:
+            self.validate_track(track)
+
+        if self._write_behind:
+            if self._write_queue is None:
+                self._write_queue = writebehind.WriteBehindQueue(self)
+            self._write_queue.put(tracks)
+            # The snapshot no longer reflects the library.
+            self._drop_snapshot()
+            self._update_indexes(tracks)
+            return
+
+        for batch in chunks(tracks, self.write_policy.batch_size):
+            rows = []  # type: List[Tuple[str, str, bytes]]
+            for track in batch:
+                rows.extend(self.encode_track(track))
+            self.write_tracks(batch, rows)
 
+    @staticmethod
+    def encode_track(
+            track: models.DjayTrack) -> List[Tuple[str, str, bytes]]:
         uuid = track.title.uuid
         rows = []
         rows.append(('mediaItemUserData', uuid,
-                     archiver.archive(track.user_data)))
-        rows.append(('mediaItemTitleIDs', uuid, archiver.archive(track.title)))
+                     fastarchive.archive(track.user_data)))
+        rows.append(('mediaItemTitleIDs', uuid,
+                     fastarchive.archive(track.title)))
         if track.analysis is not None:
             rows.append(('mediaItemAnalyzedData', uuid,
-                         archiver.archive(track.analysis)))
+                         fastarchive.archive(track.analysis)))
+        return rows
+
+    def write_tracks(self, tracks: Iterable[models.DjayTrack],
+                     rows: List[Tuple[str, str, bytes]]):
+        """Writes the encoded rows of tracks and updates the track index."""
+        self.write_rows(rows)
+        self._update_indexes(tracks)
+
+    def _update_indexes(self, tracks: Iterable[models.DjayTrack]):
+        if self._track_index is not None:
+            for track in tracks:
+                self._track_index.update(track)
+        if self._fulltext is not None:
+            self._fulltext.update(tracks)
+
+    def flush(self) -> None:
+        """Waits until saves queued in write-behind mode are committed."""
+        if self._write_queue is not None:
+            self._write_queue.flush()
+            self._apply_committed()
+
+    def _apply_committed(self) -> None:
+        """Catches up with what the write-behind thread committed.
+
+        The thread only runs SQL, so that the explorer's state is only ever
+        changed on the thread using the explorer.
+        """
+        if self._write_queue is None:
+            return
+        committed = self._write_queue.take_committed()
+        written = []  # type: List[str]
+        for rows, stats in committed:
+            self._write_stats.merge(stats)
+            if rows:
+                self._rows_written(rows)
+                written.extend(key for _, key, _ in rows)
+        if written:
+            # Tracks saved again since are indexed as queued already.
+            queued = self._write_queue.queued()
+            self._reindex(t_id for t_id in dict.fromkeys(written)
+                          if t_id not in queued)
+
+    def write_encoded_tracks(self, rows: List[Tuple[str, str, bytes]]):
+        """Writes rows of tracks encoded elsewhere, e.g. in other processes.
+
+        The track index and full-text index are brought up to date from the
+        written rows.
+        """
+        if self._read_only:
+            raise Error(f"Media Library opened read-only: {self._fname}")
+        # Queued saves go first, so they don't overwrite these rows later.
+        self.flush()
+        self.write_rows(rows)
+        self._reindex(dict.fromkeys(key for _, key, _ in rows))
+
+    def _reindex(self, track_ids: Iterable[str]):
+        """Brings the track index and full-text index up to date with the
+        rows of the given tracks in data."""
+        if self._track_index is None and self._fulltext is None:
+            return
+        track_ids = list(track_ids)
+        if not track_ids:
+            return
+        if self._track_index is not None:
+            data = self.data
+            row_indexes = self._row_index()
+            for track_id in track_ids:
+                self._track_index.update(decode_track(
+                    data[row_indexes[(collection, track_id)]]
+                    for collection in indexes.INDEXED_COLLECTIONS
+                    if (collection, track_id) in row_indexes))
+        if self._fulltext is not None:
+            self._fulltext.sync_tracks(self, track_ids)
+
+    def write_rows(self, rows: List[Tuple[str, str, bytes]]):
+        """Writes (collection, key, data) rows, see commit_rows().
+
+        Updates the loaded rows in place instead of reloading the whole
+        library.
+        """
+        # Earlier write-behind commits go first, so they can't overwrite
+        # these rows in data later.
+        self._apply_committed()
+        self.commit_rows(self.connection, rows, self.write_policy,
+                         self._write_stats)
+        self._rows_written(rows)
 
-        query = 'UPDATE database2 set data=? WHERE collection=? AND key=?'
-        with sqlite3.connect(self._fname) as conn:
-            for row in rows:
-                conn.execute(query, (row[2], row[0], row[1]))
-        self.load()
+    @staticmethod
+    def commit_rows(conn: sqlite3.Connection,
+                    rows: List[Tuple[str, str, bytes]],
+                    policy: WritePolicy, stats: WriteStats) -> None:
+        """Writes (collection, key, data) rows in one IMMEDIATE transaction.
+
+        Retries on lock contention according to policy and records into
+        stats. Only conn and stats are touched, so the write-behind thread
+        can call it with its own connection.
+        """
+        update_query = ('UPDATE database2 set data=? '
+                        'WHERE collection=? AND key=?')
+        params = [(data, collection, key) for collection, key, data in rows]
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                waited = time.monotonic() - started
+                stats.record_lock_wait(waited)
+                if waited > 0.1:
+                    logger.debug('Waited %.3fs for the write lock', waited)
+                conn.executemany(update_query, params)
+                conn.execute('COMMIT')
+            except sqlite3.OperationalError as e:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                else:
+                    stats.record_lock_wait(time.monotonic() - started)
+                if not is_locked_error(e):
+                    raise
+                if attempt >= policy.max_retries:
+                    raise DatabaseLockedError(
+                        f'Gave up writing {len(rows)} rows after '
+                        f'{attempt + 1} attempts: {e}') from e
+                delay = policy.delay(attempt)
+                attempt += 1
+                stats.retries += 1
+                stats.retry_events.append(RetryEvent(
+                    attempt=attempt, waited=time.monotonic() - started,
+                    delay=delay, error=str(e)))
+                logger.info('Write attempt %d failed (%s), retrying in %.2fs',
+                            attempt, e, delay)
+                time.sleep(delay)
+                continue
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                raise
+            break
+        stats.transactions += 1
+        stats.rows += len(rows)
+
+    def _rows_written(self, rows: List[Tuple[str, str, bytes]]):
+        self._drop_snapshot()
+        self._apply_rows(rows)
+
+    def _apply_rows(self, rows: List[Tuple[str, str, bytes]]):
+        if self._data is None:
+            return
+        row_indexes = self._row_index()
+        for collection, key, data in rows:
+            index = row_indexes.get((collection, key))
+            if index is not None:
+                self._data.set_data(index, data)
+
+    def _row_index(self) -> Dict[Tuple[str, str], int]:
+        """(collection, key) -> index of the row in data."""
+        if self._row_indexes is None:
+            self._row_indexes = self.data.index_by_key()
+        return self._row_indexes
 
     @staticmethod
     def validate_track(track):
@@ -186,6 +838,31 @@ class Explorer:
                                 'match %s UUID (%s)' % (
                                     track.title.uuid, field_name,
                                     getattr(track, field_name).uuid))
+        # Tracks read without their location rows have no location at all,
+        # but a location that points nowhere is never valid.
+        for field_name in ['local_location', 'global_location']:
+            location = getattr(track, field_name, None)
+            if location is not None and not location.sourceURIs:
+                raise Error(f'Malformed track {track.title.uuid}: '
+                            f'{field_name} has no source URIs')
 
     def get_all_tracks(self):
-        return [self.load_track(t_id) for t_id in self.get_track_ids()]
+        if self._snapshot is not None:
+            return self._snapshot.get_all_tracks()
+        return list(self.iter_tracks())
+
+    def iter_tracks(self) -> Iterator[models.DjayTrack]:
+        """Yields every track, unarchiving one at a time."""
+        if self._snapshot is not None:
+            for track_id in self._snapshot.get_track_ids():
+                yield self._snapshot.load_track(track_id)  # type: ignore
+            return
+        queued = (self._write_queue.queued()
+                  if self._write_queue is not None else {})
+        track_ids = self.get_track_ids()
+        groups = self.group_track_rows(track_ids)
+        for t_id in track_ids:
+            rows = groups.pop(t_id)
+            track = queued.get(t_id)
+            yield (copy.deepcopy(track) if track is not None
+                   else decode_track(rows))
@@ -0,0 +1,209 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Full-text search over the djay library in an SQLite FTS5 sidecar.
+
+The sidecar is a separate database file next to the media library (djay's own
+file is never modified). It holds one FTS5 row per track with the text of its
+ADCMediaItemTitleID and ADCMediaItem, plus a digest of the source blobs so
+that sync() only re-indexes tracks whose rows changed.
+
+ADCMediaItem refers to albums and genres by UUID only, so their names are not
+available for indexing; comments, composer and grouping are.
+"""
+import hashlib
+import sqlite3
+from typing import Dict, Iterable, List, Optional
+
+from . import explorer as djayexplorer
+from . import models
+from .rows import to_bytes
+
+SIDECAR_SUFFIX = '.fts.db'
+
+# Collections a track's indexed text comes from.
+INDEXED_COLLECTIONS = ['mediaItemTitleIDs', 'mediaItems']
+
+# FTS rows are keyed by the rowid of the track in sources, so updating or
+# removing a track never scans the full-text table.
+_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS sources('
+    ' id INTEGER PRIMARY KEY, uuid TEXT NOT NULL UNIQUE, digest BLOB)',
+    'CREATE VIRTUAL TABLE IF NOT EXISTS tracks USING fts5('
+    ' title, artist, stringRepresentation, comments, composer, grouping,'
+    " tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3')",
+]
+
+
+class Error(Exception):
+    pass
+
+
+def digest(blobs: Iterable[bytes]) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    for blob in blobs:
+        h.update(len(blob).to_bytes(8, 'little'))
+        h.update(blob)
+    return h.digest()
+
+
+def prefix_query(text: str) -> str:
+    """Turns free text into an FTS5 query matching every word as a prefix."""
+    terms = []
+    for word in text.split():
+        terms.append('"{}"*'.format(word.replace('"', '""')))
+    return ' '.join(terms)
+
+
+def track_text(track: models.DjayTrack) -> Dict[str, str]:
+    text = {
+        'title': track.title.title or '',
+        'artist': track.title.artist or '',
+        'stringRepresentation': track.title.stringRepresentation or '',
+        'comments': '',
+        'composer': '',
+        'grouping': '',
+    }
+    if track.media_item is not None:
+        text['comments'] = track.media_item.comments or ''
+        text['composer'] = track.media_item.composer or ''
+        text['grouping'] = track.media_item.grouping or ''
+    return text
+
+
+class FullTextIndex:
+    def __init__(self, fname: str) -> None:
+        self.fname = fname
+        self._conn = sqlite3.connect(fname)
+        try:
+            with self._conn:
+                for statement in _SCHEMA:
+                    self._conn.execute(statement)
+        except sqlite3.OperationalError as e:
+            self._conn.close()
+            raise Error(f'SQLite FTS5 is not available: {e}') from e
+
+    def __enter__(self) -> 'FullTextIndex':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __len__(self) -> int:
+        return self._conn.execute('SELECT count(*) FROM sources').fetchone()[0]
+
+    def _update(self, track: models.DjayTrack,
+                source_digest: Optional[bytes]) -> None:
+        uuid = track.title.uuid
+        text = track_text(track)
+        row = self._conn.execute('SELECT id FROM sources WHERE uuid=?',
+                                 (uuid,)).fetchone()
+        if row is None:
+            doc_id = self._conn.execute(
+                'INSERT INTO sources(uuid, digest) VALUES (?,?)',
+                (uuid, source_digest)).lastrowid
+        else:
+            doc_id = row[0]
+            self._conn.execute('UPDATE sources SET digest=? WHERE id=?',
+                               (source_digest, doc_id))
+            self._conn.execute('DELETE FROM tracks WHERE rowid=?', (doc_id,))
+        self._conn.execute(
+            'INSERT INTO tracks(rowid, title, artist, stringRepresentation,'
+            ' comments, composer, grouping) VALUES (?,?,?,?,?,?,?)',
+            (doc_id, text['title'], text['artist'],
+             text['stringRepresentation'], text['comments'],
+             text['composer'], text['grouping']))
+
+    def update(self, tracks: Iterable[models.DjayTrack]) -> None:
+        """Re-indexes the given tracks.
+
+        Their digests are cleared, so the next sync() re-reads them.
+        """
+        with self._conn:
+            for track in tracks:
+                self._update(track, None)
+
+    def remove(self, uuids: Iterable[str]) -> None:
+        with self._conn:
+            for uuid in uuids:
+                row = self._conn.execute('SELECT id FROM sources WHERE uuid=?',
+                                         (uuid,)).fetchone()
+                if row is None:
+                    continue
+                self._conn.execute('DELETE FROM tracks WHERE rowid=?', row)
+                self._conn.execute('DELETE FROM sources WHERE id=?', row)
+
+    def sync(self, explorer: 'djayexplorer.Explorer') -> int:
+        """Brings the index up to date with the explorer's library.
+
+        Only tracks whose title or media item rows changed are unarchived.
+        Returns the number of tracks (re-)indexed.
+        """
+        known = dict(self._conn.execute('SELECT uuid, digest FROM sources'))
+        updated = self._sync(explorer, explorer.get_track_ids(), known)
+        self.remove(known)
+        return updated
+
+    def sync_tracks(self, explorer: 'djayexplorer.Explorer',
+                    track_ids: Iterable[str]) -> int:
+        """sync() for the given tracks only, e.g. after writing them."""
+        track_ids = list(track_ids)
+        known = {}  # type: Dict[str, bytes]
+        for track_id in track_ids:
+            row = self._conn.execute('SELECT digest FROM sources WHERE uuid=?',
+                                     (track_id,)).fetchone()
+            if row is not None:
+                known[track_id] = row[0]
+        return self._sync(explorer, track_ids, known)
+
+    def _sync(self, explorer: 'djayexplorer.Explorer', track_ids: List[str],
+              known: Dict[str, bytes]) -> int:
+        # Pops the tracks it sees from known.
+        groups = explorer.group_track_rows(track_ids, INDEXED_COLLECTIONS)
+        updated = 0
+        with self._conn:
+            for track_id in track_ids:
+                rows = groups[track_id]
+                source_digest = digest(
+                    row.collection.encode() + (to_bytes(row.data) or b'')
+                    for row in rows)
+                if known.pop(track_id, None) == source_digest:
+                    continue
+                self._update(djayexplorer.decode_track(rows), source_digest)
+                updated += 1
+        return updated
+
+    def search(self, text: str, prefix: bool = True,
+               limit: Optional[int] = None) -> List[str]:
+        """Returns UUIDs of matching tracks, best match first.
+
+        With prefix=True every word of text matches as a token prefix,
+        otherwise text is used as a raw FTS5 query, e.g. 'artist:daft'.
+        """
+        match = prefix_query(text) if prefix else text
+        if not match:
+            return []
+        sql = ('SELECT sources.uuid FROM tracks'
+               ' JOIN sources ON sources.id = tracks.rowid'
+               ' WHERE tracks MATCH ? ORDER BY rank')
+        params = [match]  # type: List[object]
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        try:
+            return [row[0] for row in self._conn.execute(sql, params)]
+        except sqlite3.OperationalError as e:
+            raise Error(f'Bad full-text query {match!r}: {e}') from e
@@ -0,0 +1,189 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""In-memory secondary indexes over decoded djay tracks.
+
+Numeric fields are kept in sorted arrays and answer range predicates with
+bisection; discrete fields are kept in hash maps and answer equality
+predicates directly. A query intersects the candidate sets of its predicates,
+smallest first, without decoding any track.
+
+Predicates are passed as keyword arguments: a scalar means equality and a
+(low, high) tuple an inclusive range, either end of which may be None:
+
+    index.query(bpm=(120, 128), keySignatureIndex=8, cueCount=0)
+    index.query(rating=(4, None), playCount=(11, None))
+"""
+import bisect
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from . import models
+
+
+class Error(Exception):
+    pass
+
+
+# Fields answered from sorted arrays.
+RANGE_FIELDS = ('duration', 'bpm', 'keySignatureIndex', 'rating',
+                'playCount', 'cueCount')
+# Fields answered from hash maps.
+EQUALITY_FIELDS = ('artist', 'title', 'keySignatureIndex', 'rating',
+                   'cueCount')
+FIELDS = tuple(sorted(set(RANGE_FIELDS) | set(EQUALITY_FIELDS)))
+
+# Collections track_values() reads, see Explorer.group_track_rows().
+INDEXED_COLLECTIONS = [
+    'mediaItemTitleIDs',
+    'mediaItemAnalyzedData',
+    'mediaItemUserData',
+]
+
+
+def track_values(track: models.DjayTrack) -> Dict[str, object]:
+    """Indexed field values of the track; missing data is left out."""
+    values = {
+        'artist': track.title.artist,
+        'title': track.title.title,
+        'duration': track.title.duration,
+    }  # type: Dict[str, object]
+    if track.analysis is not None:
+        values['bpm'] = track.analysis.bpm
+        values['keySignatureIndex'] = track.analysis.keySignatureIndex
+    if track.user_data is not None:
+        values['rating'] = track.user_data.rating or 0
+        values['playCount'] = track.user_data.playCount or 0
+        values['cueCount'] = len(track.user_data.cuePoints or [])
+    return {name: value for name, value in values.items()
+            if value is not None}
+
+
+def _indexed_values(track: models.DjayTrack) -> Dict[str, object]:
+    # NaN doesn't compare, so it can't be placed in a sorted array.
+    return {name: value for name, value in track_values(track).items()
+            if value == value}  # pylint: disable=comparison-with-itself
+
+
+class _SortedIndex:
+    """Parallel arrays sorted by (value, track_id), so that a track's entry
+    is found by bisection even when most tracks share its value."""
+
+    def __init__(self, pairs: Iterable[Tuple[object, str]] = ()) -> None:
+        pairs = sorted(pairs)
+        self.values = [value for value, _ in pairs]  # type: List
+        self.track_ids = [track_id for _, track_id in pairs]
+
+    def _position(self, value, track_id: str) -> int:
+        start = bisect.bisect_left(self.values, value)
+        end = bisect.bisect_right(self.values, value, start)
+        return bisect.bisect_left(self.track_ids, track_id, start, end)
+
+    def add(self, value, track_id: str) -> None:
+        pos = self._position(value, track_id)
+        self.values.insert(pos, value)
+        self.track_ids.insert(pos, track_id)
+
+    def remove(self, value, track_id: str) -> None:
+        pos = self._position(value, track_id)
+        del self.values[pos]
+        del self.track_ids[pos]
+
+    def range(self, low, high) -> Set[str]:
+        start = 0 if low is None else bisect.bisect_left(self.values, low)
+        end = (len(self.values) if high is None
+               else bisect.bisect_right(self.values, high))
+        return set(self.track_ids[start:end])
+
+
+class TrackIndex:
+    def __init__(self, tracks: Iterable[models.DjayTrack] = ()) -> None:
+        self._values = {}  # type: Dict[str, Dict[str, object]]
+        for track in tracks:
+            self._values[track.title.uuid] = _indexed_values(track)
+        # Built in bulk: one sort per field instead of an insert per track.
+        pairs = {
+            name: [] for name in RANGE_FIELDS
+        }  # type: Dict[str, List[Tuple[object, str]]]
+        self._hashed = {
+            name: {} for name in EQUALITY_FIELDS
+        }  # type: Dict[str, Dict[object, Set[str]]]
+        for track_id, values in self._values.items():
+            for name, value in values.items():
+                if name in pairs:
+                    pairs[name].append((value, track_id))
+                if name in self._hashed:
+                    self._hashed[name].setdefault(value, set()).add(track_id)
+        self._sorted = {name: _SortedIndex(pairs[name])
+                        for name in RANGE_FIELDS}
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __contains__(self, track_id: str) -> bool:
+        return track_id in self._values
+
+    def update(self, track: models.DjayTrack) -> None:
+        """Adds the track or replaces its previously indexed values."""
+        track_id = track.title.uuid
+        self.remove(track_id)
+        values = _indexed_values(track)
+        self._values[track_id] = values
+        for name, value in values.items():
+            if name in self._sorted:
+                self._sorted[name].add(value, track_id)
+            if name in self._hashed:
+                self._hashed[name].setdefault(value, set()).add(track_id)
+
+    def remove(self, track_id: str) -> None:
+        values = self._values.pop(track_id, None)
+        if values is None:
+            return
+        for name, value in values.items():
+            if name in self._sorted:
+                self._sorted[name].remove(value, track_id)
+            if name in self._hashed:
+                matching = self._hashed[name][value]
+                matching.discard(track_id)
+                if not matching:
+                    del self._hashed[name][value]
+
+    def values(self, track_id: str) -> Optional[Dict[str, object]]:
+        return self._values.get(track_id)
+
+    def _candidates(self, name: str, predicate) -> Set[str]:
+        if name not in FIELDS:
+            raise Error(f'Field {name} is not indexed, expected one of '
+                        f'{", ".join(FIELDS)}')
+        if isinstance(predicate, tuple):
+            if name not in self._sorted:
+                raise Error(f'Field {name} only supports equality')
+            low, high = predicate
+            return self._sorted[name].range(low, high)
+        if name in self._hashed:
+            return set(self._hashed[name].get(predicate, ()))
+        return self._sorted[name].range(predicate, predicate)
+
+    def query(self, **predicates) -> List[str]:
+        """Returns ids of the tracks matching all predicates, in id order."""
+        if not predicates:
+            return sorted(self._values)
+        candidates = sorted(
+            (self._candidates(name, predicate)
+             for name, predicate in predicates.items()),
+            key=len)
+        result = candidates[0]
+        for other in candidates[1:]:
+            if not result:
+                break
+            result = result & other
+        return sorted(result)
@@ -38,12 +38,15 @@ class ADCCuePoint(DataclassArchiver):
     number: int = 0
     time: float = 0
 
+    @staticmethod
+    def default_comment(time: float) -> str:
+        """The comment djay shows for a cue point without one."""
+        return '{m}:{s:02d}'.format(m=int(time) // 60, s=int(time) % 60)
+
     @staticmethod
     def encode_archive(obj, archive):
         if not obj.comment:
-            obj.comment = '{m}:{s:02d}'.format(
-                m=int(obj.time) // 60,
-                s=int(obj.time) % 60)
+            obj.comment = ADCCuePoint.default_comment(obj.time)
         return DataclassArchiver.encode_archive(obj, archive)
 
 
@@ -175,21 +178,32 @@ class DjayTrack:
     media_item: Optional[ADCMediaItem] = None
 
 
+# Archived classes, as named in djay's database.
+MODELS = [
+    ADCCuePoint,
+    ADCMediaItem,
+    ADCMediaItemAnalyzedData,
+    ADCMediaItemLocation,
+    ADCMediaItemTitleID,
+    ADCMediaItemUserData,
+    NSMutableData,
+    NSURL,
+    ADCProduct,
+]
+
+_registered = False
+
+
 def register():
-    for dataclass in [
-            ADCCuePoint,
-            ADCMediaItem,
-            ADCMediaItemAnalyzedData,
-            ADCMediaItemLocation,
-            ADCMediaItemTitleID,
-            ADCMediaItemUserData,
-            NSMutableData,
-            NSURL,
-            ADCProduct,
-    ]:
+    """Adds the models to bpylist's class maps. Only does work once."""
+    global _registered  # pylint: disable=global-statement
+    if _registered:
+        return
+    for dataclass in MODELS:
         archiver.update_class_map(
             {dataclass.__name__: dataclass}
         )
     archiver.update_class_map({
         'NSOrderedSet': NSOrderedSetArchiver,
     })
+    _registered = True
@@ -0,0 +1,170 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compact in-memory storage of database2 rows.
+
+RowStore keeps the rows Explorer loads as columns: rowids in an array,
+collection names and keys as lists of shared strings, and all data blobs
+concatenated in one bytearray, addressed by arrays of offsets and lengths.
+Rows are materialized on access as Row tuples whose data is a memoryview
+slice of that buffer, so no per-row bytes object is kept or copied.
+
+Rewritten blobs are kept aside rather than spliced into the buffer, whose
+slices may be in use. metadata is only stored when asked for.
+"""
+import array
+from typing import (Dict, Iterable, Iterator, List, NamedTuple, Optional,
+                    Sequence, Set, Tuple, Union)
+
+Blob = Union[bytes, memoryview]
+
+
+class Row(NamedTuple):
+    rowid: int
+    collection: str
+    key: str
+    data: Optional[Blob]
+    metadata: Optional[bytes] = None
+
+    def __reduce__(self):
+        # memoryviews can't be pickled, e.g. to hand rows to worker processes.
+        return Row, (self.rowid, self.collection, self.key,
+                     to_bytes(self.data), self.metadata)
+
+
+def to_bytes(data: Optional[Blob]) -> Optional[bytes]:
+    """data as bytes, copying memoryviews. bpylist only parses bytes."""
+    if data is None or isinstance(data, bytes):
+        return data
+    return bytes(data)
+
+
+class RowStore(Sequence[Row]):  # pylint: disable=too-many-instance-attributes
+    def __init__(self, with_metadata: bool = False) -> None:
+        self.with_metadata = with_metadata
+        self._rowids = array.array('q')
+        self._collections: List[str] = []
+        self._keys: List[str] = []
+        self._buffer = bytearray()
+        self._offsets = array.array('Q')
+        self._lengths = array.array('Q')
+        # Row index -> blob written after loading; None for NULL data.
+        self._replaced: Dict[int, Optional[bytes]] = {}
+        # Rows whose data is NULL.
+        self._null: Set[int] = set()
+        self._metadata: Optional[List[Optional[bytes]]] = (
+            [] if with_metadata else None)
+        self._strings: Dict[str, str] = {}
+        self._view: Optional[memoryview] = None
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Row]) -> 'RowStore':
+        rows = list(rows)
+        store = cls(with_metadata=any(len(row) > 4 and row[4] is not None
+                                      for row in rows))
+        for row in rows:
+            store.append(*row)
+        return store
+
+    def _shared(self, string: str) -> str:
+        # The same collection names and keys repeat across rows.
+        return self._strings.setdefault(string, string)
+
+    def append(self, rowid: int, collection: str, key: str,
+               data: Optional[Blob], metadata: Optional[bytes] = None
+               ) -> None:
+        index = len(self._rowids)
+        self._rowids.append(rowid)
+        self._collections.append(self._shared(collection))
+        self._keys.append(self._shared(key))
+        self._offsets.append(len(self._buffer))
+        if data is None:
+            self._null.add(index)
+            self._lengths.append(0)
+        else:
+            self._lengths.append(len(data))
+            try:
+                self._buffer += data
+            except BufferError:
+                # Slices of the buffer are in use, they keep the old one
+                # alive.
+                self._buffer = self._buffer + data
+                self._view = None
+        if self._metadata is not None:
+            self._metadata.append(metadata)
+
+    def __len__(self) -> int:
+        return len(self._rowids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return Row(self._rowids[index], self._collections[index],
+                   self._keys[index], self.data(index),
+                   self._metadata[index] if self._metadata is not None
+                   else None)
+
+    def __iter__(self) -> Iterator[Row]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def data(self, index: int) -> Optional[Blob]:
+        """The data of a row, as a memoryview unless rewritten."""
+        if index in self._replaced:
+            return self._replaced[index]
+        if index in self._null:
+            return None
+        if self._view is None:
+            self._view = memoryview(self._buffer)
+        offset = self._offsets[index]
+        return self._view[offset:offset + self._lengths[index]]
+
+    def set_data(self, index: int, data: Optional[bytes]) -> None:
+        self._replaced[index] = data
+
+    def collection(self, index: int) -> str:
+        return self._collections[index]
+
+    def key(self, index: int) -> str:
+        return self._keys[index]
+
+    def key_columns(self) -> Iterator[Tuple[str, str]]:
+        """(key, collection) of every row, in row order."""
+        return zip(self._keys, self._collections)
+
+    def keys(self, collection: str) -> List[str]:
+        """Keys of the rows of a collection, in row order."""
+        return [key for key, row_collection
+                in zip(self._keys, self._collections)
+                if row_collection == collection]
+
+    def find(self, key: Optional[str] = None,
+             collection: Optional[str] = None) -> List[int]:
+        """Indices of the rows matching key and collection, if given."""
+        if key is not None and collection is not None:
+            return [i for i, (k, c) in enumerate(zip(self._keys,
+                                                     self._collections))
+                    if k == key and c == collection]
+        if key is not None:
+            return [i for i, k in enumerate(self._keys) if k == key]
+        if collection is not None:
+            return [i for i, c in enumerate(self._collections)
+                    if c == collection]
+        return list(range(len(self)))
+
+    def index_by_key(self) -> Dict[Tuple[str, str], int]:
+        """(collection, key) -> row index."""
+        return {(collection, key): i for i, (collection, key)
+                in enumerate(zip(self._collections, self._keys))}
@@ -0,0 +1,137 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Snapshot files of the decoded djay library.
+
+A snapshot stores every DjayTrack already unarchived, so a process can answer
+track queries without reading database2 or calling archiver.unarchive. The
+file layout is:
+
+    MAGIC | header length (uint32, little endian) | header | track records
+
+The header is a pickled dict holding the source fingerprint and an index of
+track id -> (offset, length) of each pickled track record. Records are decoded
+on first access straight from a memory map of the file.
+
+Snapshots are pickles: only load files written by this process' user.
+"""
+import mmap
+import os
+import pickle
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from . import models
+
+MAGIC = b'DJTSNAP1'
+_HEADER_LENGTH = struct.Struct('<I')
+
+
+class Error(Exception):
+    pass
+
+
+class BadSnapshotError(Error):
+    pass
+
+
+def write_snapshot(path: str, fingerprint: Dict[str, object],
+                   tracks: Iterable[models.DjayTrack]) -> None:
+    records = []
+    index: Dict[str, Tuple[int, int]] = {}
+    offset = 0
+    for track in tracks:
+        record = pickle.dumps(track, protocol=pickle.HIGHEST_PROTOCOL)
+        index[track.title.uuid] = (offset, len(record))
+        offset += len(record)
+        records.append(record)
+    header = pickle.dumps({'fingerprint': fingerprint, 'index': index},
+                          protocol=pickle.HIGHEST_PROTOCOL)
+
+    # Write next to the target and rename, so readers never see a partial
+    # snapshot.
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(_HEADER_LENGTH.pack(len(header)))
+        f.write(header)
+        for record in records:
+            f.write(record)
+    os.replace(tmp_path, path)
+
+
+class Snapshot:
+    fingerprint: Dict[str, object]
+    _buffer: Union[mmap.mmap, bytes]
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, 'rb') as f:
+            try:
+                self._buffer = mmap.mmap(f.fileno(), 0,
+                                         access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                # Empty files and some filesystems can't be mapped.
+                self._buffer = f.read()
+
+        buf = memoryview(self._buffer)
+        prefix_length = len(MAGIC) + _HEADER_LENGTH.size
+        if len(buf) < prefix_length or bytes(buf[:len(MAGIC)]) != MAGIC:
+            buf.release()
+            self.close()
+            raise BadSnapshotError(f'Not a djtools snapshot: {path}')
+        header_length, = _HEADER_LENGTH.unpack_from(buf, len(MAGIC))
+        self._records_start = prefix_length + header_length
+        try:
+            header = pickle.loads(buf[prefix_length:self._records_start])
+        except Exception as e:  # pylint: disable=broad-except
+            buf.release()
+            self.close()
+            raise BadSnapshotError(f'Corrupt snapshot {path}: {e}') from e
+        buf.release()
+        self.fingerprint = header['fingerprint']
+        self._index: Dict[str, Tuple[int, int]] = header['index']
+
+    def __enter__(self) -> 'Snapshot':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        self._buffer = b''
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, track_id: str) -> bool:
+        return track_id in self._index
+
+    def get_track_ids(self) -> List[str]:
+        return list(self._index)
+
+    def load_track(self, track_id: str) -> Optional[models.DjayTrack]:
+        """Returns a fresh copy of the track, None if it's not in snapshot."""
+        location = self._index.get(track_id)
+        if location is None:
+            return None
+        offset, length = location
+        start = self._records_start + offset
+        with memoryview(self._buffer) as buf:
+            return pickle.loads(buf[start:start + length])
+
+    def get_all_tracks(self) -> List[models.DjayTrack]:
+        return [self.load_track(t_id)  # type: ignore
+                for t_id in self._index]
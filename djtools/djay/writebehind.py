@@ -0,0 +1,196 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Write-behind queue for Explorer.save_track.
+
+Saved tracks are parked in a dict keyed by UUID, so saving a track again
+before it's written only keeps the latest version. A dedicated thread with its
+own SQLite connection writes them in one transaction once
+write_policy.batch_size tracks are pending, once the oldest pending save is
+write_policy.flush_interval seconds old, or when flush() is called.
+
+Until a track is written, get() returns the queued version, which Explorer
+consults before its loaded rows. The thread only runs the SQL transaction;
+the rows and stats it committed are handed back through take_committed(),
+so that the Explorer applies them on its own thread.
+"""
+import copy
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from . import models
+
+if TYPE_CHECKING:  # pragma: no cover
+    from . import explorer as djayexplorer  # pylint: disable=cyclic-import
+
+
+Rows = List[Tuple[str, str, bytes]]
+
+
+class WriteBehindQueue:
+    def __init__(self, explorer: 'djayexplorer.Explorer') -> None:
+        self._explorer = explorer
+        self._policy = explorer.write_policy
+        self._cond = threading.Condition()
+        # Saves not yet picked up by the writer, oldest first.
+        self._pending: Dict[str, models.DjayTrack] = {}
+        # Saves the writer is committing right now.
+        self._in_flight: Dict[str, models.DjayTrack] = {}
+        # Written rows and their stats, not yet applied by the explorer.
+        self._committed: List[Tuple[Rows, 'djayexplorer.WriteStats']] = []
+        self._oldest: Optional[float] = None
+        self._flush_requested = False
+        self._closing = False
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(
+            target=self._run, name='djtools-write-behind', daemon=True)
+        self._thread.start()
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._pending) + len(self._in_flight)
+
+    def put(self, tracks: Iterable[models.DjayTrack]) -> None:
+        # Copied, so that edits after save_track aren't written, as in the
+        # synchronous mode.
+        tracks = [copy.deepcopy(track) for track in tracks]
+        with self._cond:
+            self._raise_error()
+            if self._closing:
+                raise RuntimeError('Write-behind queue is closed')
+            for track in tracks:
+                uuid = track.title.uuid
+                # Re-inserted so that the dict stays in save order.
+                self._pending.pop(uuid, None)
+                self._pending[uuid] = track
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            self._cond.notify_all()
+
+    def get(self, track_id: str) -> Optional[models.DjayTrack]:
+        """The queued version of the track, None if nothing is queued."""
+        with self._cond:
+            track = self._pending.get(track_id)
+            if track is None:
+                track = self._in_flight.get(track_id)
+        return copy.deepcopy(track) if track is not None else None
+
+    def queued(self) -> Dict[str, models.DjayTrack]:
+        with self._cond:
+            tracks = dict(self._in_flight)
+            tracks.update(self._pending)
+        return tracks
+
+    def take_committed(self) -> List[Tuple[Rows, 'djayexplorer.WriteStats']]:
+        """Returns what was written since the last call, oldest first.
+
+        Failed writes come with no rows, their stats still count retries.
+        """
+        with self._cond:
+            committed, self._committed = self._committed, []
+        return committed
+
+    def flush(self) -> None:
+        """Blocks until everything saved so far is committed."""
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while (self._pending or self._in_flight) and self._error is None:
+                self._cond.wait()
+            self._flush_requested = False
+            self._raise_error()
+
+    def close(self) -> None:
+        """Flushes and stops the writer thread."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join()
+        with self._cond:
+            self._raise_error()
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _due(self) -> bool:
+        if not self._pending:
+            return False
+        if self._closing or self._flush_requested:
+            return True
+        if len(self._pending) >= self._policy.batch_size:
+            return True
+        return (time.monotonic() - (self._oldest or 0)
+                >= self._policy.flush_interval)
+
+    def _take_batch(self) -> Optional[List[models.DjayTrack]]:
+        """Waits for a batch to write, None once closed and drained."""
+        with self._cond:
+            # After a failure, wait for the error to be reported before
+            # retrying, so a persistent error doesn't spin.
+            while self._error is not None or not self._due():
+                if self._closing and (not self._pending
+                                      or self._error is not None):
+                    return None
+                timeout = None
+                if self._pending and self._error is None:
+                    timeout = max(0.0, (self._oldest or 0.0)
+                                  + self._policy.flush_interval
+                                  - time.monotonic())
+                self._cond.wait(timeout)
+            uuids = list(self._pending)[:self._policy.batch_size]
+            for uuid in uuids:
+                self._in_flight[uuid] = self._pending.pop(uuid)
+            self._oldest = time.monotonic() if self._pending else None
+            return list(self._in_flight.values())
+
+    def _run(self) -> None:
+        # Imported here, the explorer module imports this one.
+        from .explorer import Explorer, WriteStats
+        conn = None
+        try:
+            while True:
+                batch = self._take_batch()
+                if batch is None:
+                    return
+                stats = WriteStats()
+                try:
+                    if conn is None:
+                        # pylint: disable=protected-access
+                        conn = self._explorer._open_connection()
+                    rows = []
+                    for track in batch:
+                        rows.extend(Explorer.encode_track(track))
+                    Explorer.commit_rows(conn, rows, self._policy, stats)
+                except BaseException as e:  # pylint: disable=broad-except
+                    with self._cond:
+                        self._committed.append(([], stats))
+                        # Put the batch back so that nothing is lost, unless
+                        # it has been saved again meanwhile.
+                        requeued = dict(self._in_flight)
+                        requeued.update(self._pending)
+                        self._pending = requeued
+                        self._in_flight = {}
+                        self._oldest = self._oldest or time.monotonic()
+                        self._error = e
+                        self._cond.notify_all()
+                    continue
+                with self._cond:
+                    self._committed.append((rows, stats))
+                    self._in_flight = {}
+                    self._cond.notify_all()
+        finally:
+            if conn is not None:
+                conn.close()
@@ -0,0 +1,177 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Duplicate tracks in a djay library.
+
+Two tracks are duplicates when they share a source URI (the same file or
+iTunes id imported twice), or when they have the same artist and title, up
+to case, Unicode form and whitespace, and durations within `tolerance`
+seconds. Duplicates of duplicates end up in the same group.
+
+Instead of comparing every pair of tracks, tracks are bucketed by normalized
+URI and by (artist, title, duration // tolerance). Durations are only
+compared within a bucket and the next one up, so the work grows with the
+number of tracks, plus the square of the (small) bucket sizes.
+"""
+import math
+import unicodedata
+import urllib.parse
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from djtools.djay import explorer as djayexplorer
+from djtools.djay import models as djaymodels
+
+DEFAULT_TOLERANCE = 1.0
+
+# Collections duplicate detection looks at.
+DUPLICATE_COLLECTIONS = [
+    'mediaItemTitleIDs',
+    'mediaItemUserData',
+    'localMediaItemLocations',
+    'globalMediaItemLocations',
+]
+
+MetadataKey = Tuple[str, str, int]
+
+
+def normalize_text(text: Optional[str]) -> str:
+    return ' '.join(unicodedata.normalize(
+        'NFKC', text or '').casefold().split())
+
+
+def normalize_uri(url: djaymodels.NSURL) -> str:
+    """The URL, absolute, unquoted and case-folded (macOS volumes are
+    case-insensitive by default)."""
+    uri = url.NSrelative or ''
+    if url.NSbase:
+        uri = urllib.parse.urljoin(url.NSbase, uri)
+    uri = unicodedata.normalize('NFC', urllib.parse.unquote(uri)).casefold()
+    if uri.startswith('file://localhost/'):
+        uri = 'file:///' + uri[len('file://localhost/'):]
+    return uri.rstrip('/')
+
+
+def location_keys(track: djaymodels.DjayTrack) -> Set[str]:
+    keys: Set[str] = set()
+    for location in [track.local_location, track.global_location]:
+        if location is not None:
+            keys.update(normalize_uri(url)
+                        for url in location.sourceURIs or ())
+    keys.discard('')
+    return keys
+
+
+def metadata_key(track: djaymodels.DjayTrack,
+                 tolerance: float = DEFAULT_TOLERANCE
+                 ) -> Optional[MetadataKey]:
+    """Artist, title and duration bucket; None without title or a finite
+    duration."""
+    title = normalize_text(track.title.title)
+    if not title or track.title.duration is None:
+        return None
+    bucket = track.title.duration / tolerance
+    if not math.isfinite(bucket):
+        return None
+    return (normalize_text(track.title.artist), title, math.floor(bucket))
+
+
+def cue_point_count(track: djaymodels.DjayTrack) -> int:
+    if track.user_data is None:
+        return 0
+    return len(track.user_data.cuePoints or [])
+
+
+class _DisjointSet:
+    def __init__(self, size: int) -> None:
+        self._parent = list(range(size))
+
+    def find(self, item: int) -> int:
+        parent = self._parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, a: int, b: int) -> None:
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            # The smaller index stays root, keeping groups in track order.
+            self._parent[max(root_a, root_b)] = min(root_a, root_b)
+
+
+def _union_duplicates(tracks: List[djaymodels.DjayTrack],
+                      tolerance: float) -> _DisjointSet:
+    sets = _DisjointSet(len(tracks))
+    by_location: Dict[str, int] = {}
+    by_metadata: Dict[MetadataKey, List[int]] = {}
+    for index, track in enumerate(tracks):
+        for uri in location_keys(track):
+            # Same file, no need to compare anything else.
+            sets.union(by_location.setdefault(uri, index), index)
+        key = metadata_key(track, tolerance)
+        if key is not None:
+            by_metadata.setdefault(key, []).append(index)
+
+    for (artist, title, bucket), indices in by_metadata.items():
+        # Durations within tolerance are in the same or adjacent buckets.
+        upper = by_metadata.get((artist, title, bucket + 1), [])
+        _union_close_durations(sets, tracks, indices, upper, tolerance)
+    return sets
+
+
+def _union_close_durations(sets: _DisjointSet,
+                           tracks: List[djaymodels.DjayTrack],
+                           indices: List[int], upper: List[int],
+                           tolerance: float) -> None:
+    for position, a in enumerate(indices):
+        duration = tracks[a].title.duration
+        for b in indices[position + 1:] + upper:
+            if abs(tracks[b].title.duration - duration) <= tolerance:
+                sets.union(a, b)
+
+
+def find_duplicates(tracks: Iterable[djaymodels.DjayTrack],
+                    tolerance: float = DEFAULT_TOLERANCE
+                    ) -> List[List[djaymodels.DjayTrack]]:
+    """Groups of two or more duplicate tracks.
+
+    Each group starts with the track with the most cue points, the rest
+    keep their original order; groups are in the order of their first track.
+    """
+    # Not 'tolerance <= 0', which lets NaN through.
+    if not tolerance > 0:  # pylint: disable=unnecessary-negation
+        raise ValueError(f'tolerance must be positive, got {tolerance}')
+    tracks = list(tracks)
+    sets = _union_duplicates(tracks, tolerance)
+    groups: Dict[int, List[int]] = {}
+    for index in range(len(tracks)):
+        groups.setdefault(sets.find(index), []).append(index)
+    # sorted() is stable, so ties keep their original order.
+    return [sorted((tracks[i] for i in indices),
+                   key=lambda track: -cue_point_count(track))
+            for indices in groups.values() if len(indices) > 1]
+
+
+def explorer_duplicates(explorer: djayexplorer.Explorer,
+                        tolerance: float = DEFAULT_TOLERANCE
+                        ) -> List[List[str]]:
+    """find_duplicates() for the whole library, as groups of track ids.
+
+    Only titles, user data and locations are unarchived.
+    """
+    track_ids = explorer.get_track_ids()
+    groups = explorer.group_track_rows(track_ids, DUPLICATE_COLLECTIONS)
+    tracks = (djayexplorer.decode_track(groups.pop(track_id))
+              for track_id in track_ids)
+    return [[track.title.uuid for track in group]
+            for group in find_duplicates(tracks, tolerance)]
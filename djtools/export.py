@@ -0,0 +1,231 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Streaming export of djay tracks to rekordbox XML.
+
+XmlWriter writes one TRACK element per djay track as it's handed over, so
+exporting a library never holds more than the current track in memory:
+
+    with XmlWriter('export.xml') as w:
+        for track in explorer.iter_tracks():
+            w.write_track(track)
+
+Cue points become hot cues (POSITION_MARK Num 0..7 in djay's order) and the
+start point becomes a memory cue (Num -1). BPM and key come from
+ADCMediaItemAnalyzedData; no TEMPO beat grid is written, since djay doesn't
+store where the first beat is in a form rekordbox understands.
+"""
+import os
+from typing import IO, Dict, Iterable, List, Optional, Union
+from xml.sax.saxutils import quoteattr
+
+from djtools.djay import models as djaymodels
+
+PRODUCT_NAME = 'djtools'
+HOT_CUE_COUNT = 8
+MEMORY_CUE = -1
+
+# rekordbox Tonality names by djay keySignatureIndex: semitones from C, each
+# as major then minor.
+KEY_SIGNATURES = [
+    'C', 'Cm', 'Db', 'C#m', 'D', 'Dm', 'Eb', 'Ebm', 'E', 'Em', 'F', 'Fm',
+    'F#', 'F#m', 'G', 'Gm', 'Ab', 'G#m', 'A', 'Am', 'Bb', 'Bbm', 'B', 'Bm',
+]
+
+# Colors rekordbox uses for hot cues A-H.
+HOT_CUE_COLORS = [
+    (230, 40, 40), (40, 226, 20), (48, 90, 255), (255, 140, 0),
+    (255, 18, 123), (16, 177, 118), (224, 100, 27), (165, 225, 22),
+]
+
+# Digits reserved for the COLLECTION Entries attribute, see XmlWriter.close.
+_ENTRIES_WIDTH = 10
+
+
+class Error(Exception):
+    pass
+
+
+def tonality(key_signature_index: int) -> Optional[str]:
+    if 0 <= key_signature_index < len(KEY_SIGNATURES):
+        return KEY_SIGNATURES[key_signature_index]
+    return None
+
+
+def track_location(track: djaymodels.DjayTrack) -> str:
+    """The file:// URL of the track in rekordbox's spelling, '' if unknown."""
+    for location in (track.local_location, track.global_location):
+        if location is None:
+            continue
+        urls = sorted(url.NSrelative or '' for url in location.sourceURIs or ())
+        for url in urls:
+            if url.startswith('file:///'):
+                return 'file://localhost/' + url[len('file:///'):]
+    return ''
+
+
+def _attrs(**values) -> str:
+    return ''.join(f' {name}={quoteattr(str(value))}'
+                   for name, value in values.items())
+
+
+def _position_mark(cue_point: djaymodels.ADCCuePoint, num: int) -> str:
+    attrs = _attrs(Name=cue_point.comment or '', Type=0,
+                   Start=f'{cue_point.time:.3f}', Num=num)
+    if num != MEMORY_CUE:
+        red, green, blue = HOT_CUE_COLORS[num]
+        attrs += _attrs(Red=red, Green=green, Blue=blue)
+    return f'      <POSITION_MARK{attrs}/>\n'
+
+
+def track_element(track_id: int, track: djaymodels.DjayTrack) -> str:
+    """Renders a COLLECTION/TRACK element for the djay track."""
+    title = track.title
+    attrs: Dict[str, object] = {
+        'TrackID': track_id,
+        'Name': title.title or '',
+        'Artist': title.artist or '',
+        'Album': '',
+        'TotalTime': int(title.duration or 0),
+        'Location': track_location(track),
+    }
+    if track.analysis is not None:
+        if track.analysis.bpm:
+            attrs['AverageBpm'] = f'{track.analysis.bpm:.2f}'
+        key = tonality(track.analysis.keySignatureIndex)
+        if key is not None:
+            attrs['Tonality'] = key
+
+    marks: List[str] = []
+    user_data = track.user_data
+    if user_data is not None:
+        if user_data.startPoint is not None:
+            marks.append(_position_mark(user_data.startPoint, MEMORY_CUE))
+        cue_points = sorted(user_data.cuePoints or [],
+                            key=lambda cp: cp.number)
+        for num, cue_point in enumerate(cue_points[:HOT_CUE_COUNT]):
+            marks.append(_position_mark(cue_point, num))
+
+    if not marks:
+        return f'    <TRACK{_attrs(**attrs)}/>\n'
+    return f'    <TRACK{_attrs(**attrs)}>\n{"".join(marks)}    </TRACK>\n'
+
+
+class XmlWriter:
+    def __init__(self, output: Union[str, IO[str]],
+                 entries: Optional[int] = None) -> None:
+        """Starts a rekordbox XML document.
+
+        output is a path or a text file object. A path is written to a
+        temporary file that replaces it once the writer is closed.
+
+        The COLLECTION Entries count is filled in by close() when the output
+        is seekable. Unseekable outputs need the number of tracks up front as
+        entries, and close() checks that this many were written.
+        """
+        self._file: IO[str]
+        self._path: Optional[str] = None
+        if isinstance(output, str):
+            self._path = output
+            self._file = open(  # pylint: disable=consider-using-with
+                output + '.tmp', 'w', encoding='utf-8')
+        else:
+            self._file = output
+            if entries is None and not output.seekable():
+                raise Error('entries is required for unseekable outputs')
+        self.count = 0
+        self._entries = entries
+        self._closed = False
+        self._file.write('<?xml version="1.0" encoding="UTF-8"?>\n\n'
+                         '<DJ_PLAYLISTS Version="1.0.0">\n'
+                         f'  <PRODUCT{_attrs(Name=PRODUCT_NAME)}/>\n'
+                         '  <COLLECTION Entries="')
+        self._entries_offset = None  # type: Optional[int]
+        if entries is None:
+            self._entries_offset = self._file.tell()
+        self._file.write(str(entries or 0).zfill(_ENTRIES_WIDTH) + '">\n')
+
+    def __enter__(self) -> 'XmlWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write_track(self, track: djaymodels.DjayTrack,
+                    track_id: Optional[int] = None) -> int:
+        """Appends the track, returns its TrackID.
+
+        TrackIDs are numbered from 1 in write order unless given.
+        """
+        if self._closed:
+            raise Error('Writing to a closed XmlWriter')
+        self.count += 1
+        if track_id is None:
+            track_id = self.count
+        self._file.write(track_element(track_id, track))
+        return track_id
+
+    def write_tracks(self, tracks: Iterable[djaymodels.DjayTrack]) -> int:
+        for track in tracks:
+            self.write_track(track)
+        return self.count
+
+    def close(self) -> None:
+        """Finishes the document."""
+        if self._closed:
+            return
+        if self._entries is not None and self.count != self._entries:
+            self.abort()
+            raise Error(f'Expected {self._entries} tracks, '
+                        f'{self.count} were written')
+        self._closed = True
+        self._file.write('  </COLLECTION>\n'
+                         '  <PLAYLISTS>\n'
+                         '    <NODE Type="0" Name="ROOT" Count="0"/>\n'
+                         '  </PLAYLISTS>\n'
+                         '</DJ_PLAYLISTS>\n')
+        if self._entries_offset is not None:
+            end = self._file.tell()
+            self._file.seek(self._entries_offset)
+            self._file.write(str(self.count).zfill(_ENTRIES_WIDTH))
+            self._file.seek(end)
+        if self._path is None:
+            self._file.flush()
+        else:
+            self._file.close()
+            os.replace(self._path + '.tmp', self._path)
+
+    def abort(self) -> None:
+        """Stops writing without finishing the document.
+
+        A path is left untouched, a file object is left without its closing
+        tags, so that it can't be mistaken for a complete export.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._path is None:
+            self._file.flush()
+        else:
+            self._file.close()
+            os.unlink(self._path + '.tmp')
+
+
+def write_xml_file(file_path: str,
+                   tracks: Iterable[djaymodels.DjayTrack]) -> int:
+    """Exports the tracks to file_path, returns the number written."""
+    with XmlWriter(file_path) as writer:
+        return writer.write_tracks(tracks)
@@ -11,7 +11,8 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from typing import Iterable, Optional
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from djtools.djay import models as djaymodels
 from djtools.rekordbox import models as rbmodels
@@ -46,3 +47,36 @@ def find_matching_track(
     if candidates:
         return candidates[0]
     return None
+
+
+class MatchIndex:
+    """Rekordbox tracks bucketed by whole seconds of TotalTime.
+
+    find() returns the same track as find_matching_track over the indexed
+    tracks, but only looks at tracks within a second of the djay duration.
+    The index isn't modified after construction, so it can be shared with
+    worker processes.
+    """
+
+    def __init__(self, rb_ts: Iterable[rbmodels.Track]) -> None:
+        self._buckets: Dict[int, List[Tuple[int, rbmodels.Track]]] = {}
+        for position, rb_t in enumerate(rb_ts):
+            if rb_t.TotalTime is None:
+                continue
+            self._buckets.setdefault(int(rb_t.TotalTime), []).append(
+                (position, rb_t))
+
+    def __len__(self) -> int:
+        return sum(len(bucket) for bucket in self._buckets.values())
+
+    def candidates(self, dj_t: djaymodels.DjayTrack) -> List[rbmodels.Track]:
+        """Tracks that may match dj_t's duration, in original order."""
+        second = math.floor(dj_t.title.duration)
+        found: List[Tuple[int, rbmodels.Track]] = []
+        for bucket in range(second - 1, second + 2):
+            found.extend(self._buckets.get(bucket, ()))
+        found.sort(key=lambda item: item[0])
+        return [rb_t for _, rb_t in found]
+
+    def find(self, dj_t: djaymodels.DjayTrack) -> Optional[rbmodels.Track]:
+        return find_matching_track(dj_t, self.candidates(dj_t))
@@ -12,3 +12,5 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 from .models import parse_xml_file, parse_dj_collection  # noqa: F401
+from .offsets import OffsetIndex  # noqa: F401
+from .models import parse_library_file, parse_dj_library  # noqa: F401
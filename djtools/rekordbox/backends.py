@@ -0,0 +1,96 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""XML parser backends for rekordbox exports.
+
+A backend is a function streaming the COLLECTION tracks of an XML file. The
+standard library's 'stdlib' backend is used unless another one is named.
+'lxml' can be requested when lxml is installed (`pip install Djtools[lxml]`);
+benchmarks/rekordbox_parse.py measures it no faster, as most of the time goes
+to Track.parse rather than XML parsing. Both hand every TRACK element to
+Track.parse and discard it afterwards, so they produce identical results
+without holding the whole collection in memory.
+"""
+import xml.etree.ElementTree as ET
+from typing import Callable, Dict, Iterator, Optional
+
+from . import models
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:  # pragma: no cover
+    lxml_etree = None
+
+Backend = Callable[[str], Iterator[models.Track]]
+
+
+class Error(Exception):
+    pass
+
+
+def iter_tracks_stdlib(file_path: str) -> Iterator[models.Track]:
+    depth = 0
+    collection = None
+    # Opened here, so that returning early closes the file.
+    with open(file_path, 'rb') as f:
+        for event, elem in ET.iterparse(f, events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                if depth == 2 and elem.tag == 'COLLECTION':
+                    collection = elem
+                continue
+            depth -= 1
+            if elem is collection:
+                # Nothing after the collection is needed, e.g. PLAYLISTS.
+                return
+            if depth == 2 and collection is not None and elem.tag == 'TRACK':
+                yield models.Track.parse(elem)
+                # The finished track is the only child kept by the collection.
+                collection.clear()
+
+
+def iter_tracks_lxml(file_path: str) -> Iterator[models.Track]:
+    if lxml_etree is None:
+        raise Error('lxml is not installed')
+    # Opened here, so that returning early closes the file.
+    with open(file_path, 'rb') as f:
+        for _, elem in lxml_etree.iterparse(f, events=('end',),
+                                            tag=('TRACK', 'COLLECTION')):
+            if elem.tag == 'COLLECTION':
+                # Nothing after the collection is needed, e.g. PLAYLISTS.
+                return
+            parent = elem.getparent()
+            if parent.tag == 'COLLECTION':
+                yield models.Track.parse(elem)
+            elem.clear()
+            # Drop already processed siblings, lxml keeps them referenced.
+            while elem.getprevious() is not None:
+                del parent[0]
+
+
+BACKENDS: Dict[str, Backend] = {
+    'stdlib': iter_tracks_stdlib,
+    'lxml': iter_tracks_lxml,
+}
+
+
+def get_backend(name: Optional[str] = None) -> Backend:
+    """Returns the named backend, or the default 'stdlib' one."""
+    name = name or 'stdlib'
+    if name == 'lxml' and lxml_etree is None:
+        raise Error('lxml backend requested but lxml is not installed')
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise Error(f'Unknown rekordbox parser backend: {name}, expected one '
+                    f'of {", ".join(BACKENDS)}') from None
@@ -11,9 +11,12 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import array
+import functools
 import os
 # pylint: disable=unused-import
-from typing import Dict, Iterable  # noqa: F401
+from typing import (Callable, Dict, Iterable, Iterator, List,  # noqa: F401
+                    Optional, Tuple, cast)
 # pylint: enable=unused-import
 import xml.etree.ElementTree as ET
 
@@ -22,6 +25,25 @@ import dataclasses
 DEFAULT_PATH = os.getenv('HOME', '') + "/Documents/rekordbox.xml"
 
 
+@functools.lru_cache(maxsize=None)
+def _field_types(cls) -> Tuple[Tuple[str, Callable[[str], object]], ...]:
+    # dataclasses.fields() is too slow to call for every parsed element. The
+    # parsed classes annotate every field with a type, never a string.
+    return tuple((field.name, cast(Callable[[str], object], field.type))
+                 for field in dataclasses.fields(cls))
+
+
+def _parse_fields(cls, element) -> Dict[str, object]:
+    field_values = {}  # type: Dict[str, object]
+    get = element.get
+    for name, field_type in _field_types(cls):
+        field_value = get(name)
+        if field_value is not None:
+            field_value = field_type(field_value)
+        field_values[name] = field_value
+    return field_values
+
+
 @dataclasses.dataclass
 class Track:
     TrackID: int
@@ -34,12 +56,7 @@ class Track:
 
     @classmethod
     def parse(cls, track: ET.Element):
-        field_values = {}  # type: Dict[str, object]
-        for field in dataclasses.fields(cls):
-            field_value = track.get(field.name)
-            if field_value is not None:
-                field_value = field.type(field_value)
-            field_values[field.name] = field_value
+        field_values = _parse_fields(cls, track)
 
         cps = []
         for mark in track.findall('POSITION_MARK'):
@@ -60,13 +77,171 @@ class CuePoint:
 
     @classmethod
     def parse(cls, position_mark: ET.Element):
-        field_values = {}
-        for field in dataclasses.fields(cls):
-            field_value = position_mark.get(field.name)
-            if field_value is not None:
-                field_value = field.type(field_value)
-            field_values[field.name] = field_value
-        return cls(**field_values)  # type: ignore
+        return cls(**_parse_fields(cls, position_mark))  # type: ignore
+
+
+# Playlist node types.
+FOLDER = 0
+PLAYLIST = 1
+
+# What TRACK Key attributes of a playlist refer to.
+KEY_TYPE_TRACK_ID = 0
+KEY_TYPE_LOCATION = 1
+
+
+@dataclasses.dataclass
+class Playlist:
+    """A PLAYLISTS/NODE element: a folder or a playlist.
+
+    Playlist entries are kept as a compact array of TrackIDs; use
+    Library.playlist_tracks to resolve them.
+    """
+    Name: str = ""
+    Type: int = FOLDER
+    TrackIDs: array.array = dataclasses.field(
+        default_factory=lambda: array.array('q'))
+    Children: list = dataclasses.field(default_factory=list)
+
+    def __post_init__(self):
+        self._members = None  # type: Optional[frozenset]
+
+    @property
+    def is_folder(self) -> bool:
+        return self.Type == FOLDER
+
+    def __contains__(self, track_id: int) -> bool:
+        if self._members is None:
+            self._members = frozenset(self.TrackIDs)
+        return track_id in self._members
+
+    def __len__(self) -> int:
+        return len(self.TrackIDs)
+
+    def __bool__(self) -> bool:
+        # An empty playlist or folder is still a node, not a missing one.
+        return True
+
+    def walk(self) -> Iterator['Playlist']:
+        """Yields this node and all nodes below it, depth first."""
+        yield self
+        for child in self.Children:
+            yield from child.walk()
+
+    @classmethod
+    def parse(cls, node: ET.Element,
+              track_ids_by_location: Optional[Dict[str, int]] = None):
+        track_ids = array.array('q')
+        children = []
+        by_location = node.get('KeyType') == str(KEY_TYPE_LOCATION)
+        for child in node:
+            if child.tag == 'NODE':
+                children.append(cls.parse(child, track_ids_by_location))
+            elif child.tag == 'TRACK':
+                key = child.get('Key')
+                if key is None:
+                    continue
+                if by_location:
+                    track_id = (track_ids_by_location or {}).get(key)
+                    if track_id is not None:
+                        track_ids.append(track_id)
+                else:
+                    track_ids.append(int(key))
+        return cls(Name=node.get('Name', ''), Type=int(node.get('Type', 0)),
+                   TrackIDs=track_ids, Children=children)
+
+
+@dataclasses.dataclass
+class Library:
+    """Tracks indexed by TrackID plus the playlist tree.
+
+    Playlists only store TrackIDs, tracks are resolved through the index, so
+    every Track object exists once regardless of how many playlists it's in.
+    """
+    tracks: Dict[int, Track] = dataclasses.field(default_factory=dict)
+    playlists: Playlist = dataclasses.field(default_factory=Playlist)
+
+    def __post_init__(self):
+        self._membership = None  # type: Optional[Dict[int, List[Playlist]]]
+
+    def add_track(self, track: Track) -> None:
+        self.tracks[track.TrackID] = track
+
+    def get_track(self, track_id: int) -> Optional[Track]:
+        return self.tracks.get(track_id)
+
+    def iter_playlists(self) -> Iterator[Playlist]:
+        """Yields all playlists (not folders) depth first."""
+        for node in self.playlists.walk():
+            if not node.is_folder:
+                yield node
+
+    def find_playlist(self, *path: str) -> Optional[Playlist]:
+        """Looks a node up by its names below the root node, e.g.
+        find_playlist('Sets', '2018', 'Warmup')."""
+        node = self.playlists
+        for name in path:
+            for child in node.Children:
+                if child.Name == name:
+                    node = child
+                    break
+            else:
+                return None
+        return node
+
+    def playlist_tracks(self, playlist: Playlist) -> List[Track]:
+        """Tracks of the playlist in order, skipping unknown TrackIDs."""
+        tracks = self.tracks
+        return [tracks[track_id] for track_id in playlist.TrackIDs
+                if track_id in tracks]
+
+    def playlists_containing(self, track_id: int) -> List[Playlist]:
+        if self._membership is None:
+            membership = {}  # type: Dict[int, List[Playlist]]
+            for playlist in self.iter_playlists():
+                for member in set(playlist.TrackIDs):
+                    membership.setdefault(member, []).append(playlist)
+            self._membership = membership
+        return self._membership.get(track_id, [])
+
+
+def _track_ids_by_location(tracks: Iterable[Track]) -> Dict[str, int]:
+    return {track.Location: track.TrackID for track in tracks}
+
+
+def parse_dj_library(dj_playlists: ET.Element) -> Library:
+    library = Library()
+    for track in parse_dj_collection(dj_playlists):
+        library.add_track(track)
+    root_node = dj_playlists.find('PLAYLISTS/NODE')
+    if root_node is not None:
+        library.playlists = Playlist.parse(
+            root_node, _track_ids_by_location(library.tracks.values()))
+    return library
+
+
+def parse_library_file(file_path: str = DEFAULT_PATH) -> Library:
+    """Streams COLLECTION and PLAYLISTS of the file into a Library."""
+    library = Library()
+    depth = 0
+    collection = None
+    for event, elem in ET.iterparse(file_path, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if depth == 2 and elem.tag == 'COLLECTION':
+                collection = elem
+            continue
+        depth -= 1
+        if depth == 2 and collection is not None and elem.tag == 'TRACK':
+            library.add_track(Track.parse(elem))
+            collection.clear()
+        elif depth == 1 and elem.tag == 'COLLECTION':
+            collection = None
+        elif depth == 2 and elem.tag == 'NODE':
+            # Only the PLAYLISTS subtree is kept in memory until here.
+            library.playlists = Playlist.parse(
+                elem, _track_ids_by_location(library.tracks.values()))
+            elem.clear()
+    return library
 
 
 def parse_dj_collection(dj_collection: ET.Element) -> Iterable[Track]:
@@ -78,7 +253,9 @@ def parse_dj_collection(dj_collection: ET.Element) -> Iterable[Track]:
     return collection
 
 
-def parse_xml_file(file_path: str = DEFAULT_PATH) -> Iterable[Track]:
-    tree = ET.parse(file_path)
-    root = tree.getroot()
-    return parse_dj_collection(root)
+def parse_xml_file(file_path: str = DEFAULT_PATH,
+                   backend: Optional[str] = None) -> Iterable[Track]:
+    """Parses COLLECTION tracks of the file, see rekordbox.backends."""
+    # Imported here, backends build on the models in this module.
+    from . import backends  # pylint: disable=cyclic-import
+    return list(backends.get_backend(backend)(file_path))
@@ -0,0 +1,188 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Random access to tracks of a rekordbox XML export.
+
+OffsetIndex maps each COLLECTION/TRACK TrackID to the byte range of its
+element in the XML file. The index is built in one streaming expat pass and
+saved to a sidecar file (the XML path plus INDEX_SUFFIX), which is reused as
+long as the XML file's size and mtime are unchanged. Lookups parse only the
+requested slices of a memory map of the XML file.
+"""
+import array
+import mmap
+import os
+import re
+import struct
+import xml.etree.ElementTree as ET
+import xml.parsers.expat
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import models
+
+INDEX_SUFFIX = '.idx'
+MAGIC = b'DJTRBX1\n'
+# XML size, XML mtime in ns, number of tracks.
+_HEADER = struct.Struct('<QQQ')
+_CHUNK_SIZE = 1 << 20
+
+# The remainder of a start tag, honoring '>' inside quoted attribute values.
+_START_TAG_END = re.compile(rb'''(?:[^"'>]|"[^"]*"|'[^']*')*>''')
+_END_TAG = re.compile(rb'</TRACK\s*>')
+
+
+class Error(Exception):
+    pass
+
+
+class StaleIndexError(Error):
+    pass
+
+
+def _element_end(buf, start: int) -> int:
+    match = _START_TAG_END.match(buf, start)
+    if match is None:
+        raise Error(f'Unterminated tag at byte {start}')
+    return match.end()
+
+
+def scan_offsets(buf) -> Dict[int, Tuple[int, int]]:
+    """Returns TrackID -> (start, end) byte offsets of COLLECTION tracks.
+
+    buf is the whole file as bytes or a memory map; it's fed to the parser
+    in chunks.
+    """
+    offsets = {}  # type: Dict[int, Tuple[int, int]]
+    parser = xml.parsers.expat.ParserCreate()
+    path = []  # type: List[str]
+    # TrackID and start offset of the TRACK element being parsed.
+    current = []  # type: List[Tuple[int, int]]
+
+    def start_element(name, attrs):
+        path.append(name)
+        if name == 'TRACK' and path[-2:-1] == ['COLLECTION']:
+            start = parser.CurrentByteIndex
+            tag_end = _element_end(buf, start)
+            if buf[tag_end - 2:tag_end - 1] == b'/':
+                offsets[int(attrs['TrackID'])] = (start, tag_end)
+            else:
+                current.append((int(attrs['TrackID']), start))
+
+    def end_element(name):
+        path.pop()
+        if name == 'TRACK' and current and path[-1:] == ['COLLECTION']:
+            track_id, start = current.pop()
+            match = _END_TAG.match(buf, parser.CurrentByteIndex)
+            if match is None:
+                raise Error(f'Malformed end of TRACK {track_id}')
+            offsets[track_id] = (start, match.end())
+
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    for pos in range(0, len(buf), _CHUNK_SIZE):
+        parser.Parse(buf[pos:pos + _CHUNK_SIZE], False)
+    parser.Parse(b'', True)
+    return offsets
+
+
+def _stat_key(stat: os.stat_result) -> Tuple[int, int]:
+    return stat.st_size, stat.st_mtime_ns
+
+
+def write_index(index_path: str, stat_key: Tuple[int, int],
+                offsets: Dict[int, Tuple[int, int]]) -> None:
+    table = array.array('q')
+    for track_id, (start, end) in offsets.items():
+        table.extend((track_id, start, end))
+    tmp_path = index_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(_HEADER.pack(stat_key[0], stat_key[1], len(offsets)))
+        table.tofile(f)
+    os.replace(tmp_path, index_path)
+
+
+def read_index(index_path: str, stat_key: Tuple[int, int]
+               ) -> Dict[int, Tuple[int, int]]:
+    with open(index_path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise Error(f'Not a rekordbox offset index: {index_path}')
+        size, mtime, count = _HEADER.unpack(f.read(_HEADER.size))
+        if (size, mtime) != stat_key:
+            raise StaleIndexError(f'{index_path} is out of date')
+        table = array.array('q')
+        try:
+            table.fromfile(f, count * 3)
+        except EOFError as e:
+            raise Error(f'Truncated rekordbox offset index: {index_path}') \
+                from e
+    return {table[i]: (table[i + 1], table[i + 2])
+            for i in range(0, len(table), 3)}
+
+
+class OffsetIndex:
+    def __init__(self, xml_path: str = models.DEFAULT_PATH,
+                 index_path: Optional[str] = None,
+                 rebuild: bool = True) -> None:
+        """Opens the XML file and its offset index.
+
+        A missing or outdated sidecar is rebuilt (and rewritten) when rebuild
+        is True; otherwise StaleIndexError is raised.
+        """
+        self.xml_path = xml_path
+        self.index_path = index_path or xml_path + INDEX_SUFFIX
+        with open(xml_path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            stat_key = _stat_key(stat)
+            # Empty files can't be mapped, and have no tracks anyway.
+            self._buf = (mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                         if stat.st_size else b'')
+        try:
+            try:
+                self._offsets = read_index(self.index_path, stat_key)
+            except OSError as e:
+                raise StaleIndexError(
+                    f'Can not read {self.index_path}: {e}') from e
+        except Error:
+            if not rebuild:
+                self.close()
+                raise
+            self._offsets = scan_offsets(self._buf)
+            write_index(self.index_path, stat_key, self._offsets)
+
+    def __enter__(self) -> 'OffsetIndex':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+        self._buf = b''
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __contains__(self, track_id: int) -> bool:
+        return track_id in self._offsets
+
+    def track_ids(self) -> List[int]:
+        return list(self._offsets)
+
+    def get_track(self, track_id: int) -> models.Track:
+        start, end = self._offsets[track_id]
+        return models.Track.parse(ET.fromstring(self._buf[start:end]))
+
+    def get_tracks(self, track_ids: Iterable[int]) -> List[models.Track]:
+        return [self.get_track(track_id) for track_id in track_ids]
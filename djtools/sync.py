@@ -0,0 +1,362 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Full-library transfer of rekordbox cue points to djay.
+
+sync() shards the djay track ids across worker processes. Every worker gets
+the same read-only MatchIndex of the rekordbox tracks once, at start-up, and
+for each shard decodes the djay tracks, matches them, transfers cue points and
+archives the results. Only the archived rows travel back; the calling process
+is the single writer and commits them in batched transactions, in track order.
+
+The database ends up byte-for-byte the same as with the serial loop
+
+    for dj_t in explorer.get_all_tracks():
+        rb_t = matching.find_matching_track(dj_t, rb_ts)
+        if rb_t is not None:
+            explorer.save_track(convert.transfer_cue_points(rb_t, dj_t))
+
+which is what workers=1 runs, without starting any processes.
+
+The djtools-sync command runs the whole pipeline, see main().
+"""
+import argparse
+import collections
+import concurrent.futures
+import dataclasses
+import functools
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+from typing import (Callable, Deque, Iterable, Iterator, List, Optional,
+                    Sequence, Tuple)
+
+from djtools import convert, matching, watch
+from djtools.djay import explorer as djayexplorer
+from djtools.djay import models as djaymodels
+from djtools.rekordbox import models as rbmodels
+
+# Collections a worker needs: the title for matching, and everything
+# Explorer.encode_track writes back.
+SYNC_COLLECTIONS = djayexplorer.ENCODED_COLLECTIONS
+
+DEFAULT_SHARD_SIZE = 256
+
+# Track id and its database rows.
+TrackRows = Tuple[str, List[djayexplorer.Row]]
+Rows = List[Tuple[str, str, bytes]]
+# Whether a matched track's cue points change, and its archived rows (empty
+# when unchanged tracks are skipped).
+Result = Tuple[bool, Rows]
+
+
+@dataclasses.dataclass
+class SyncStats:  # pylint: disable=too-many-instance-attributes
+    tracks: int = 0
+    matched: int = 0
+    # Matched tracks whose cue points already were the rekordbox ones.
+    unchanged: int = 0
+    written: int = 0
+    rows: int = 0
+    transactions: int = 0
+    # Wall time spent writing, and everything else (decoding, matching,
+    # archiving, waiting for workers).
+    write_seconds: float = 0
+    match_seconds: float = 0
+
+
+# The worker process' MatchIndex, set by _init_worker.
+_match_index: Optional[matching.MatchIndex] = None
+
+
+def sync_track(dj_t: djaymodels.DjayTrack, match_index: matching.MatchIndex
+               ) -> Optional[djaymodels.DjayTrack]:
+    """Returns dj_t with cue points of its rekordbox match, if any."""
+    rb_t = match_index.find(dj_t)
+    if rb_t is None:
+        return None
+    return convert.transfer_cue_points(rb_t, dj_t)
+
+
+def sync_shard(shard: Sequence[TrackRows], match_index: matching.MatchIndex,
+               only_changed: bool = False) -> List[Result]:
+    """Matches and re-archives a shard, one result per matched track."""
+    results: List[Result] = []
+    for _, track_rows in shard:
+        dj_t = djayexplorer.decode_track(track_rows)
+        result = sync_track(dj_t, match_index)
+        if result is None:
+            continue
+        changed = not convert.same_cue_points(dj_t, result)
+        if only_changed and not changed:
+            results.append((False, []))
+            continue
+        djayexplorer.Explorer.validate_track(result)
+        results.append((changed, djayexplorer.Explorer.encode_track(result)))
+    return results
+
+
+def _init_worker(match_index: matching.MatchIndex) -> None:
+    global _match_index  # pylint: disable=global-statement
+    djaymodels.register()
+    _match_index = match_index
+
+
+def _sync_shard_in_worker(shard: Sequence[TrackRows],
+                          only_changed: bool) -> List[Result]:
+    assert _match_index is not None, 'worker not initialized'
+    return sync_shard(shard, _match_index, only_changed)
+
+
+def _shards(explorer: djayexplorer.Explorer,
+            shard_size: int) -> Iterator[List[TrackRows]]:
+    track_ids = explorer.get_track_ids()
+    groups = explorer.group_track_rows(track_ids, SYNC_COLLECTIONS)
+    for shard_ids in djayexplorer.chunks(track_ids, shard_size):
+        yield [(track_id, groups.pop(track_id)) for track_id in shard_ids]
+
+
+def _map_in_order(pool: concurrent.futures.Executor,
+                  func: Callable[[List[TrackRows]], List[Result]],
+                  shards: Iterator[List[TrackRows]], window: int
+                  ) -> Iterator[Tuple[int, List[Result]]]:
+    """Yields (shard size, results) in shard order, so writes happen in
+    track order.
+
+    Unlike Executor.map(), which submits every shard up front, at most
+    window shards are in flight, so shards are only pickled as workers
+    catch up.
+    """
+    pending: Deque[Tuple[int, concurrent.futures.Future]] = \
+        collections.deque()
+    try:
+        for shard in shards:
+            pending.append((len(shard), pool.submit(func, shard)))
+            if len(pending) >= window:
+                shard_tracks, future = pending.popleft()
+                yield shard_tracks, future.result()
+        while pending:
+            shard_tracks, future = pending.popleft()
+            yield shard_tracks, future.result()
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+
+def sync(explorer: djayexplorer.Explorer, rb_ts: Iterable[rbmodels.Track],
+         workers: Optional[int] = None, batch_size: Optional[int] = None,
+         shard_size: int = DEFAULT_SHARD_SIZE, only_changed: bool = False,
+         dry_run: bool = False,
+         progress: Optional[Callable[[SyncStats], None]] = None
+         ) -> SyncStats:
+    """Transfers cue points from matching rekordbox tracks to the library.
+
+    Args:
+      workers: number of processes, os.cpu_count() by default. 1 runs
+        everything in this process.
+      batch_size: tracks per write transaction, explorer.write_policy's by
+        default.
+      shard_size: tracks handed to a worker at a time.
+      only_changed: skip writing tracks whose cue points wouldn't change.
+      dry_run: match and archive, but don't write anything.
+      progress: called with the running stats after every shard.
+    """
+    # pylint: disable=too-many-locals
+    started = time.perf_counter()
+    match_index = matching.MatchIndex(rb_ts)
+    workers = workers or os.cpu_count() or 1
+    batch_size = batch_size or explorer.write_policy.batch_size
+    stats = SyncStats()
+    pending: List[Rows] = []
+
+    def flush():
+        rows = [row for track_rows in pending for row in track_rows]
+        if not dry_run:
+            write_started = time.perf_counter()
+            explorer.write_encoded_tracks(rows)
+            stats.write_seconds += time.perf_counter() - write_started
+            stats.transactions += 1
+        stats.written += len(pending)
+        stats.rows += len(rows)
+        pending.clear()
+
+    def consume(shard_results: Iterable[Tuple[int, List[Result]]]):
+        for shard_tracks, results in shard_results:
+            stats.tracks += shard_tracks
+            for changed, track_rows in results:
+                stats.matched += 1
+                if not changed:
+                    stats.unchanged += 1
+                if track_rows:
+                    pending.append(track_rows)
+                if len(pending) >= batch_size:
+                    flush()
+            if progress is not None:
+                progress(stats)
+
+    shards = _shards(explorer, shard_size)
+    if workers == 1:
+        consume((len(shard), sync_shard(shard, match_index, only_changed))
+                for shard in shards)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker,
+                initargs=(match_index,)) as pool:
+            consume(_map_in_order(
+                pool, functools.partial(_sync_shard_in_worker,
+                                        only_changed=only_changed),
+                shards, window=2 * workers))
+    if pending:
+        flush()
+    stats.match_seconds = (time.perf_counter() - started
+                           - stats.write_seconds)
+    return stats
+
+
+def _print_progress(stats: SyncStats, total: int) -> None:
+    sys.stderr.write(f'\r{stats.tracks}/{total} tracks, '
+                     f'{stats.matched} matched, {stats.written} written')
+    sys.stderr.flush()
+
+
+def _report(stats: SyncStats, parsed: int, parse_seconds: float,
+            load_seconds: float, dry_run: bool) -> str:
+    total = parse_seconds + load_seconds + stats.match_seconds + \
+        stats.write_seconds
+    write_note = (' (dry run)' if dry_run
+                  else f' in {stats.transactions} transactions')
+    lines = [
+        ('parse', parse_seconds, f'{parsed} rekordbox tracks parsed'),
+        ('load', load_seconds, f'{stats.tracks} djay tracks loaded'),
+        ('match', stats.match_seconds,
+         f'{stats.matched} matched, {stats.unchanged} unchanged'),
+        ('write', stats.write_seconds,
+         f'{stats.written} written{write_note}'),
+        ('total', total, f'{stats.tracks / total if total else 0:.0f} '
+         'tracks/s'),
+    ]
+    return '\n'.join(f'{stage:<6} {seconds:>9.3f}s  {counts}'
+                     for stage, seconds, counts in lines)
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='djtools-sync',
+        description='Copy cue points from a rekordbox XML export to the '
+        'matching tracks of the djay Pro 2 library.')
+    parser.add_argument('--rekordbox-xml', default=rbmodels.DEFAULT_PATH,
+                        help='rekordbox XML export (default: %(default)s)')
+    parser.add_argument('--djay-library',
+                        default=djayexplorer.default_medialibrary_db_file(),
+                        help='djay MediaLibrary.db (default: %(default)s)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='match and report without writing')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help='tracks per write transaction')
+    parser.add_argument('--only-changed', action='store_true',
+                        help="don't rewrite tracks whose cue points already "
+                        'match rekordbox')
+    parser.add_argument('--quiet', action='store_true',
+                        help="don't show progress")
+    parser.add_argument('--watch', action='store_true',
+                        help='keep running and sync every time the export '
+                        'changes')
+    parser.add_argument('--interval', type=float,
+                        default=watch.DEFAULT_INTERVAL,
+                        help='seconds between checks in --watch mode')
+    parser.add_argument('--debounce', type=float,
+                        default=watch.DEFAULT_DEBOUNCE,
+                        help='seconds the export must stay unchanged before '
+                        'a --watch sync')
+    return parser
+
+
+def _watch(args: argparse.Namespace) -> int:
+    explorer = djayexplorer.Explorer(args.djay_library)
+    if args.batch_size:
+        explorer.write_policy.batch_size = args.batch_size
+    watcher = watch.Watcher(explorer, args.rekordbox_xml,
+                            interval=args.interval, debounce=args.debounce)
+
+    def report(stats: watch.WatchStats):
+        print(f'{time.strftime("%H:%M:%S")} {stats.parsed} parsed, '
+              f'{stats.changed} changed, {stats.matched} matched, '
+              f'{stats.written} written in {stats.seconds:.3f}s',
+              flush=True)
+
+    try:
+        watcher.run(on_sync=report)
+    except KeyboardInterrupt:
+        pass
+    except djayexplorer.Error as e:
+        print(f'djtools-sync: {e}', file=sys.stderr)
+        return 1
+    finally:
+        explorer.close()
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Entry point of the djtools-sync command."""
+    parser = _parser()
+    args = parser.parse_args(argv)
+    if args.watch:
+        if args.dry_run:
+            parser.error('--dry-run is not supported with --watch')
+        return _watch(args)
+
+    started = time.perf_counter()
+    try:
+        rb_ts = list(rbmodels.parse_xml_file(args.rekordbox_xml))
+    except OSError as e:
+        print(f'djtools-sync: can not read the rekordbox XML: {e}',
+              file=sys.stderr)
+        return 1
+    except ET.ParseError as e:
+        print(f'djtools-sync: malformed rekordbox XML {args.rekordbox_xml}: '
+              f'{e}', file=sys.stderr)
+        return 1
+    parse_seconds = time.perf_counter() - started
+
+    explorer = djayexplorer.Explorer(args.djay_library,
+                                     read_only=args.dry_run)
+    try:
+        started = time.perf_counter()
+        explorer.load()
+        load_seconds = time.perf_counter() - started
+
+        progress = None
+        if not args.quiet:
+            progress = functools.partial(
+                _print_progress, total=len(explorer.get_track_ids()))
+        stats = sync(explorer, rb_ts, workers=args.workers,
+                     batch_size=args.batch_size,
+                     only_changed=args.only_changed, dry_run=args.dry_run,
+                     progress=progress)
+    except djayexplorer.Error as e:
+        print(f'djtools-sync: {e}', file=sys.stderr)
+        return 1
+    finally:
+        explorer.close()
+    if not args.quiet:
+        sys.stderr.write('\n')
+    print(_report(stats, len(rb_ts), parse_seconds, load_seconds,
+                  args.dry_run))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
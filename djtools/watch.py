@@ -0,0 +1,207 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Keeps djay in sync with a rekordbox XML export as it's re-exported.
+
+Watcher polls the size and mtime of the XML file. Once a change has settled
+(no further change for `debounce` seconds, so a burst of exports or a slow
+write triggers one sync), the file is re-parsed with the streaming parser and
+compared with the previous parse: only rekordbox tracks whose cue points or
+matching fields changed are considered, and only the djay tracks within a
+second of their durations are looked at. Tracks whose cue points actually
+change are saved through Explorer.save_tracks, in write_policy batches.
+
+The first sync after start compares against nothing, so it goes over the
+whole library, without rewriting tracks that are already up to date.
+"""
+import dataclasses
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from djtools import convert, matching
+from djtools.djay import explorer as djayexplorer
+from djtools.djay import models as djaymodels
+from djtools.rekordbox import models as rbmodels
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 1.0
+DEFAULT_DEBOUNCE = 2.0
+
+# Size and mtime of the watched file, None if it doesn't exist.
+FileState = Optional[Tuple[int, int]]
+
+
+@dataclasses.dataclass
+class WatchStats:
+    parsed: int = 0
+    # rekordbox tracks that are new or changed since the previous parse.
+    changed: int = 0
+    # djay tracks whose match is among the changed rekordbox tracks.
+    matched: int = 0
+    written: int = 0
+    seconds: float = 0
+
+
+def track_state(rb_t: rbmodels.Track) -> tuple:
+    """What a rekordbox track contributes to a sync: the fields matching
+    looks at and its cue points."""
+    return (rb_t.Name, rb_t.Artist, rb_t.TotalTime,
+            tuple((cp.Name, cp.Start) for cp in rb_t.CuePoints))
+
+
+def file_state(path: str) -> FileState:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class Watcher:  # pylint: disable=too-many-instance-attributes
+    def __init__(self, explorer: djayexplorer.Explorer,
+                 xml_path: str = rbmodels.DEFAULT_PATH,
+                 interval: float = DEFAULT_INTERVAL,
+                 debounce: float = DEFAULT_DEBOUNCE,
+                 backend: Optional[str] = None) -> None:
+        self.explorer = explorer
+        self.xml_path = xml_path
+        self.interval = interval
+        self.debounce = debounce
+        self.backend = backend
+        # track_state of every rekordbox track as of the last sync.
+        self._states: Dict[int, tuple] = {}
+        self._synced_file: FileState = None
+        self._fingerprint: Optional[Dict[str, object]] = None
+
+    def changed_track_ids(self, rb_ts: Iterable[rbmodels.Track]
+                          ) -> Tuple[Dict[int, tuple], Set[int]]:
+        """Returns the states of rb_ts and ids of those that changed."""
+        states = {rb_t.TrackID: track_state(rb_t) for rb_t in rb_ts}
+        changed = {track_id for track_id, state in states.items()
+                   if self._states.get(track_id) != state}
+        return states, changed
+
+    def _candidates(self, changed: List[rbmodels.Track]) -> List[str]:
+        """djay tracks that may match one of the changed tracks."""
+        track_ids = self.explorer.get_track_ids()
+        if not self._states:
+            return track_ids
+        found: Set[str] = set()
+        for rb_t in changed:
+            found.update(self.explorer.query(
+                duration=(rb_t.TotalTime - 1, rb_t.TotalTime + 1)))
+        return [track_id for track_id in track_ids if track_id in found]
+
+    def _reload_if_modified(self) -> None:
+        # Someone else (djay itself) wrote to the library since our last
+        # write, so the loaded rows are stale.
+        fingerprint = self.explorer.fingerprint()
+        if (self._fingerprint is not None
+                and fingerprint != self._fingerprint):
+            logger.info('Media library changed, reloading')
+            self.explorer.load()
+
+    def _updates(self, rb_ts: List[rbmodels.Track], changed_ids: Set[int],
+                 stats: WatchStats) -> List[djaymodels.DjayTrack]:
+        """djay tracks whose cue points change with the changed tracks."""
+        index = matching.MatchIndex(rb_ts)
+        changed = [rb_t for rb_t in rb_ts
+                   if rb_t.TrackID in changed_ids
+                   and rb_t.TotalTime is not None]
+        # Rows of all candidates in one pass over the library, rather than
+        # a lookup per track.
+        candidates = self._candidates(changed)
+        groups = self.explorer.group_track_rows(
+            candidates, djayexplorer.ENCODED_COLLECTIONS)
+        updates: List[djaymodels.DjayTrack] = []
+        for track_id in candidates:
+            dj_t = djayexplorer.decode_track(groups.pop(track_id))
+            rb_t = index.find(dj_t)
+            if rb_t is None or rb_t.TrackID not in changed_ids:
+                continue
+            stats.matched += 1
+            result = convert.transfer_cue_points(rb_t, dj_t)
+            if not convert.same_cue_points(dj_t, result):
+                updates.append(result)
+        return updates
+
+    def sync(self) -> WatchStats:
+        """Parses the XML file and applies the changes since the last sync."""
+        started = time.perf_counter()
+        file_before = file_state(self.xml_path)
+        rb_ts = list(rbmodels.parse_xml_file(self.xml_path,
+                                             backend=self.backend))
+        stats = WatchStats(parsed=len(rb_ts))
+        states, changed_ids = self.changed_track_ids(rb_ts)
+        stats.changed = len(changed_ids)
+
+        if changed_ids:
+            # Saves queued in write-behind mode aren't in the loaded rows
+            # until written.
+            self.explorer.flush()
+            self._reload_if_modified()
+            updates = self._updates(rb_ts, changed_ids, stats)
+            if updates:
+                self.explorer.save_tracks(updates)
+                self.explorer.flush()
+            stats.written = len(updates)
+            self._fingerprint = self.explorer.fingerprint()
+
+        self._states = states
+        self._synced_file = file_before
+        stats.seconds = time.perf_counter() - started
+        return stats
+
+    def pending(self) -> bool:
+        """Whether the file changed since the last sync."""
+        state = file_state(self.xml_path)
+        return state is not None and state != self._synced_file
+
+    def wait_for_change(self, stop: threading.Event) -> bool:
+        """Blocks until the file changed and then stayed unchanged for
+        `debounce` seconds. Returns False if stopped first."""
+        while not self.pending():
+            if stop.wait(self.interval):
+                return False
+        state = file_state(self.xml_path)
+        settled_at = time.monotonic() + self.debounce
+        while True:
+            if stop.wait(min(self.interval,
+                             max(0.0, settled_at - time.monotonic()))):
+                return False
+            current = file_state(self.xml_path)
+            if current != state:
+                state = current
+                settled_at = time.monotonic() + self.debounce
+            elif time.monotonic() >= settled_at and current is not None:
+                return True
+
+    def run(self, stop: Optional[threading.Event] = None,
+            on_sync: Optional[Callable[[WatchStats], None]] = None) -> None:
+        """Syncs whenever the file changes, until stop is set."""
+        stop = stop or threading.Event()
+        while self.wait_for_change(stop):
+            try:
+                stats = self.sync()
+            except Exception:  # pylint: disable=broad-except
+                # A half-written or invalid export; retried on next change.
+                logger.exception('Sync of %s failed', self.xml_path)
+                self._synced_file = file_state(self.xml_path)
+                continue
+            logger.info('Synced %s: %s', self.xml_path, stats)
+            if on_sync is not None:
+                on_sync(stats)
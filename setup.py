@@ -41,12 +41,21 @@ setup(
         "Programming Language :: Python :: 3.6",
     ],
     keywords='dj djay rekordbox cue points',
-    packages=find_packages(exclude=['tests']),
+    packages=find_packages(exclude=['tests', 'tests.*', 'benchmarks']),
     license='Apache License 2.0',
     install_requires=[
         'bpylist2==2.0.3',
         'dataclasses;python_version<"3.7"',
     ],
+    entry_points={
+        'console_scripts': [
+            'djtools-sync=djtools.sync:main',
+        ],
+    },
+    extras_require={
+        'numpy': ['numpy'],
+        'lxml': ['lxml'],
+    },
     tests_require=["pytest"],
     setup_requires=[
         "pycodestyle==2.3.1",
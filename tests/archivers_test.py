@@ -146,5 +146,15 @@ class TestArchivers(unittest.TestCase):
         self.assertEqual(actual, expected)
 
 
+class FixturesTest(unittest.TestCase):
+    def test_binary_plist(self):
+        bplist = dj_tests.get_fixture_from_xml('product.xml')
+        self.assertTrue(bplist.startswith(b'bplist00'))
+        self.assertIs(dj_tests.get_fixture_from_xml('product.xml'), bplist)
+
+    def test_empty(self):
+        self.assertEqual(dj_tests.xml_to_bplist(b''), b'')
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,96 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import array
+import math
+import unittest
+from unittest import mock
+
+from djtools import columnar, rekordbox
+from djtools.djay import models
+
+from . import djay_explorer_test
+from . import rekordbox_xml_test
+from .common import dj_tests
+
+
+def _tracks():
+    return [
+        models.DjayTrack(
+            title=dj_tests.EXPECTED_TITLE,
+            user_data=dj_tests.EXPECTED_USER_DATA,
+            analysis=dj_tests.EXPECTED_ANALYZED_DATA,
+        ),
+        models.DjayTrack(title=models.ADCMediaItemTitleID(
+            uuid='bare', duration=60)),
+    ]
+
+
+class ColumnarTest(unittest.TestCase):
+    def check_djay_columns(self, columns):
+        self.assertEqual(list(columns['uuid']),
+                         [dj_tests.EXPECTED_TITLE.uuid, 'bare'])
+        self.assertEqual(list(columns['duration']), [15.5, 60])
+        self.assertEqual(columns['bpm'][0], 109.99951171875)
+        self.assertTrue(math.isnan(columns['bpm'][1]))
+        self.assertEqual(list(columns['keySignatureIndex']), [21, -1])
+        self.assertEqual(list(columns['rating']), [0, -1])
+        self.assertEqual(list(columns['playCount']), [7, -1])
+        self.assertEqual(list(columns['cueCount']), [3, -1])
+
+    def test_djay_columns(self):
+        self.check_djay_columns(columnar.djay_columns(_tracks()))
+
+    def test_djay_columns_without_numpy(self):
+        with mock.patch.object(columnar, 'numpy', None):
+            columns = columnar.djay_columns(_tracks())
+        self.assertIsInstance(columns['bpm'], array.array)
+        self.check_djay_columns(columns)
+
+    def test_djay_columns_missing_values(self):
+        # As decoded from archives that lack the keys.
+        track = models.DjayTrack(
+            title=models.ADCMediaItemTitleID(uuid='partial', duration=None),
+            analysis=models.ADCMediaItemAnalyzedData(
+                uuid='partial', bpm=None, keySignatureIndex=None),
+            user_data=models.ADCMediaItemUserData(
+                uuid='partial', cuePoints=None, rating=None))
+        for numpy in [columnar.numpy, None]:
+            with self.subTest(numpy=numpy is not None), \
+                    mock.patch.object(columnar, 'numpy', numpy):
+                columns = columnar.djay_columns([track])
+                self.assertTrue(math.isnan(columns['duration'][0]))
+                self.assertTrue(math.isnan(columns['bpm'][0]))
+                self.assertEqual(list(columns['keySignatureIndex']), [-1])
+                self.assertEqual(list(columns['cueCount']), [0])
+
+    def test_rekordbox_columns(self):
+        tracks = rekordbox.parse_xml_file(
+            rekordbox_xml_test.get_fixture_path('rekordbox.xml'))
+        columns = columnar.rekordbox_columns(tracks)
+        self.assertEqual(list(columns['TrackID']), [5])
+        self.assertEqual(list(columns['TotalTime']), [214])
+        self.assertEqual(list(columns['CueCount']), [4])
+
+
+class ExplorerColumnsTest(djay_explorer_test.ExplorerTestBase):
+    def test_explorer_columns(self):
+        self._populate_track()
+        columns = columnar.explorer_columns(self.e)
+        self.assertEqual(list(columns['uuid']), [dj_tests.EXPECTED_TITLE.uuid])
+        self.assertEqual(list(columns['cueCount']), [3])
+        self.assertEqual(list(columns['keySignatureIndex']), [21])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,7 +11,9 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import functools
 import os
+import plistlib
 import subprocess
 
 from djtools.djay import models
@@ -20,17 +22,39 @@ XML_FIXTURES_DIR = os.path.join(
     os.path.dirname(__file__), '../fixtures', 'djay')
 
 
+def _with_uids(value):
+    """Turns XML plists' {'CF$UID': n} dicts back into archive UIDs."""
+    if isinstance(value, dict):
+        if list(value) == ['CF$UID']:
+            return plistlib.UID(value['CF$UID'])
+        return {k: _with_uids(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_with_uids(v) for v in value]
+    return value
+
+
+def xml_to_bplist(fixture_xml):
+    if not fixture_xml:
+        # Empty blobs, as in '/dev/null' fixtures.
+        return b''
+    if not hasattr(plistlib, 'UID'):
+        # plistlib can't write UIDs before Python 3.8, use macOS plutil.
+        with subprocess.Popen(
+                'plutil -convert binary1 - -o -'.split(),
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE) as p:
+            stdout, _ = p.communicate(fixture_xml)
+        return stdout
+    return plistlib.dumps(_with_uids(plistlib.loads(fixture_xml)),
+                          fmt=plistlib.FMT_BINARY,  # pylint: disable=no-member
+                          sort_keys=False)
+
+
+@functools.lru_cache(maxsize=None)
 def get_fixture_from_xml(name):
     fname = os.path.join(XML_FIXTURES_DIR, name)
     with open(fname, 'rb') as f:
         fixture_xml = f.read()
-
-    p = subprocess.Popen(
-        'plutil -convert binary1 - -o -'.split(),
-        stdin=subprocess.PIPE, stdout=subprocess.PIPE)
-    stdout, _ = p.communicate(fixture_xml)
-    bplist_bytes = stdout
-    return bplist_bytes
+    return xml_to_bplist(fixture_xml)
 
 
 # The models below match the fixtures XML data.
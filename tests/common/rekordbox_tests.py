@@ -0,0 +1,36 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# A small export with several tracks, cue points and a playlist, written
+# with the escapes and spacing rekordbox files contain.
+MULTI_TRACK_XML = b'''<?xml version="1.0" encoding="UTF-8"?>
+<DJ_PLAYLISTS Version="1.0.0">
+  <COLLECTION Entries="3">
+    <TRACK TrackID="1" Name="One &amp; Only" Artist="A" Album=""
+           TotalTime="100" Location="file://localhost/1.mp3"/>
+    <TRACK TrackID="2" Name="a &gt; b >" Artist="B" Album=""
+           TotalTime="200" Location="file://localhost/2.mp3">
+      <POSITION_MARK Name="" Type="0" Start="1.5" Num="0"/>
+    </TRACK >
+    <TRACK TrackID="3" Name="\xc3\x9cber" Artist="C" Album=""
+           TotalTime="300" Location="file://localhost/3.mp3"></TRACK>
+  </COLLECTION>
+  <PLAYLISTS>
+    <NODE Type="0" Name="ROOT" Count="1">
+      <NODE Name="All" Type="1" KeyType="0" Entries="1">
+        <TRACK Key="1"/>
+      </NODE>
+    </NODE>
+  </PLAYLISTS>
+</DJ_PLAYLISTS>
+'''
@@ -0,0 +1,106 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import unittest
+
+from djtools.djay import AsyncExplorer, Explorer, explorer
+
+from . import djay_explorer_test
+
+
+class AsyncExplorerTest(djay_explorer_test.ExplorerTestBase):
+    def test_load_track(self):
+        expected_track = self._populate_track()
+
+        async def run():
+            async with AsyncExplorer(self.db_fname) as e:
+                return await e.load_track(expected_track.title.uuid)
+
+        self.assertEqual(asyncio.run(run()), expected_track)
+
+    def test_iter_tracks(self):
+        expected_track = self._populate_track()
+
+        async def run():
+            async with AsyncExplorer(self.db_fname, prefetch=1) as e:
+                return [t async for t in e.iter_tracks()]
+
+        self.assertEqual(asyncio.run(run()), [expected_track])
+
+    def test_iter_tracks_early_exit(self):
+        expected_track = self._populate_track()
+
+        async def run():
+            async with AsyncExplorer(self.db_fname) as e:
+                async for track in e.iter_tracks(
+                        [expected_track.title.uuid] * 10):
+                    return track
+            return None
+
+        self.assertEqual(asyncio.run(run()), expected_track)
+
+    def test_save_tracks(self):
+        expected_track = self._populate_track()
+        expected_track.title.duration += 5
+
+        async def run():
+            async with AsyncExplorer(self.db_fname) as e:
+                await e.save_tracks([expected_track])
+                return e.write_stats
+
+        stats = asyncio.run(run())
+        self.assertEqual(stats.transactions, 1)
+        with Explorer(self.db_fname) as e:
+            self.assertEqual(e.load_track(expected_track.title.uuid),
+                             expected_track)
+
+    def test_write_behind_saves_are_read_back(self):
+        expected_track = self._populate_track()
+        expected_track.title.duration += 5
+
+        async def run():
+            async with AsyncExplorer(self.db_fname, write_behind=True) as e:
+                await e.save_tracks([expected_track])
+                track = await e.load_track(expected_track.title.uuid)
+            return track, e.write_stats
+
+        track, stats = asyncio.run(run())
+        self.assertEqual(track, expected_track)
+        self.assertEqual(stats.transactions, 1)
+        with Explorer(self.db_fname) as e:
+            self.assertEqual(e.load_track(expected_track.title.uuid).title,
+                             expected_track.title)
+
+    def test_close_twice(self):
+        async def run():
+            e = AsyncExplorer(self.db_fname)
+            async with e:
+                pass
+            await e.close()
+
+        asyncio.run(run())
+
+    def test_save_tracks_read_only(self):
+        expected_track = self._populate_track()
+
+        async def run():
+            async with AsyncExplorer(self.db_fname, read_only=True) as e:
+                await e.save_tracks([expected_track])
+
+        with self.assertRaises(explorer.Error):
+            asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,23 +11,43 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import copy
+import dataclasses
 import os
+import subprocess
+import sys
+import threading
+import time
 import unittest
+from unittest import mock
 import sqlite3
 import tempfile
 
 
+from bpylist import archiver
+from bpylist.archive_types import DataclassArchiver
+
 from djtools.djay import models, explorer, Explorer
 
 from .common import dj_tests
 
 
+RAW_INSERT_QUERY = (
+    'INSERT INTO database2(collection, key, data, metadata)'
+    ' VALUES (?,?,?,?)'
+)
 INSERT_QUERY = (
     'INSERT INTO database2(rowid, collection, key, data, metadata)'
     ' VALUES (?,?,?,?,?)'
 )
 
 
+@dataclasses.dataclass
+class ADCTestTag(DataclassArchiver):
+    name: str = ''
+    uuid: str = ''
+
+
 def get_fixture_schema():
     fname = os.path.join(dj_tests.XML_FIXTURES_DIR, 'schema.sql')
     with open(fname, 'r', encoding='utf-8') as f:
@@ -36,11 +56,11 @@ def get_fixture_schema():
 
 def data_fixture_row(collection, key, data_xml):
     data = dj_tests.get_fixture_from_xml(data_xml)
-    ExplorerTest.rowid += 1
-    return (ExplorerTest.rowid-1, collection, key, data, None)
+    ExplorerTestBase.rowid += 1
+    return (ExplorerTestBase.rowid-1, collection, key, data, None)
 
 
-class ExplorerTest(unittest.TestCase):
+class ExplorerTestBase(unittest.TestCase):
     rowid = 1
 
     def setUp(self):
@@ -60,11 +80,103 @@ class ExplorerTest(unittest.TestCase):
         self.e = Explorer(self.db_fname)
 
     def tearDown(self):
+        self.e.close()
+        self.db.close()
         os.unlink(self.db_fname)
 
+    def _populate_track(self):
+        track_id = dj_tests.EXPECTED_TITLE.uuid
+        with self.db:
+            for table, data in [
+                    ('mediaItemUserData', 'userdata.plist.xml'),
+                    ('mediaItemTitleIDs', 'adctitle.plist.xml'),
+                    ('mediaItemAnalyzedData', 'analyzed_data.plist.xml'),
+                    ('localMediaItemLocations', 'location.plist.xml')]:
+                row = data_fixture_row(table, track_id, data)
+                self.db.execute(INSERT_QUERY, row)
+        self.e.load()
+        # Copied so that tests modifying the track don't leak into others.
+        return copy.deepcopy(models.DjayTrack(
+            title=dj_tests.EXPECTED_TITLE,
+            user_data=dj_tests.EXPECTED_USER_DATA,
+            analysis=dj_tests.EXPECTED_ANALYZED_DATA,
+            local_location=dj_tests.EXPECTED_MEDIA_ITEM_LOCATION,
+        ))
+
+
+class ExplorerTest(ExplorerTestBase):
     def test_load(self):
         self.assertTrue(self.e.data)
 
+    def test_load_metadata(self):
+        with self.db:
+            self.db.execute('update database2 set metadata=?', (b'meta',))
+        self.assertIsNone(self.e.get_rows(collection='products')[0].metadata)
+        self.e.load(with_metadata=True)
+        self.assertEqual(
+            self.e.get_rows(collection='products')[0].metadata, b'meta')
+
+    def test_iter_collection(self):
+        expected_track = self._populate_track()
+        self.assertEqual(list(self.e.iter_collection('mediaItemTitleIDs')),
+                         [(expected_track.title.uuid, expected_track.title)])
+        [(_, product)] = self.e.iter_collection('products')
+        self.assertEqual(product.version, '2.0.9')
+        [row] = self.e.iter_collection_rows('mediaItemUserData')
+        self.assertEqual(row.key, expected_track.title.uuid)
+        self.assertEqual(list(self.e.iter_collection('mediaItems')), [])
+
+    def test_iter_collection_unknown(self):
+        with self.assertRaises(explorer.UnknownCollectionError):
+            self.e.iter_collection('tags')
+
+    def test_register_collection(self):
+        self.addCleanup(explorer.COLLECTION_MODELS.pop, 'tags')
+        explorer.register_collection('tags', ADCTestTag)
+        tags = [ADCTestTag(name='House', uuid='t1'),
+                ADCTestTag(name='Techno', uuid='t2')]
+        with self.db:
+            for tag in tags:
+                self.db.execute(RAW_INSERT_QUERY, (
+                    'tags', tag.uuid, archiver.archive(tag), None))
+        self.assertEqual(list(self.e.iter_collection('tags')),
+                         [(tag.uuid, tag) for tag in tags])
+
+    def test_iter_collection_wrong_model(self):
+        with self.db:
+            self.db.execute(RAW_INSERT_QUERY, (
+                'products', 'other',
+                archiver.archive(models.ADCMediaItemAnalyzedData()), None))
+        with self.assertRaises(explorer.BadDataFormatError):
+            list(self.e.iter_collection('products'))
+
+    def test_load_track_ignores_other_collections(self):
+        expected_track = self._populate_track()
+        with self.db:
+            self.db.execute(RAW_INSERT_QUERY, (
+                'playlistItems', expected_track.title.uuid, b'?', None))
+        self.e.load()
+        self.assertEqual(self.e.load_track(expected_track.title.uuid),
+                         expected_track)
+
+    def test_collection_stats(self):
+        self._populate_track()
+        with self.db:
+            self.db.execute(RAW_INSERT_QUERY,
+                            ('playlistItems', 'p1', b'12345', b'123'))
+            self.db.execute(RAW_INSERT_QUERY,
+                            ('playlistItems', 'p2', None, None))
+        stats = self.e.collection_stats()
+        self.assertEqual(stats['playlistItems'], explorer.CollectionStats(
+            rows=2, data_bytes=5, metadata_bytes=3))
+        self.assertEqual(sorted(stats), [
+            'localMediaItemLocations', 'mediaItemAnalyzedData',
+            'mediaItemTitleIDs', 'mediaItemUserData', 'playlistItems',
+            'products'])
+        title_rows = self.e.get_rows(collection='mediaItemTitleIDs')
+        self.assertEqual(stats['mediaItemTitleIDs'].data_bytes,
+                         sum(len(row.data) for row in title_rows))
+
     def test_load_bad_version(self):
         with self.db:
             self.db.execute('delete from database2 where collection="products"')
@@ -90,24 +202,6 @@ class ExplorerTest(unittest.TestCase):
         self.e.load()
         self.assertEqual(expected_track_ids, self.e.get_track_ids())
 
-    def _populate_track(self):
-        track_id = dj_tests.EXPECTED_TITLE.uuid
-        with self.db:
-            for table, data in [
-                    ('mediaItemUserData', 'userdata.plist.xml'),
-                    ('mediaItemTitleIDs', 'adctitle.plist.xml'),
-                    ('mediaItemAnalyzedData', 'analyzed_data.plist.xml'),
-                    ('localMediaItemLocations', 'location.plist.xml')]:
-                row = data_fixture_row(table, track_id, data)
-                self.db.execute(INSERT_QUERY, row)
-        self.e.load()
-        return models.DjayTrack(
-            title=dj_tests.EXPECTED_TITLE,
-            user_data=dj_tests.EXPECTED_USER_DATA,
-            analysis=dj_tests.EXPECTED_ANALYZED_DATA,
-            local_location=dj_tests.EXPECTED_MEDIA_ITEM_LOCATION,
-        )
-
     def test_load_track(self):
         expected_track = self._populate_track()
         track_id = expected_track.title.uuid
@@ -145,6 +239,118 @@ class ExplorerTest(unittest.TestCase):
         self.assertEqual(self.e.find_track(track_id=track_id).title.duration,
                          old_duration + 5)
 
+    def test_save_tracks_batches(self):
+        expected_track = self._populate_track()
+        self.e.write_policy = explorer.WritePolicy(batch_size=2)
+
+        self.e.save_tracks([expected_track] * 3)
+
+        self.assertEqual(self.e.write_stats.transactions, 2)
+        self.assertEqual(self.e.write_stats.rows, 9)
+        self.assertEqual(self.e.write_stats.retries, 0)
+
+    def test_save_track_without_source_uris(self):
+        track = self._populate_track()
+        old_duration = track.title.duration
+        track.title.duration += 5
+        track.local_location = dataclasses.replace(track.local_location,
+                                                   sourceURIs=set())
+
+        with self.assertRaises(explorer.Error):
+            self.e.save_track(track)
+        self.assertEqual(self.e.write_stats.transactions, 0)
+        self.assertEqual(self.e.load_track(track.title.uuid).title.duration,
+                         old_duration)
+
+    def test_write_policy_rejects_bad_values(self):
+        for kwargs in ({'batch_size': 0}, {'batch_size': -1},
+                       {'max_retries': -1}, {'backoff': -0.1},
+                       {'max_backoff': float('nan')}):
+            with self.subTest(**kwargs):
+                with self.assertRaises(ValueError):
+                    explorer.WritePolicy(**kwargs)
+
+    def test_save_track_gives_up_when_locked(self):
+        expected_track = self._populate_track()
+        e = Explorer(self.db_fname, pragmas={'busy_timeout': 0},
+                     write_policy=explorer.WritePolicy(max_retries=2,
+                                                       backoff=0))
+        locker = sqlite3.connect(self.db_fname, isolation_level=None)
+        locker.execute('BEGIN IMMEDIATE')
+        try:
+            with self.assertRaises(explorer.DatabaseLockedError):
+                e.save_track(expected_track)
+        finally:
+            locker.execute('ROLLBACK')
+            locker.close()
+            e.close()
+        self.assertEqual(e.write_stats.retries, 2)
+        self.assertEqual(len(e.write_stats.retry_events), 2)
+        self.assertEqual(e.write_stats.transactions, 0)
+
+    def test_save_track_retries_until_unlocked(self):
+        expected_track = self._populate_track()
+        expected_track.title.duration += 5
+        e = Explorer(self.db_fname, pragmas={'busy_timeout': 0},
+                     write_policy=explorer.WritePolicy(max_retries=50,
+                                                       backoff=0.01,
+                                                       max_backoff=0.01))
+        locker = sqlite3.connect(self.db_fname, isolation_level=None,
+                                 check_same_thread=False)
+        locker.execute('BEGIN IMMEDIATE')
+        timer = threading.Timer(0.1, locker.execute, ('ROLLBACK',))
+        timer.start()
+        try:
+            e.save_track(expected_track)
+        finally:
+            timer.join()
+            locker.close()
+            e.close()
+        self.assertGreater(e.write_stats.retries, 0)
+        self.assertEqual(e.write_stats.transactions, 1)
+        self.e.load()
+        self.assertEqual(self.e.find_track(track_id=expected_track.title.uuid),
+                         expected_track)
+
+    def test_connection_is_reused(self):
+        conn = self.e.connection
+        self.e.load()
+        self.e.load()
+        self.assertIs(self.e.connection, conn)
+
+    def test_context_manager_closes_connection(self):
+        with Explorer(self.db_fname) as e:
+            self.assertTrue(e.data)
+            conn = e.connection
+        with self.assertRaises(sqlite3.ProgrammingError):
+            conn.execute('select 1')
+
+    def test_pragmas(self):
+        e = Explorer(self.db_fname, pragmas={'busy_timeout': 1234})
+        self.assertEqual(
+            e.connection.execute('PRAGMA busy_timeout').fetchone()[0], 1234)
+        e.close()
+
+    def test_missing_file(self):
+        with self.assertRaises(explorer.Error):
+            Explorer(self.db_fname + '.missing').load()
+
+    def test_read_only(self):
+        expected_track = self._populate_track()
+        with Explorer(self.db_fname, read_only=True) as e:
+            self.assertEqual(e.load_track(expected_track.title.uuid),
+                             expected_track)
+            with self.assertRaises(explorer.Error):
+                e.save_track(expected_track)
+            with self.assertRaises(sqlite3.OperationalError):
+                e.connection.execute('delete from database2')
+
+    def test_immutable(self):
+        expected_track = self._populate_track()
+        with Explorer(self.db_fname, immutable=True) as e:
+            self.assertTrue(e.read_only)
+            self.assertEqual(e.get_all_tracks(), [expected_track])
+
     def test_get_all_tracks(self):
         expected_track = self._populate_track()
 
@@ -153,5 +359,157 @@ class ExplorerTest(unittest.TestCase):
         self.assertEqual(all_tracks[0], expected_track)
 
 
+class WriteBehindTest(ExplorerTestBase):
+    def setUp(self):
+        super().setUp()
+        self.e.close()
+        # Long interval, so that only size and explicit flushes write.
+        self.e = Explorer(self.db_fname, write_behind=True,
+                          write_policy=explorer.WritePolicy(
+                              batch_size=2, flush_interval=60))
+
+    def _stored_duration(self, track_id):
+        with Explorer(self.db_fname, read_only=True) as e:
+            return e.load_track(track_id).title.duration
+
+    def test_save_is_visible_before_write(self):
+        track = self._populate_track()
+        track_id = track.title.uuid
+        old_duration = track.title.duration
+
+        track.title.duration += 5
+        self.e.save_track(track)
+        track.title.duration += 5
+        self.e.save_track(track)
+        track.title.duration = 0
+
+        self.assertEqual(self.e.load_track(track_id).title.duration,
+                         old_duration + 10)
+        self.assertEqual(self.e.get_all_tracks()[0].title.duration,
+                         old_duration + 10)
+        self.assertEqual(self._stored_duration(track_id), old_duration)
+        self.assertEqual(self.e.write_stats.transactions, 0)
+
+        self.e.flush()
+        # Both saves of the track were merged into one write.
+        self.assertEqual(self.e.write_stats.transactions, 1)
+        self.assertEqual(self.e.write_stats.rows, 3)
+        self.assertEqual(self._stored_duration(track_id), old_duration + 10)
+        self.assertEqual(self.e.load_track(track_id).title.duration,
+                         old_duration + 10)
+
+    def test_queries_see_queued_and_written_saves(self):
+        track = self._populate_track()
+        track_id = track.title.uuid
+        old_title = track.title.title
+        track.title.title = 'Renamed'
+        self.e.save_track(track)
+
+        # Index and sidecar are built while the save is still queued.
+        self.assertEqual(self.e.query(title='Renamed'), [track_id])
+        self.assertEqual(self.e.query(title=old_title), [])
+        self.assertEqual(self.e.search('Renamed'), [track])
+
+        self.e.flush()
+        self.assertEqual(self.e.query(title='Renamed'), [track_id])
+        self.assertEqual([t.title.uuid for t in self.e.search('Renamed')],
+                         [track_id])
+        self.assertEqual(self.e.search(old_title), [])
+
+    def test_explorer_state_changes_on_owner_thread(self):
+        track = self._populate_track()
+        self.e.load()
+        threads = []
+        # pylint: disable=protected-access
+        rows_written = Explorer._rows_written
+
+        def record_thread(e, rows):
+            threads.append(threading.current_thread())
+            rows_written(e, rows)
+
+        with mock.patch.object(Explorer, '_rows_written', record_thread):
+            track.title.duration += 5
+            self.e.save_track(track)
+            # Written, but only applied on the next read.
+            self.e._write_queue.flush()
+            self.assertEqual(threads, [])
+            self.assertEqual(self.e.write_stats.transactions, 1)
+        self.assertEqual(threads, [threading.current_thread()])
+        rows = self.e.get_rows(key=track.title.uuid)
+        self.assertEqual(explorer.decode_track(rows).title.duration,
+                         track.title.duration)
+
+    def test_close_flushes(self):
+        track = self._populate_track()
+        track.title.duration += 5
+        self.e.save_track(track)
+        self.e.close()
+        self.assertEqual(self._stored_duration(track.title.uuid),
+                         track.title.duration)
+
+    def test_flush_interval(self):
+        track = self._populate_track()
+        self.e.close()
+        self.e = Explorer(self.db_fname, write_behind=True,
+                          write_policy=explorer.WritePolicy(
+                              flush_interval=0.01))
+        track.title.duration += 5
+        self.e.save_track(track)
+        for _ in range(500):
+            if self.e.write_stats.transactions:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.e.write_stats.transactions, 1)
+
+    def test_write_error_is_raised(self):
+        track = self._populate_track()
+        self.e.close()
+        self.e = Explorer(self.db_fname, write_behind=True,
+                          pragmas={'busy_timeout': 0},
+                          write_policy=explorer.WritePolicy(
+                              max_retries=0, flush_interval=60))
+        locker = sqlite3.connect(self.db_fname, isolation_level=None)
+        locker.execute('BEGIN IMMEDIATE')
+        try:
+            track.title.duration += 5
+            self.e.save_track(track)
+            with self.assertRaises(explorer.DatabaseLockedError):
+                self.e.flush()
+            # The failed save is still queued.
+            self.assertEqual(
+                self.e.load_track(track.title.uuid).title.duration,
+                track.title.duration)
+        finally:
+            locker.execute('ROLLBACK')
+            locker.close()
+        self.e.flush()
+        self.assertEqual(self._stored_duration(track.title.uuid),
+                         track.title.duration)
+
+
+class StartupTest(unittest.TestCase):
+    def test_import_is_lazy(self):
+        code = ('import sys, djtools.djay; '
+                'print(sorted({"djtools.djay.explorer", "djtools.djay.aio", '
+                '"sqlite3", "asyncio", "getpass"} & set(sys.modules)))')
+        output = subprocess.run([sys.executable, '-c', code], check=True,
+                                stdout=subprocess.PIPE,
+                                universal_newlines=True).stdout
+        self.assertEqual(output.strip(), '[]')
+
+    def test_lazy_attributes(self):
+        import djtools.djay  # pylint: disable=import-outside-toplevel
+        self.assertIs(djtools.djay.Explorer, explorer.Explorer)
+        self.assertIn('AsyncExplorer', dir(djtools.djay))
+        with self.assertRaises(AttributeError):
+            djtools.djay.NoSuchThing  # pylint: disable=pointless-statement
+
+    def test_default_medialibrary_db_file(self):
+        self.assertEqual(explorer.DEFAULT_MEDIALIBRARY_DB_FILE,
+                         explorer.default_medialibrary_db_file())
+        self.assertTrue(explorer.DEFAULT_MEDIALIBRARY_DB_FILE.endswith(
+            '/MediaLibrary.db'))
+
+
 if __name__ == '__main__':
     unittest.main()
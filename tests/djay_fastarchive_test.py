@@ -0,0 +1,104 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import copy
+import unittest
+
+from bpylist import archiver
+
+from djtools.djay import fastarchive, models
+
+from .common import dj_tests
+
+
+class FastArchiveTest(unittest.TestCase):
+    def setUp(self):
+        models.register()
+
+    def assertSameArchive(self, obj):
+        # Archived in place rather than copied: a copied set may iterate in
+        # a different order. The fast path goes first, as archiver fills in
+        # cue point comments.
+        actual = fastarchive.archive(obj)
+        expected = archiver.archive(obj)
+        self.assertEqual(actual, expected)
+        return actual
+
+    def test_fixtures(self):
+        for fixture in ['adctitle.plist.xml', 'analyzed_data.plist.xml',
+                        'cuepoint.plist.xml', 'userdata.plist.xml']:
+            with self.subTest(fixture=fixture):
+                obj = archiver.unarchive(
+                    dj_tests.get_fixture_from_xml(fixture))
+                actual = self.assertSameArchive(obj)
+                self.assertEqual(archiver.unarchive(actual), obj)
+
+    def test_expected_objects_roundtrip(self):
+        for obj in [dj_tests.EXPECTED_TITLE, dj_tests.EXPECTED_CUEPOINT,
+                    dj_tests.EXPECTED_USER_DATA,
+                    dj_tests.EXPECTED_ANALYZED_DATA]:
+            obj = copy.deepcopy(obj)
+            with self.subTest(cls=type(obj).__name__):
+                actual = self.assertSameArchive(obj)
+                self.assertEqual(archiver.unarchive(actual), obj)
+
+    def test_default_comments(self):
+        user_data = copy.deepcopy(dj_tests.EXPECTED_USER_DATA)
+        self.assertSameArchive(user_data)
+        self.assertEqual(user_data.cuePoints[0].comment, '0:03')
+        self.assertEqual(user_data.startPoint.comment, '1:52')
+
+    def test_all_fields_set(self):
+        uuid = '71f9ccc746630c592ceeed39cbc837b2'
+        cue_point = models.ADCCuePoint(comment='drop', number=1, time=60.5)
+        user_data = models.ADCMediaItemUserData(
+            cuePoints=[cue_point,
+                       models.ADCCuePoint(comment='', number=2, time=61)],
+            # The same object twice is archived once.
+            endPoint=cue_point,
+            energy=3,
+            linkedUserDataUUIDs=[uuid],
+            loopRegions=[],
+            manualBPM=128.0,
+            manualFirstDownBeatIndices=[1, 1, 2],
+            manualKeySignatureIndex=5,
+            playCount=2,
+            rating=True,
+            startPoint=models.ADCCuePoint(number=0, time=0.5),
+            tagUUIDs=['a', 'b'],
+            uuid=uuid,
+            userChangedCloudKeys={'cuePoints', 'manualBPM'},
+        )
+        actual = self.assertSameArchive(user_data)
+        self.assertEqual(archiver.unarchive(actual), user_data)
+
+    def test_shared_strings(self):
+        uuid = 'UuId'
+        title = models.ADCMediaItemTitleID(
+            title='', artist='', uuid=uuid, internalID=uuid,
+            stringRepresentation=None, duration=1)
+        self.assertSameArchive(title)
+
+    def test_unsupported_values_fall_back(self):
+        user_data = models.ADCMediaItemUserData(
+            loopRegions=[{'start': 1.0, 'end': 2.0}],
+            uuid='u')
+        actual = self.assertSameArchive(user_data)
+        self.assertEqual(archiver.unarchive(actual), user_data)
+
+    def test_other_classes_fall_back(self):
+        # Not copied: NSURLs hash by identity, so a copy of sourceURIs could
+        # be archived in a different order.
+        location = dj_tests.EXPECTED_MEDIA_ITEM_LOCATION
+        self.assertEqual(fastarchive.archive(location),
+                         archiver.archive(location))
@@ -0,0 +1,90 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import unittest
+from unittest import mock
+
+from djtools.djay import Explorer, fulltext
+
+from . import djay_explorer_test
+
+
+class FullTextTest(djay_explorer_test.ExplorerTestBase):
+    def setUp(self):
+        super().setUp()
+        self.sidecar_fname = self.db_fname + fulltext.SIDECAR_SUFFIX
+
+    def tearDown(self):
+        super().tearDown()
+        if os.path.exists(self.sidecar_fname):
+            os.unlink(self.sidecar_fname)
+
+    def test_search(self):
+        expected_track = self._populate_track()
+
+        self.assertEqual(self.e.search('tit'), [expected_track])
+        self.assertEqual(self.e.search('art tit'), [expected_track])
+        self.assertEqual(self.e.search('String Repr'), [expected_track])
+        self.assertEqual(self.e.search('artist:title', prefix=False), [])
+        self.assertEqual(self.e.search('nothing'), [])
+        self.assertEqual(self.e.search(''), [])
+
+    def test_bad_query(self):
+        self._populate_track()
+        self.e.attach_fulltext()
+        with self.assertRaises(fulltext.Error):
+            self.e.search('title:(', prefix=False)
+
+    def test_incremental_sync(self):
+        self._populate_track()
+        index = self.e.attach_fulltext()
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.sync(self.e), 0)
+
+        with self.db:
+            self.db.execute(
+                "DELETE FROM database2 WHERE collection != 'products'")
+        self.e.load()
+        self.assertEqual(index.sync(self.e), 0)
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.search('title'), [])
+
+    def test_save_updates_index(self):
+        expected_track = self._populate_track()
+        self.e.attach_fulltext()
+
+        expected_track.title.title = 'Renamed'
+        self.e.save_track(expected_track)
+
+        self.assertEqual(self.e.search('renam'), [expected_track])
+        self.assertEqual(self.e.search('title'), [])
+        # Saved tracks are re-read on the next sync.
+        self.assertEqual(self.e.attach_fulltext().sync(self.e), 0)
+
+    def test_write_encoded_tracks_syncs_written_tracks(self):
+        expected_track = self._populate_track()
+        index = self.e.attach_fulltext()
+
+        expected_track.title.title = 'Encoded'
+        rows = list(Explorer.encode_track(expected_track))
+        with mock.patch.object(index, 'sync',
+                               side_effect=AssertionError('full sync')):
+            self.e.write_encoded_tracks(rows)
+
+        self.assertEqual(self.e.search('encod'), [expected_track])
+        self.assertEqual(index.sync(self.e), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+
+from djtools.djay import indexes, models
+
+from . import djay_explorer_test
+from .common import dj_tests
+
+
+def make_track(uuid, bpm=None, key=None, rating=0, play_count=0, cues=0,
+               artist='Artist'):
+    analysis = None
+    if bpm is not None:
+        analysis = models.ADCMediaItemAnalyzedData(
+            bpm=bpm, keySignatureIndex=key, uuid=uuid)
+    return models.DjayTrack(
+        title=models.ADCMediaItemTitleID(uuid=uuid, artist=artist,
+                                         title=uuid, duration=100),
+        analysis=analysis,
+        user_data=models.ADCMediaItemUserData(
+            uuid=uuid, rating=rating, playCount=play_count,
+            cuePoints=[models.ADCCuePoint(number=i) for i in range(cues)]),
+    )
+
+
+class TrackIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = indexes.TrackIndex([
+            make_track('a', bpm=120, key=8, cues=0, rating=5, play_count=20),
+            make_track('b', bpm=124.5, key=8, cues=2, rating=4,
+                       play_count=3),
+            make_track('c', bpm=128, key=3, cues=0, artist='Other'),
+            make_track('d', bpm=140, key=8, cues=0, rating=4,
+                       play_count=11),
+            make_track('e'),
+        ])
+
+    def test_range_and_equality(self):
+        self.assertEqual(
+            self.index.query(bpm=(120, 128), keySignatureIndex=8, cueCount=0),
+            ['a'])
+        self.assertEqual(self.index.query(bpm=(125, None)), ['c', 'd'])
+        self.assertEqual(self.index.query(bpm=124.5), ['b'])
+
+    def test_open_ranges(self):
+        self.assertEqual(
+            self.index.query(rating=(4, None), playCount=(11, None)),
+            ['a', 'd'])
+        self.assertEqual(self.index.query(playCount=(None, 3)),
+                         ['b', 'c', 'e'])
+
+    def test_missing_values_dont_match(self):
+        self.assertNotIn('e', self.index.query(bpm=(None, None)))
+        self.assertEqual(self.index.query(artist='Other'), ['c'])
+        self.assertEqual(self.index.query(), ['a', 'b', 'c', 'd', 'e'])
+
+    def test_update(self):
+        self.index.update(make_track('a', bpm=90, key=1, cues=4))
+        self.assertEqual(self.index.query(keySignatureIndex=8, cueCount=0),
+                         ['d'])
+        self.assertEqual(self.index.query(bpm=(None, 100)), ['a'])
+        self.index.remove('a')
+        self.assertEqual(self.index.query(bpm=(None, 100)), [])
+        self.assertEqual(len(self.index), 4)
+
+    def test_bulk_build_matches_updates(self):
+        tracks = [make_track(f'{i:03}', bpm=120 + i % 7, cues=i % 2)
+                  for i in range(100, 0, -1)]
+        built = indexes.TrackIndex(tracks)
+        updated = indexes.TrackIndex()
+        for track in tracks:
+            updated.update(track)
+        for predicates in [{'cueCount': 0}, {'bpm': (121, 123)}, {}]:
+            self.assertEqual(built.query(**predicates),
+                             updated.query(**predicates))
+        # Most tracks share cueCount, removal finds the right one.
+        built.update(make_track('050', bpm=200, cues=5))
+        self.assertEqual(built.query(cueCount=(1, None)),
+                         sorted(updated.query(cueCount=1) + ['050']))
+        self.assertEqual(built.query(bpm=(130, None)), ['050'])
+
+    def test_bad_predicates(self):
+        with self.assertRaises(indexes.Error):
+            self.index.query(comment='foo')
+        with self.assertRaises(indexes.Error):
+            self.index.query(artist=('A', 'B'))
+
+
+class ExplorerQueryTest(djay_explorer_test.ExplorerTestBase):
+    def test_query(self):
+        expected_track = self._populate_track()
+        track_id = expected_track.title.uuid
+
+        self.assertEqual(self.e.query(keySignatureIndex=21, cueCount=3),
+                         [track_id])
+        self.assertEqual(self.e.find_tracks(bpm=(100, 120)), [expected_track])
+        self.assertEqual(self.e.query(bpm=(120, None)), [])
+
+    def test_index_follows_saves(self):
+        expected_track = self._populate_track()
+        track_id = expected_track.title.uuid
+        self.assertEqual(self.e.query(cueCount=3), [track_id])
+
+        expected_track.user_data.cuePoints = []
+        self.e.save_track(expected_track)
+
+        self.assertEqual(self.e.query(cueCount=3), [])
+        self.assertEqual(self.e.query(cueCount=0), [track_id])
+        self.assertEqual(self.e.track_index.values(track_id)['artist'],
+                         dj_tests.EXPECTED_TITLE.artist)
+
+
+if __name__ == '__main__':
+    unittest.main()
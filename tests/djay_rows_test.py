@@ -0,0 +1,88 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pickle
+import unittest
+
+from djtools.djay.rows import Row, RowStore
+
+
+ROWS = [
+    Row(1, 'products', 'product', b'version'),
+    Row(2, 'mediaItemTitleIDs', 'a', b'title a'),
+    Row(3, 'mediaItemUserData', 'a', b'user data a'),
+    Row(4, 'mediaItemTitleIDs', 'b', b'title b'),
+    Row(5, 'mediaItemUserData', 'b', None),
+]
+
+
+class RowStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.store = RowStore.from_rows(ROWS)
+
+    def test_rows(self):
+        self.assertEqual(len(self.store), len(ROWS))
+        self.assertEqual(list(self.store), ROWS)
+        self.assertEqual(self.store[-1], ROWS[-1])
+        self.assertEqual(self.store[1:3], ROWS[1:3])
+        self.assertIsInstance(self.store[1].data, memoryview)
+        self.assertIsNone(self.store[1].metadata)
+
+    def test_shared_strings(self):
+        self.assertIs(self.store[1].key, self.store[2].key)
+        self.assertIs(self.store[1].collection, self.store[3].collection)
+
+    def test_find(self):
+        self.assertEqual(self.store.find(key='a'), [1, 2])
+        self.assertEqual(self.store.find(collection='mediaItemTitleIDs'),
+                         [1, 3])
+        self.assertEqual(self.store.find('b', 'mediaItemUserData'), [4])
+        self.assertEqual(self.store.find(), list(range(len(ROWS))))
+        self.assertEqual(self.store.keys('mediaItemTitleIDs'), ['a', 'b'])
+        self.assertEqual(self.store.index_by_key()[('mediaItemTitleIDs',
+                                                    'b')], 3)
+
+    def test_set_data(self):
+        view = self.store[1].data
+        self.store.set_data(1, b'new title a')
+        self.assertEqual(self.store[1].data, b'new title a')
+        self.assertEqual(view, b'title a')
+        self.store.set_data(4, b'user data b')
+        self.assertEqual(self.store[4].data, b'user data b')
+
+    def test_append_while_sliced(self):
+        view = self.store[1].data
+        self.store.append(6, 'mediaItemTitleIDs', 'c', b'title c')
+        self.assertEqual(view, b'title a')
+        self.assertEqual(list(self.store), ROWS + [
+            Row(6, 'mediaItemTitleIDs', 'c', b'title c')])
+
+    def test_metadata(self):
+        store = RowStore(with_metadata=True)
+        store.append(1, 'products', 'product', b'version', b'metadata')
+        self.assertEqual(store[0].metadata, b'metadata')
+        self.assertTrue(RowStore.from_rows(store).with_metadata)
+        self.assertFalse(self.store.with_metadata)
+
+    def test_rows_are_immutable(self):
+        with self.assertRaises(AttributeError):
+            self.store[1].data = b'title'
+
+    def test_pickle(self):
+        row = pickle.loads(pickle.dumps(self.store[2]))
+        self.assertEqual(row, ROWS[2])
+        self.assertIsInstance(row.data, bytes)
+
+
+if __name__ == '__main__':
+    unittest.main()
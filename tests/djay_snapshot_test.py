@@ -0,0 +1,93 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import unittest
+
+from djtools.djay import Explorer, snapshot
+
+from . import djay_explorer_test
+
+
+class SnapshotTest(djay_explorer_test.ExplorerTestBase):
+    def setUp(self):
+        super().setUp()
+        self.snapshot_fname = self.db_fname + '.snapshot'
+
+    def tearDown(self):
+        super().tearDown()
+        if os.path.exists(self.snapshot_fname):
+            os.unlink(self.snapshot_fname)
+
+    def test_roundtrip(self):
+        expected_track = self._populate_track()
+        self.e.write_snapshot(self.snapshot_fname)
+
+        with Explorer(self.db_fname) as e:
+            self.assertTrue(e.load_snapshot(self.snapshot_fname))
+            self.assertEqual(e.get_track_ids(), [expected_track.title.uuid])
+            self.assertEqual(e.load_track(expected_track.title.uuid),
+                             expected_track)
+            self.assertEqual(e.get_all_tracks(), [expected_track])
+            # Served without reading database2.
+            self.assertIsNone(e._data)  # pylint: disable=protected-access
+
+    def test_stale_snapshot(self):
+        self._populate_track()
+        self.e.write_snapshot(self.snapshot_fname)
+        with self.db:
+            self.db.execute(djay_explorer_test.INSERT_QUERY,
+                            djay_explorer_test.data_fixture_row(
+                                'mediaItemTitleIDs', 'new', '/dev/null'))
+
+        with Explorer(self.db_fname) as e:
+            self.assertFalse(e.load_snapshot(self.snapshot_fname))
+
+    def test_wal_roundtrip(self):
+        self.db.execute('PRAGMA journal_mode=WAL')
+        expected_track = self._populate_track()
+        # The last connection to close checkpoints and deletes the WAL, the
+        # next one to open creates it again.
+        self.db.close()
+        self.e.close()
+        with Explorer(self.db_fname) as e:
+            e.write_snapshot(self.snapshot_fname)
+
+        with Explorer(self.db_fname) as e:
+            self.assertTrue(e.load_snapshot(self.snapshot_fname))
+            self.assertEqual(e.load_track(expected_track.title.uuid),
+                             expected_track)
+
+    def test_missing_or_bad_snapshot(self):
+        self.assertFalse(self.e.load_snapshot(self.snapshot_fname))
+        with open(self.snapshot_fname, 'wb') as f:
+            f.write(b'garbage')
+        self.assertFalse(self.e.load_snapshot(self.snapshot_fname))
+        with self.assertRaises(snapshot.BadSnapshotError):
+            snapshot.Snapshot(self.snapshot_fname)
+
+    def test_save_drops_snapshot(self):
+        expected_track = self._populate_track()
+        self.e.write_snapshot(self.snapshot_fname)
+        self.assertTrue(self.e.load_snapshot(self.snapshot_fname))
+
+        expected_track.title.duration += 5
+        self.e.save_track(expected_track)
+
+        self.assertEqual(self.e.load_track(expected_track.title.uuid),
+                         expected_track)
+        self.assertFalse(self.e.load_snapshot(self.snapshot_fname))
+
+
+if __name__ == '__main__':
+    unittest.main()
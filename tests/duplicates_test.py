@@ -0,0 +1,138 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+
+from bpylist import archiver
+
+from djtools import duplicates
+from djtools.djay import models
+
+from . import djay_explorer_test
+
+
+def track(uuid, artist='Artist', title='Title', duration=200.0, cues=0,
+          uris=()):
+    location = None
+    if uris:
+        location = models.ADCMediaItemLocation(
+            sourceURIs={models.NSURL(NSrelative=uri, NSbase=None)
+                        for uri in uris},
+            uuid=uuid)
+    return models.DjayTrack(
+        title=models.ADCMediaItemTitleID(
+            uuid=uuid, artist=artist, title=title, duration=duration),
+        user_data=models.ADCMediaItemUserData(
+            uuid=uuid,
+            cuePoints=[models.ADCCuePoint(number=n, time=n)
+                       for n in range(cues)]),
+        local_location=location)
+
+
+def uuids(groups):
+    return [[t.title.uuid for t in group] for group in groups]
+
+
+class DuplicatesTest(unittest.TestCase):
+    def test_normalize(self):
+        self.assertEqual(duplicates.normalize_text('  Daft PUNK '),
+                         'daft punk')
+        self.assertEqual(
+            duplicates.normalize_uri(models.NSURL(
+                NSrelative='file://localhost/Music/A%20Song.MP3',
+                NSbase=None)),
+            'file:///music/a song.mp3')
+        self.assertEqual(
+            duplicates.normalize_uri(models.NSURL(
+                NSrelative='Song.mp3', NSbase='file:///Music/')),
+            'file:///music/song.mp3')
+
+    def test_metadata(self):
+        tracks = [
+            track('a', duration=200.0),
+            track('b', title='Other'),
+            track('c', artist='ARTIST', title=' title', duration=200.9,
+                  cues=2),
+            # Too long for a and c, grouped with them through e.
+            track('d', duration=202.5),
+            track('e', duration=201.7),
+        ]
+        self.assertEqual(uuids(duplicates.find_duplicates(tracks)),
+                         [['c', 'a', 'd', 'e']])
+        self.assertEqual(
+            uuids(duplicates.find_duplicates(tracks, tolerance=0.85)),
+            [['c', 'd', 'e']])
+
+    def test_bad_tolerance(self):
+        for tolerance in [0, -1.0, float('nan')]:
+            with self.subTest(tolerance=tolerance):
+                with self.assertRaises(ValueError):
+                    duplicates.find_duplicates([track('a')], tolerance)
+
+    def test_bucket_boundary(self):
+        tracks = [track('a', duration=199.9), track('b', duration=200.1)]
+        self.assertEqual(uuids(duplicates.find_duplicates(tracks)),
+                         [['a', 'b']])
+
+    def test_non_finite_durations_are_not_duplicates(self):
+        tracks = [track('a', duration=float('nan')),
+                  track('b', duration=float('inf')),
+                  track('c', duration=float('inf')),
+                  track('d', duration=1e308)]
+        self.assertEqual(duplicates.find_duplicates(tracks, tolerance=0.5),
+                         [])
+
+    def test_location(self):
+        tracks = [
+            track('a', title='One', uris=['file:///Music/Song.mp3']),
+            track('b', title='Two', uris=['com.apple.iTunes:1']),
+            track('c', title='Three', duration=10, cues=1,
+                  uris=['file://localhost/music/song.mp3',
+                        'com.apple.iTunes:1']),
+            track('d', title='Four', uris=['file:///Music/Other.mp3']),
+        ]
+        self.assertEqual(uuids(duplicates.find_duplicates(tracks)),
+                         [['c', 'a', 'b']])
+
+    def test_untitled_tracks_are_not_duplicates(self):
+        tracks = [track('a', artist='', title=''),
+                  track('b', artist='', title='')]
+        self.assertEqual(duplicates.find_duplicates(tracks), [])
+
+    def test_group_order(self):
+        tracks = [track('a', title='X'), track('b', title='Y', cues=1),
+                  track('c', title='X', cues=3), track('d', title='Y')]
+        self.assertEqual(uuids(duplicates.find_duplicates(tracks)),
+                         [['c', 'a'], ['b', 'd']])
+
+
+class ExplorerDuplicatesTest(djay_explorer_test.ExplorerTestBase):
+    def test_explorer_duplicates(self):
+        expected_track = self._populate_track()
+        duplicate = track('copy', artist=expected_track.title.artist,
+                          title=expected_track.title.title,
+                          duration=expected_track.title.duration)
+        with self.db:
+            for collection, data in [
+                    ('mediaItemTitleIDs', duplicate.title),
+                    ('mediaItemUserData', duplicate.user_data)]:
+                self.db.execute(djay_explorer_test.RAW_INSERT_QUERY, (
+                    collection, 'copy', archiver.archive(data), None))
+        self.e.load()
+        # The fixture track has 3 cue points.
+        self.assertEqual(duplicates.explorer_duplicates(self.e),
+                         [[expected_track.title.uuid, 'copy']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import io
+import os
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+
+from djtools import export, rekordbox
+from djtools.djay import models
+from djtools.rekordbox import models as rbmodels
+
+from .common import dj_tests
+
+
+def _tracks():
+    return [
+        models.DjayTrack(
+            title=dj_tests.EXPECTED_TITLE,
+            user_data=dj_tests.EXPECTED_USER_DATA,
+            analysis=dj_tests.EXPECTED_ANALYZED_DATA,
+            local_location=dj_tests.EXPECTED_MEDIA_ITEM_LOCATION,
+        ),
+        models.DjayTrack(title=models.ADCMediaItemTitleID(
+            title='Bare & "quoted" <name>', uuid='bare', duration=60)),
+    ]
+
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        fd, self.fname = tempfile.mkstemp(suffix='.xml')
+        os.close(fd)
+
+    def tearDown(self):
+        os.unlink(self.fname)
+
+    def test_write_xml_file(self):
+        self.assertEqual(export.write_xml_file(self.fname, iter(_tracks())),
+                         2)
+
+        library = rekordbox.parse_library_file(self.fname)
+        self.assertEqual(sorted(library.tracks), [1, 2])
+        track = library.tracks[1]
+        self.assertEqual(track.Name, 'Title')
+        self.assertEqual(track.Artist, 'Artist')
+        self.assertEqual(track.TotalTime, 15)
+        self.assertEqual(track.Location,
+                         'file://localhost/Volumes/Foo/Contents/Bar/Baz/'
+                         'quux.mp3')
+        self.assertEqual(
+            [(cp.Num, cp.Start) for cp in track.CuePoints],
+            [(-1, 112.903), (0, 3.283), (1, 114.295), (2, 114.837)])
+        self.assertEqual(library.tracks[2].Name, 'Bare & "quoted" <name>')
+        self.assertEqual(library.tracks[2].CuePoints, [])
+        self.assertEqual(rekordbox.parse_xml_file(self.fname, 'stdlib'),
+                         [library.tracks[1], library.tracks[2]])
+
+    def test_attributes(self):
+        export.write_xml_file(self.fname, _tracks()[:1])
+        root = ET.parse(self.fname).getroot()
+        self.assertEqual(root.find('COLLECTION').get('Entries'),
+                         '0000000001')
+        track = root.find('COLLECTION/TRACK')
+        self.assertEqual(track.get('AverageBpm'), '110.00')
+        self.assertEqual(track.get('Tonality'), 'Bbm')
+
+    def test_unseekable_output(self):
+        output = io.StringIO()
+        output.seekable = lambda: False
+        with self.assertRaises(export.Error):
+            export.XmlWriter(output)
+        with export.XmlWriter(output, entries=1) as writer:
+            self.assertEqual(writer.write_track(_tracks()[1], track_id=7), 7)
+        with open(self.fname, 'w', encoding='utf-8') as f:
+            f.write(output.getvalue())
+        self.assertEqual(
+            ET.parse(self.fname).getroot().find('COLLECTION').get('Entries'),
+            '0000000001')
+        self.assertEqual([t.TrackID for t in
+                          rbmodels.parse_xml_file(self.fname, 'stdlib')],
+                         [7])
+
+    def test_wrong_entries(self):
+        output = io.StringIO()
+        with self.assertRaises(export.Error):
+            with export.XmlWriter(output, entries=2) as writer:
+                writer.write_track(_tracks()[1])
+        self.assertNotIn('</DJ_PLAYLISTS>', output.getvalue())
+
+    def test_failed_export(self):
+        export.write_xml_file(self.fname, _tracks()[:1])
+        with open(self.fname, encoding='utf-8') as f:
+            previous = f.read()
+
+        def failing_tracks():
+            yield _tracks()[1]
+            raise ValueError('decoding failed')
+
+        with self.assertRaises(ValueError):
+            export.write_xml_file(self.fname, failing_tracks())
+        with open(self.fname, encoding='utf-8') as f:
+            self.assertEqual(f.read(), previous)
+        self.assertFalse(os.path.exists(self.fname + '.tmp'))
+
+        output = io.StringIO()
+        with self.assertRaises(ValueError):
+            with export.XmlWriter(output) as writer:
+                writer.write_tracks(failing_tracks())
+        self.assertIn('<TRACK', output.getvalue())
+        self.assertNotIn('</COLLECTION>', output.getvalue())
+
+    def test_closed_writer(self):
+        writer = export.XmlWriter(self.fname)
+        writer.close()
+        with self.assertRaises(export.Error):
+            writer.write_track(_tracks()[1])
@@ -0,0 +1,88 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from djtools import rekordbox
+from djtools.rekordbox import offsets
+
+from . import rekordbox_xml_test
+from .common import rekordbox_tests
+
+
+class OffsetIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.xml_path = os.path.join(self.tmpdir, 'rekordbox.xml')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_xml(self, data):
+        with open(self.xml_path, 'wb') as f:
+            f.write(data)
+
+    def test_matches_full_parse(self):
+        shutil.copy(rekordbox_xml_test.get_fixture_path('rekordbox.xml'),
+                    self.xml_path)
+        expected = rekordbox.parse_xml_file(self.xml_path)
+        with rekordbox.OffsetIndex(self.xml_path) as index:
+            self.assertEqual(index.track_ids(), [5])
+            self.assertEqual(index.get_tracks([5]), expected)
+
+    def test_multiple_tracks(self):
+        self.write_xml(rekordbox_tests.MULTI_TRACK_XML)
+        expected = rekordbox.parse_xml_file(self.xml_path)
+        with rekordbox.OffsetIndex(self.xml_path) as index:
+            self.assertEqual(sorted(index.track_ids()), [1, 2, 3])
+            self.assertEqual(index.get_tracks([1, 2, 3]), expected)
+            self.assertEqual(index.get_track(2).Name, 'a > b >')
+            self.assertEqual(
+                [cp.Start for cp in index.get_track(2).CuePoints], [1.5])
+            self.assertNotIn(4, index)
+
+    def test_sidecar_is_reused(self):
+        self.write_xml(rekordbox_tests.MULTI_TRACK_XML)
+        rekordbox.OffsetIndex(self.xml_path).close()
+        self.assertTrue(os.path.exists(self.xml_path + offsets.INDEX_SUFFIX))
+
+        with mock.patch.object(offsets, 'scan_offsets',
+                               side_effect=AssertionError('rescanned')):
+            with rekordbox.OffsetIndex(self.xml_path, rebuild=False) as index:
+                self.assertEqual(index.get_track(3).Name, '\xdcber')
+
+    def test_stale_sidecar(self):
+        self.write_xml(rekordbox_tests.MULTI_TRACK_XML)
+        rekordbox.OffsetIndex(self.xml_path).close()
+        stat = os.stat(self.xml_path)
+        os.utime(self.xml_path, ns=(stat.st_atime_ns,
+                                    stat.st_mtime_ns + 10 ** 9))
+
+        with self.assertRaises(offsets.StaleIndexError):
+            rekordbox.OffsetIndex(self.xml_path, rebuild=False)
+        with rekordbox.OffsetIndex(self.xml_path) as index:
+            self.assertEqual(len(index), 3)
+        rekordbox.OffsetIndex(self.xml_path, rebuild=False).close()
+
+    def test_missing_sidecar(self):
+        self.write_xml(rekordbox_tests.MULTI_TRACK_XML)
+        with self.assertRaises(offsets.StaleIndexError):
+            rekordbox.OffsetIndex(self.xml_path, rebuild=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
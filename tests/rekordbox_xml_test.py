@@ -12,11 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import os
+import tempfile
 import unittest
 import xml.etree.ElementTree as ET
 
 from djtools import rekordbox
-from djtools.rekordbox import models
+from djtools.rekordbox import backends, models
+
+from .common import rekordbox_tests
 
 FIXTURES_DIR = os.path.join(
     os.path.dirname(__file__), 'fixtures', 'rekordbox')
@@ -67,5 +70,106 @@ class TestParseXML(unittest.TestCase):
         self.assertEqual(actual, expected)
 
 
+NESTED_PLAYLISTS_XML = b'''<?xml version="1.0" encoding="UTF-8"?>
+<DJ_PLAYLISTS Version="1.0.0">
+  <COLLECTION Entries="2">
+    <TRACK TrackID="1" Name="One" Artist="A" Album="" TotalTime="100"
+           Location="file://localhost/1.mp3"/>
+    <TRACK TrackID="2" Name="Two" Artist="B" Album="" TotalTime="200"
+           Location="file://localhost/2.mp3"/>
+  </COLLECTION>
+  <PLAYLISTS>
+    <NODE Type="0" Name="ROOT" Count="2">
+      <NODE Type="0" Name="Sets" Count="1">
+        <NODE Name="Warmup" Type="1" KeyType="0" Entries="3">
+          <TRACK Key="2"/>
+          <TRACK Key="1"/>
+          <TRACK Key="99"/>
+        </NODE>
+      </NODE>
+      <NODE Name="By location" Type="1" KeyType="1" Entries="2">
+        <TRACK Key="file://localhost/2.mp3"/>
+        <TRACK Key="file://localhost/missing.mp3"/>
+      </NODE>
+    </NODE>
+  </PLAYLISTS>
+</DJ_PLAYLISTS>
+'''
+
+
+class TestPlaylists(unittest.TestCase):
+    def test_parse_library_file(self):
+        library = rekordbox.parse_library_file(
+            get_fixture_path('rekordbox.xml'))
+        self.assertEqual(list(library.tracks), [5])
+        self.assertEqual(library.playlists.Name, 'ROOT')
+        self.assertTrue(library.playlists.is_folder)
+
+        everything = library.find_playlist('Everything')
+        self.assertEqual(list(everything.TrackIDs), [5])
+        self.assertIn(5, everything)
+        self.assertIs(library.playlist_tracks(everything)[0],
+                      library.get_track(5))
+        self.assertEqual(library.playlists_containing(5), [everything])
+        self.assertEqual(library.playlists_containing(6), [])
+
+    def test_empty_playlist_is_truthy(self):
+        playlist = models.Playlist(Name='Empty', Type=models.PLAYLIST)
+        self.assertEqual(len(playlist), 0)
+        self.assertTrue(playlist)
+
+    def test_nested_playlists(self):
+        with tempfile.NamedTemporaryFile(suffix='.xml', delete=False) as f:
+            f.write(NESTED_PLAYLISTS_XML)
+        try:
+            library = rekordbox.parse_library_file(f.name)
+        finally:
+            os.unlink(f.name)
+
+        self.assertEqual(library, rekordbox.parse_dj_library(
+            ET.fromstring(NESTED_PLAYLISTS_XML)))
+        warmup = library.find_playlist('Sets', 'Warmup')
+        self.assertEqual(list(warmup.TrackIDs), [2, 1, 99])
+        self.assertEqual([t.Name for t in library.playlist_tracks(warmup)],
+                         ['Two', 'One'])
+        by_location = library.find_playlist('By location')
+        self.assertEqual(list(by_location.TrackIDs), [2])
+        self.assertEqual([p.Name for p in library.iter_playlists()],
+                         ['Warmup', 'By location'])
+        self.assertEqual([p.Name for p in library.playlists_containing(2)],
+                         ['Warmup', 'By location'])
+        self.assertIsNone(library.find_playlist('Sets', 'Nope'))
+
+
+class TestBackends(unittest.TestCase):
+    def assert_backends_agree(self, fixture_path):
+        results = {name: rekordbox.parse_xml_file(fixture_path, backend=name)
+                   for name in backends.BACKENDS
+                   if name != 'lxml' or backends.lxml_etree is not None}
+        expected = list(models.parse_dj_collection(
+            ET.parse(fixture_path).getroot()))
+        self.assertTrue(expected)
+        for name, actual in results.items():
+            self.assertEqual(actual, expected, name)
+
+    def test_backends_agree(self):
+        self.assert_backends_agree(get_fixture_path('rekordbox.xml'))
+
+    def test_backends_agree_on_multiple_tracks(self):
+        with tempfile.NamedTemporaryFile(suffix='.xml', delete=False) as f:
+            f.write(rekordbox_tests.MULTI_TRACK_XML)
+        try:
+            self.assert_backends_agree(f.name)
+        finally:
+            os.unlink(f.name)
+
+    def test_default_backend_is_stdlib(self):
+        self.assertIs(backends.get_backend(), backends.iter_tracks_stdlib)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(backends.Error):
+            backends.get_backend('expat')
+
+
 if __name__ == '__main__':
     unittest.main()
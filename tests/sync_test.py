@@ -0,0 +1,240 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import contextlib
+import dataclasses
+import io
+import os
+import shutil
+from xml.sax.saxutils import quoteattr
+
+from bpylist import archiver
+
+from djtools import convert, matching, sync
+from djtools.djay import models, Explorer
+from djtools.rekordbox import models as rbmodels
+
+from . import djay_explorer_test
+
+NUM_TRACKS = 40
+
+
+def rb_tracks():
+    tracks = []
+    for i in range(0, NUM_TRACKS, 2):
+        tracks.append(rbmodels.Track(
+            TrackID=i, Name=f'Title {i}', Artist='Artist', Album='',
+            TotalTime=100 + i // 4, Location='',
+            CuePoints=[rbmodels.CuePoint(Name=f'cue {j}', Start=i + j + 0.5)
+                       for j in range(i % 5)]))
+    # Unmatched and without a duration.
+    tracks.append(rbmodels.Track(
+        TrackID=1000, Name='Other', Artist='', Album='', TotalTime=None,
+        Location=''))
+    return tracks
+
+
+def _counts(stats):
+    return dataclasses.replace(stats, write_seconds=0, match_seconds=0)
+
+
+def write_rekordbox_xml(fname, rb_ts):
+    with open(fname, 'w', encoding='utf-8') as f:
+        f.write('<DJ_PLAYLISTS><COLLECTION>')
+        for rb_t in rb_ts:
+            if rb_t.TotalTime is None:
+                continue
+            f.write(f'<TRACK TrackID="{rb_t.TrackID}" '
+                    f'Name={quoteattr(rb_t.Name)} '
+                    f'Artist={quoteattr(rb_t.Artist)} '
+                    f'TotalTime="{rb_t.TotalTime}">')
+            for cp in rb_t.CuePoints:
+                f.write(f'<POSITION_MARK Name={quoteattr(cp.Name)} '
+                        f'Start="{cp.Start}"/>')
+            f.write('</TRACK>')
+        f.write('</COLLECTION></DJ_PLAYLISTS>')
+
+
+class SyncTestBase(djay_explorer_test.ExplorerTestBase):
+    """A library of NUM_TRACKS djay tracks, half of them in rb_tracks()."""
+
+    def setUp(self):
+        super().setUp()
+        models.register()
+        with self.db:
+            for i in range(NUM_TRACKS):
+                uuid = f'track{i:03d}'
+                for collection, obj in [
+                        ('mediaItemTitleIDs', models.ADCMediaItemTitleID(
+                            title=f'Title {i}', artist='Artist',
+                            duration=100 + i // 4 + 0.4, uuid=uuid)),
+                        ('mediaItemUserData', models.ADCMediaItemUserData(
+                            uuid=uuid, playCount=i)),
+                        ('mediaItemAnalyzedData',
+                         models.ADCMediaItemAnalyzedData(bpm=120, uuid=uuid)),
+                ]:
+                    self.db.execute(djay_explorer_test.INSERT_QUERY, (
+                        None, collection, uuid, archiver.archive(obj), None))
+        self.e.load()
+
+    def _copy_db(self):
+        fname = self.db_fname + '.copy'
+        shutil.copyfile(self.db_fname, fname)
+        self.addCleanup(lambda: os.unlink(fname))
+        return fname
+
+    def _dump(self, fname):
+        with Explorer(fname, read_only=True) as e:
+            return [(row.rowid, row.collection, row.key, bytes(row.data))
+                    for row in e.data]
+
+
+class SyncTest(SyncTestBase):
+    def _serial_loop(self, fname):
+        # find_matching_track can't handle tracks without a duration.
+        rb_ts = rb_tracks()[:-1]
+        with Explorer(fname) as e:
+            for dj_t in e.get_all_tracks():
+                rb_t = matching.find_matching_track(dj_t, rb_ts)
+                if rb_t is not None:
+                    e.save_track(convert.transfer_cue_points(rb_t, dj_t))
+
+    def test_match_index(self):
+        rb_ts = rb_tracks()
+        index = matching.MatchIndex(rb_ts)
+        self.assertEqual(len(index), NUM_TRACKS // 2)
+        for dj_t in self.e.get_all_tracks():
+            self.assertIs(index.find(dj_t),
+                          matching.find_matching_track(dj_t, rb_ts[:-1]))
+
+    def test_serial_matches_loop(self):
+        expected_fname = self._copy_db()
+        self._serial_loop(expected_fname)
+
+        stats = sync.sync(self.e, rb_tracks(), workers=1, batch_size=3)
+        self.assertEqual(stats.tracks, NUM_TRACKS)
+        self.assertEqual(stats.matched, NUM_TRACKS // 2)
+        self.assertEqual(stats.rows, 3 * NUM_TRACKS // 2)
+        self.assertEqual(stats.transactions, 7)
+        self.assertEqual(self._dump(self.db_fname),
+                         self._dump(expected_fname))
+
+        track = self.e.load_track('track004')
+        self.assertEqual([cp.comment for cp in track.user_data.cuePoints],
+                         ['cue 0', 'cue 1', 'cue 2', 'cue 3'])
+        self.assertEqual(track.user_data.playCount, 4)
+
+    def test_parallel_matches_serial(self):
+        serial_fname = self._copy_db()
+        with Explorer(serial_fname) as e:
+            serial_stats = sync.sync(e, rb_tracks(), workers=1)
+
+        stats = sync.sync(self.e, rb_tracks(), workers=2, shard_size=7)
+        self.assertEqual(_counts(stats), _counts(serial_stats))
+        self.assertEqual(self._dump(self.db_fname),
+                         self._dump(serial_fname))
+
+    def test_updates_track_index(self):
+        self.assertEqual(self.e.query(cueCount=3), [])
+        sync.sync(self.e, rb_tracks(), workers=1)
+        self.assertEqual(self.e.query(cueCount=3),
+                         ['track008', 'track018', 'track028', 'track038'])
+
+    def test_only_changed(self):
+        sync.sync(self.e, rb_tracks(), workers=1)
+        self.e.write_stats = type(self.e.write_stats)()
+
+        stats = sync.sync(self.e, rb_tracks(), workers=1, only_changed=True)
+        self.assertEqual(stats.matched, NUM_TRACKS // 2)
+        self.assertEqual(stats.unchanged, NUM_TRACKS // 2)
+        self.assertEqual(stats.written, 0)
+        self.assertEqual(self.e.write_stats.transactions, 0)
+
+        changed = rb_tracks()
+        changed[1].CuePoints[0].Start += 1
+        stats = sync.sync(self.e, changed, workers=1, only_changed=True)
+        self.assertEqual(stats.unchanged, NUM_TRACKS // 2 - 1)
+        self.assertEqual(stats.written, 1)
+
+    def test_dry_run(self):
+        before = self._dump(self.db_fname)
+        progress = []
+        stats = sync.sync(self.e, rb_tracks(), workers=1, dry_run=True,
+                          shard_size=10, progress=progress.append)
+        self.assertEqual(stats.written, NUM_TRACKS // 2)
+        self.assertEqual(stats.transactions, 0)
+        self.assertEqual(len(progress), 4)
+        self.assertEqual(self._dump(self.db_fname), before)
+
+    def test_parallel_progress(self):
+        progress = []
+        sync.sync(self.e, rb_tracks(), workers=2, shard_size=10,
+                  dry_run=True,
+                  progress=lambda stats: progress.append(
+                      (stats.tracks, stats.matched)))
+        self.assertEqual(progress, [(10, 5), (20, 10), (30, 15), (40, 20)])
+
+    def test_main_missing_xml(self):
+        output = io.StringIO()
+        with contextlib.redirect_stderr(output):
+            self.assertEqual(sync.main([
+                '--rekordbox-xml', self.db_fname + '.missing.xml',
+                '--djay-library', self.db_fname, '--quiet']), 1)
+        self.assertIn('can not read the rekordbox XML', output.getvalue())
+
+    def test_main_malformed_xml(self):
+        xml_fname = self.db_fname + '.xml'
+        self.addCleanup(lambda: os.unlink(xml_fname))
+        with open(xml_fname, 'wb') as f:
+            f.write(b'<DJ_PLAYLISTS><COLLECTION><TRACK')
+        output = io.StringIO()
+        with contextlib.redirect_stderr(output):
+            self.assertEqual(sync.main([
+                '--rekordbox-xml', xml_fname,
+                '--djay-library', self.db_fname, '--quiet']), 1)
+        self.assertIn(f'malformed rekordbox XML {xml_fname}',
+                      output.getvalue())
+
+    def test_main(self):
+        xml_fname = self.db_fname + '.xml'
+        self.addCleanup(lambda: os.unlink(xml_fname))
+        write_rekordbox_xml(xml_fname, rb_tracks())
+        self.e.close()
+        expected_fname = self._copy_db()
+        self._serial_loop(expected_fname)
+
+        args = ['--rekordbox-xml', xml_fname, '--djay-library',
+                self.db_fname, '--workers', '1', '--quiet']
+        before = self._dump(self.db_fname)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(sync.main(args + ['--dry-run']), 0)
+        # Tracks without cue points in either library are unchanged.
+        self.assertIn('20 matched, 4 unchanged', output.getvalue())
+        self.assertEqual(self._dump(self.db_fname), before)
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(sync.main(args + ['--batch-size', '8']), 0)
+        report = output.getvalue()
+        self.assertIn('20 rekordbox tracks parsed', report)
+        self.assertIn('40 djay tracks loaded', report)
+        self.assertIn('20 written in 3 transactions', report)
+        self.assertEqual(self._dump(self.db_fname),
+                         self._dump(expected_fname))
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(sync.main(args + ['--only-changed']), 0)
+        self.assertIn('20 matched, 20 unchanged', output.getvalue())
+        self.assertIn('0 written', output.getvalue())
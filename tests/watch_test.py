@@ -0,0 +1,120 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import threading
+from unittest import mock
+
+from djtools import watch
+
+from . import sync_test
+
+
+class WatchTest(sync_test.SyncTestBase):
+    def setUp(self):
+        super().setUp()
+        self.xml_fname = self.db_fname + '.xml'
+        self.addCleanup(lambda: os.path.exists(self.xml_fname) and
+                        os.unlink(self.xml_fname))
+        self.watcher = watch.Watcher(self.e, self.xml_fname,
+                                     interval=0.01, debounce=0.05)
+
+    def _export(self, rb_ts):
+        sync_test.write_rekordbox_xml(self.xml_fname, rb_ts)
+        # Make the change visible even on coarse mtime filesystems.
+        stat = os.stat(self.xml_fname)
+        os.utime(self.xml_fname, ns=(stat.st_atime_ns,
+                                     stat.st_mtime_ns + 10 ** 9))
+
+    def test_sync_applies_only_changes(self):
+        rb_ts = sync_test.rb_tracks()
+        self._export(rb_ts)
+        self.assertTrue(self.watcher.pending())
+
+        # Candidates are decoded from one pass over the rows, not looked up
+        # one by one.
+        with mock.patch.object(self.e, 'load_track',
+                               side_effect=AssertionError('per-track load')):
+            stats = self.watcher.sync()
+        # The sync saw the last export of the burst.
+        self.assertFalse(self.watcher.pending())
+        self.assertEqual(stats.parsed, sync_test.NUM_TRACKS // 2)
+        self.assertEqual(stats.changed, sync_test.NUM_TRACKS // 2)
+        self.assertEqual(stats.matched, sync_test.NUM_TRACKS // 2)
+        # Tracks without cue points on both sides are left alone.
+        self.assertEqual(stats.written, 16)
+
+        rb_ts[3].CuePoints[0].Start += 10
+        rb_ts[5].Name = 'Renamed'
+        self._export(rb_ts)
+        transactions = self.e.write_stats.transactions
+        stats = self.watcher.sync()
+        self.assertEqual(stats.changed, 2)
+        self.assertEqual(stats.matched, 1)
+        self.assertEqual(stats.written, 1)
+        self.assertEqual(self.e.write_stats.transactions, transactions + 1)
+        track = self.e.load_track('track006')
+        self.assertEqual(track.user_data.cuePoints[0].time,
+                         rb_ts[3].CuePoints[0].Start)
+
+        stats = self.watcher.sync()
+        self.assertEqual((stats.changed, stats.written), (0, 0))
+
+    def test_reloads_library_modified_elsewhere(self):
+        rb_ts = sync_test.rb_tracks()
+        self._export(rb_ts)
+        self.watcher.sync()
+        with self.db:
+            self.db.execute("UPDATE database2 SET data=(SELECT data FROM "
+                            "database2 WHERE collection='mediaItemUserData' "
+                            "AND key='track000') WHERE "
+                            "collection='mediaItemUserData' "
+                            "AND key='track004'")
+        rb_ts[2].CuePoints[0].Name = 'renamed'
+        self._export(rb_ts)
+        self.watcher.sync()
+        track = self.e.load_track('track004')
+        self.assertEqual([cp.comment for cp in track.user_data.cuePoints],
+                         ['renamed', 'cue 1', 'cue 2', 'cue 3'])
+        # The other fields come from the row copied from track000.
+        self.assertEqual(track.user_data.playCount, 0)
+
+    def test_run_debounces(self):
+        stop = threading.Event()
+        synced = []
+
+        def on_sync(stats):
+            synced.append(stats)
+            stop.set()
+
+        def export_burst():
+            for i in range(3):
+                rb_ts = sync_test.rb_tracks()
+                rb_ts[0].Name = f'Burst {i}'
+                self._export(rb_ts)
+
+        # The explorer's connection belongs to this thread, so the exports
+        # run in another one.
+        exporter = threading.Thread(target=export_burst)
+        exporter.start()
+        timeout = threading.Timer(10, stop.set)
+        timeout.start()
+        try:
+            self.watcher.run(stop, on_sync)
+        finally:
+            timeout.cancel()
+            exporter.join()
+        self.assertEqual(len(synced), 1)
+        self.assertEqual(synced[0].parsed, sync_test.NUM_TRACKS // 2)
+        # The sync saw the last export of the burst.
+        self.assertFalse(self.watcher.pending())